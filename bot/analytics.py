@@ -0,0 +1,245 @@
+import base64
+import hashlib
+import heapq
+import json
+import logging
+import math
+import os
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from scheduler import Scheduler
+
+logger = logging.getLogger(__name__)
+
+HLL_PRECISION = 11       # 2048 one-byte registers, ~2.3% standard error
+FLUSH_INTERVAL = 60      # seconds between row batches
+MINUTE_ROWS_KEPT = 120   # closed minute buckets held for a manager that is not listening yet
+TOP_SONGS = 10
+SONG_COUNTERS = 200      # per bucket; the long tail is pruned so memory stays fixed
+
+
+class HyperLogLog:
+    """Fixed-memory distinct counter"""
+
+    def __init__(self, precision: int = HLL_PRECISION, registers: Optional[bytearray] = None):
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = registers if registers is not None else bytearray(self.size)
+
+    def add(self, value: str) -> None:
+        x = int.from_bytes(hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest(), 'little')
+        index = x & (self.size - 1)
+        rest = x >> self.precision
+        rank = (64 - self.precision) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: 'HyperLogLog') -> None:
+        self.registers = bytearray(max(a, b) for a, b in zip(self.registers, other.registers))
+
+    def count(self) -> int:
+        m = self.size
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)  # Linear counting for small sets
+        return int(round(estimate))
+
+    def to_base64(self) -> str:
+        return base64.b64encode(bytes(self.registers)).decode('ascii')
+
+    @classmethod
+    def from_base64(cls, data: str, precision: int = HLL_PRECISION) -> 'HyperLogLog':
+        return cls(precision, bytearray(base64.b64decode(data)))
+
+
+class Bucket:
+    """Pre-aggregated counters for one minute or one day"""
+
+    def __init__(self, start: int):
+        self.start = start  # unix seconds
+        self.songs_played = 0
+        self.cubes_spent = 0
+        self.cubes_earned = 0
+        self.tips = 0
+        self.tip_gold = 0
+        self.commands: Counter = Counter()
+        self.platforms: Counter = Counter()
+        self.songs: Counter = Counter()  # "title\tartist\tplatform" -> plays
+        self.users = HyperLogLog()
+
+    def add_song(self, key: str) -> None:
+        self.songs[key] += 1
+        if len(self.songs) > SONG_COUNTERS * 2:
+            self.songs = Counter(dict(self.songs.most_common(SONG_COUNTERS)))
+
+    def row(self, period: str, room_id: str, sketch: bool = False) -> Dict[str, Any]:
+        top_songs = []
+        for key, plays in heapq.nlargest(TOP_SONGS, self.songs.items(), key=lambda entry: entry[1]):
+            title, artist, platform = key.split('\t')
+            top_songs.append({'title': title, 'artist': artist, 'platform': platform, 'requests': plays})
+        row = {
+            'period': period,
+            'room_id': room_id,
+            'start': datetime.fromtimestamp(self.start, timezone.utc).isoformat(),
+            'songs_played': self.songs_played,
+            'cubes_spent': self.cubes_spent,
+            'cubes_earned': self.cubes_earned,
+            'tips': self.tips,
+            'tip_gold': self.tip_gold,
+            'active_users': self.users.count(),
+            'commands': dict(self.commands),
+            'platforms': dict(self.platforms),
+            'top_songs': top_songs
+        }
+        if sketch:
+            row['users_sketch'] = self.users.to_base64()  # lets the manager merge rooms exactly
+        return row
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'start': self.start,
+            'songs_played': self.songs_played,
+            'cubes_spent': self.cubes_spent,
+            'cubes_earned': self.cubes_earned,
+            'tips': self.tips,
+            'tip_gold': self.tip_gold,
+            'commands': dict(self.commands),
+            'platforms': dict(self.platforms),
+            'songs': dict(self.songs),
+            'users': self.users.to_base64()
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'Bucket':
+        bucket = cls(data['start'])
+        for field in ('songs_played', 'cubes_spent', 'cubes_earned', 'tips', 'tip_gold'):
+            setattr(bucket, field, data[field])
+        bucket.commands = Counter(data['commands'])
+        bucket.platforms = Counter(data['platforms'])
+        bucket.songs = Counter(data['songs'])
+        bucket.users = HyperLogLog.from_base64(data['users'])
+        return bucket
+
+
+class AnalyticsAggregator:
+    """Rolling per-minute and per-day statistics, updated in O(1) per event.
+
+    Closed minute buckets and the running day bucket are flushed as compact
+    rows in one batch per FLUSH_INTERVAL, so the dashboard reads a handful of
+    pre-aggregated rows instead of scanning history. Day buckets are UTC,
+    matching botStatistics.date.
+    """
+
+    def __init__(self, scheduler: Scheduler, emit: Callable[[List[Dict[str, Any]]], bool]):
+        self.scheduler = scheduler
+        self.emit = emit  # sends a batch of rows; False if nobody is listening
+        self.room_id: Optional[str] = None
+        self.data_file: Optional[str] = None
+        self.minute: Optional[Bucket] = None
+        self.closed: List[Dict[str, Any]] = []  # minute rows not yet flushed
+        self.day = Bucket(self._day_start(time.time()))
+        self.day_dirty = False
+        self.timer = None
+
+    def load_data(self) -> None:
+        """Resume today's counters after a restart"""
+        if self.data_file and os.path.exists(self.data_file):
+            try:
+                with open(self.data_file, 'r') as f:
+                    day = Bucket.from_dict(json.load(f))
+            except (ValueError, KeyError) as e:
+                logger.error(f"Ignoring unreadable analytics file: {e}")
+                return
+            if day.start == self.day.start:
+                self.day = day
+
+    def save_data(self) -> None:
+        if self.data_file is None:
+            return
+        tmp_file = self.data_file + '.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump(self.day.to_dict(), f)
+        os.replace(tmp_file, self.data_file)
+
+    def start(self, room_id: str) -> None:
+        """Attach to the room once it is known; today's counters are picked up from disk"""
+        if self.timer is None:
+            self.room_id = room_id
+            self.data_file = f"analytics_{room_id}.json"
+            self.load_data()
+            self.timer = self.scheduler.call_every(FLUSH_INTERVAL, self.flush, name='analytics_flush')
+
+    # Event hooks
+
+    def record_play(self, song: Dict[str, Any]) -> None:
+        platform = song.get('platform') or 'unknown'
+        key = '\t'.join(str(field or '').replace('\t', ' ') for field in (song.get('title'), song.get('artist'), platform))
+        for bucket in self._buckets():
+            bucket.songs_played += 1
+            bucket.platforms[platform] += 1
+            bucket.add_song(key)
+
+    def record_transaction(self, transaction: Dict[str, Any]) -> None:
+        amount = transaction['amount']
+        for bucket in self._buckets():
+            if amount < 0:
+                bucket.cubes_spent += -amount
+            else:
+                bucket.cubes_earned += amount
+
+    def record_user(self, username: str) -> None:
+        for bucket in self._buckets():
+            bucket.users.add(username)
+
+    def record_command(self, command: str) -> None:
+        for bucket in self._buckets():
+            bucket.commands[command] += 1
+
+    def record_tip(self, gold: int) -> None:
+        for bucket in self._buckets():
+            bucket.tips += 1
+            bucket.tip_gold += gold
+
+    def _buckets(self) -> List[Bucket]:
+        now = time.time()
+        minute_start = int(now // 60 * 60)
+        if self.minute is None or self.minute.start != minute_start:
+            if self.minute is not None:
+                self.closed.append(self.minute.row('minute', self.room_id))
+                del self.closed[:-MINUTE_ROWS_KEPT]
+            self.minute = Bucket(minute_start)
+
+        day_start = self._day_start(now)
+        if self.day.start != day_start:
+            # Final row for the finished day goes out with the next batch
+            self.closed.append(self.day.row('day', self.room_id, sketch=True))
+            self.day = Bucket(day_start)
+        self.day_dirty = True
+        return [self.minute, self.day]
+
+    def flush(self) -> None:
+        """Send closed minute rows and the running day row"""
+        now = time.time()
+        if self.minute is not None and self.minute.start + 60 <= now:
+            self.closed.append(self.minute.row('minute', self.room_id))
+            self.minute = None
+        if not self.closed and not self.day_dirty:
+            return
+
+        rows = list(self.closed)
+        if self.day_dirty:
+            rows.append(self.day.row('day', self.room_id, sketch=True))
+        if self.emit(rows):
+            self.closed.clear()
+            if self.day_dirty:
+                self.day_dirty = False
+                self.save_data()
+
+    @staticmethod
+    def _day_start(now: float) -> int:
+        return int(now // 86400 * 86400)
@@ -0,0 +1,266 @@
+import asyncio
+import logging
+import math
+import shutil
+import subprocess
+import wave
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+import numpy as np
+from scipy.ndimage import median_filter
+from scipy.signal import lfilter, lfilter_zi
+
+from audio_cache import AudioCache
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 44100         # ffmpeg decodes to this rate; WAV files keep their own
+CHUNK_FRAMES = 1 << 16      # frames decoded per step, so memory does not grow with track length
+MAX_SECONDS = 900           # analyze at most this much of a track
+REFERENCE_LOUDNESS = -18.0  # LUFS; ReplayGain 2.0 reference level
+ABSOLUTE_GATE = -70.0       # LUFS
+RELATIVE_GATE = -10.0       # LU below the ungated loudness
+ONSET_FRAME = 2048          # samples per spectral-flux frame
+ONSET_HOP = 512
+MIN_BPM, MAX_BPM = 60, 200
+MIN_PERIODICITY = 0.1       # beat autocorrelation relative to lag 0 below which there is no clear tempo
+ONSET_CONTEXT = 0.5         # seconds of flux around each frame that an onset has to stand out of
+MIN_ONSET_PROMINENCE = 15   # strongest 1% of onsets over the flux's median deviation; steady tones stay below ~10
+TEMPO_PRIOR_BPM = 120       # the log-normal prior favours tempos near this
+ANALYSIS_WORKERS = 1
+
+
+def k_weighting(rate: int) -> Tuple[Tuple[np.ndarray, np.ndarray], Tuple[np.ndarray, np.ndarray]]:
+    """BS.1770 pre-filter (high shelf) and RLB high-pass biquads for any sample rate"""
+    k = math.tan(math.pi * 1681.974450955533 / rate)
+    q = 0.7071752369554196
+    vh = 10 ** (3.999843853973347 / 20)
+    vb = vh ** 0.4996667741545416
+    a0 = 1 + k / q + k * k
+    shelf_b = np.array([vh + vb * k / q + k * k, 2 * (k * k - vh), vh - vb * k / q + k * k]) / a0
+    shelf_a = np.array([a0, 2 * (k * k - 1), 1 - k / q + k * k]) / a0
+
+    k = math.tan(math.pi * 38.13547087602444 / rate)
+    q = 0.5003270373238773
+    high_pass_b = np.array([1.0, -2.0, 1.0])
+    high_pass_a = np.array([1 + k / q + k * k, 2 * (k * k - 1), 1 - k / q + k * k]) / (1 + k / q + k * k)
+    return (shelf_b, shelf_a), (high_pass_b, high_pass_a)
+
+
+def decode_chunks(path: str, ffmpeg: Optional[str] = None) -> Iterator[Tuple[int, np.ndarray]]:
+    """Yield (sample rate, float32 frames x channels) chunks; WAV natively, anything else through ffmpeg"""
+    if path.lower().endswith('.wav'):
+        with wave.open(path, 'rb') as wav:
+            if wav.getsampwidth() != 2:
+                raise ValueError("only 16-bit WAV is supported")
+            rate, channels = wav.getframerate(), wav.getnchannels()
+            while True:
+                data = wav.readframes(CHUNK_FRAMES)
+                if not data:
+                    return
+                yield rate, np.frombuffer(data, dtype='<i2').reshape(-1, channels).astype(np.float32) / 32768
+
+    ffmpeg = ffmpeg or shutil.which('ffmpeg')
+    if not ffmpeg:
+        raise RuntimeError("ffmpeg is needed to decode compressed audio")
+    process = subprocess.Popen(
+        [ffmpeg, '-nostdin', '-loglevel', 'error', '-i', path, '-f', 's16le', '-ac', '2', '-ar', str(SAMPLE_RATE), '-'],
+        stdout=subprocess.PIPE
+    )
+    try:
+        while True:
+            data = process.stdout.read(CHUNK_FRAMES * 4)
+            if not data:
+                break
+            data = data[:len(data) // 4 * 4]
+            yield SAMPLE_RATE, np.frombuffer(data, dtype='<i2').reshape(-1, 2).astype(np.float32) / 32768
+    finally:
+        process.kill()
+        process.wait()
+
+
+class LoudnessMeter:
+    """Streaming BS.1770 integrated loudness over gated 400 ms blocks"""
+
+    def __init__(self, rate: int, channels: int):
+        (self.shelf_b, self.shelf_a), (self.high_pass_b, self.high_pass_a) = k_weighting(rate)
+        zi = lfilter_zi(self.shelf_b, self.shelf_a)
+        self.shelf_state = np.zeros((len(zi), channels))
+        self.high_pass_state = np.zeros((len(zi), channels))
+        self.step = rate // 10  # 100 ms; a gating block is four steps (75% overlap)
+        self.pending = np.zeros((0, channels))
+        self.energies = []  # summed channel mean square per step
+        self.peak = 0.0
+
+    def add(self, frames: np.ndarray) -> None:
+        self.peak = max(self.peak, float(np.abs(frames).max(initial=0.0)))
+        weighted, self.shelf_state = lfilter(self.shelf_b, self.shelf_a, frames, axis=0, zi=self.shelf_state)
+        weighted, self.high_pass_state = lfilter(self.high_pass_b, self.high_pass_a, weighted, axis=0,
+                                                 zi=self.high_pass_state)
+        weighted = np.concatenate([self.pending, weighted])
+        steps = len(weighted) // self.step
+        if steps == 0:
+            self.pending = weighted  # A short last chunk; wait for the rest of the step
+            return
+        squares = np.square(weighted[:steps * self.step]).reshape(steps, self.step, -1)
+        self.energies.append(squares.mean(axis=1).sum(axis=1))
+        self.pending = weighted[steps * self.step:]
+
+    def integrated(self) -> Optional[float]:
+        steps = np.concatenate(self.energies) if self.energies else np.zeros(0)
+        if len(steps) < 4:
+            return None
+        blocks = np.lib.stride_tricks.sliding_window_view(steps, 4).mean(axis=1)
+        with np.errstate(divide='ignore'):
+            loudness = -0.691 + 10 * np.log10(blocks)
+        gated = blocks[loudness > ABSOLUTE_GATE]
+        if len(gated) == 0:
+            return None
+        threshold = -0.691 + 10 * math.log10(gated.mean()) + RELATIVE_GATE
+        gated = blocks[(loudness > ABSOLUTE_GATE) & (loudness > threshold)]
+        return -0.691 + 10 * math.log10(gated.mean())
+
+
+class OnsetEnvelope:
+    """Streaming spectral-flux onset strength, one value per hop"""
+
+    def __init__(self):
+        self.window = np.hanning(ONSET_FRAME).astype(np.float32)
+        self.pending = np.zeros(0, dtype=np.float32)
+        self.previous: Optional[np.ndarray] = None
+        self.values = []
+
+    def add(self, mono: np.ndarray) -> None:
+        samples = np.concatenate([self.pending, mono])
+        if len(samples) < ONSET_FRAME:
+            self.pending = samples
+            return
+        frames = np.lib.stride_tricks.sliding_window_view(samples, ONSET_FRAME)[::ONSET_HOP]
+        spectrum = np.log1p(100 * np.abs(np.fft.rfft(frames * self.window, axis=1)))
+        if self.previous is not None:
+            spectrum = np.vstack([self.previous, spectrum])
+            flux = np.maximum(np.diff(spectrum, axis=0), 0).sum(axis=1)
+        else:
+            flux = np.concatenate([[0.0], np.maximum(np.diff(spectrum, axis=0), 0).sum(axis=1)])
+        self.values.append(flux)
+        self.previous = spectrum[-1:]
+        self.pending = samples[len(frames) * ONSET_HOP:]
+
+    def tempo(self, rate: int) -> Optional[float]:
+        """Strongest beat period from the envelope's autocorrelation, weighted toward common tempos"""
+        envelope = np.concatenate(self.values) if self.values else np.zeros(0)
+        frames_per_second = rate / ONSET_HOP
+        max_lag = int(frames_per_second * 60 / MIN_BPM) + 1
+        if len(envelope) < 2 * max_lag:
+            return None
+        # Beats stand out of the flux around them; a held tone only ripples (leakage, int16 quantization),
+        # however periodic that ripple is
+        deviation = envelope - median_filter(envelope, size=int(ONSET_CONTEXT * frames_per_second) | 1, mode='nearest')
+        strongest = np.sort(deviation)[-max(1, len(deviation) // 100):].mean()
+        if strongest <= MIN_ONSET_PROMINENCE * np.median(np.abs(deviation)):
+            return None
+        envelope = envelope - envelope.mean()
+        size = 1 << int(2 * len(envelope) - 1).bit_length()
+        spectrum = np.fft.rfft(envelope, size)
+        correlation = np.fft.irfft(spectrum * np.conj(spectrum), size)[:max_lag + 2]
+        if correlation[0] <= 0:
+            return None
+
+        lags = np.arange(len(correlation), dtype=np.float64)
+        lags[0] = 1
+        bpms = 60 * frames_per_second / lags
+        prior = np.exp(-0.5 * (np.log2(bpms / TEMPO_PRIOR_BPM)) ** 2)
+        score = correlation * prior
+        score[(bpms < MIN_BPM) | (bpms > MAX_BPM)] = -np.inf
+        lag = int(np.argmax(score))
+        if not np.isfinite(score[lag]) or lag + 1 >= len(correlation):
+            return None
+        if correlation[lag] < MIN_PERIODICITY * correlation[0]:
+            return None  # Ambient or speech
+
+        # Parabolic interpolation around the peak for sub-frame precision
+        left, middle, right = correlation[lag - 1], correlation[lag], correlation[lag + 1]
+        denominator = left - 2 * middle + right
+        offset = 0.5 * (left - right) / denominator if denominator else 0.0
+        return 60 * frames_per_second / (lag + offset)
+
+
+def analyze_file(path: str, ffmpeg: Optional[str] = None) -> Dict[str, Any]:
+    """Loudness, replay gain, peak and tempo of an audio file, decoded chunk by chunk"""
+    meter = None
+    onsets = OnsetEnvelope()
+    rate = SAMPLE_RATE
+    decoded = 0
+    for rate, frames in decode_chunks(path, ffmpeg):
+        if meter is None:
+            meter = LoudnessMeter(rate, frames.shape[1])
+        meter.add(frames)
+        onsets.add(frames.mean(axis=1))
+        decoded += len(frames)
+        if decoded >= MAX_SECONDS * rate:
+            break
+
+    loudness = meter.integrated() if meter else None
+    bpm = onsets.tempo(rate)
+    return {
+        'loudness': round(loudness, 2) if loudness is not None else None,
+        'replay_gain': round(REFERENCE_LOUDNESS - loudness, 2) if loudness is not None else None,
+        'peak': round(meter.peak, 4) if meter else None,
+        'bpm': round(float(bpm), 1) if bpm else None,
+        'analyzed_seconds': round(decoded / rate, 1)
+    }
+
+
+class AudioAnalyzer:
+    """Analyzes cached tracks on a process pool and stores the results in the cache metadata.
+
+    Decoding and the FFT work are CPU-bound, so they run in worker processes
+    and the event loop only waits on a future. Each track is analyzed once;
+    the results survive restarts in the cache index.
+    """
+
+    def __init__(self, cache: AudioCache, on_analyzed: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+                 workers: int = ANALYSIS_WORKERS):
+        self.cache = cache
+        self.on_analyzed = on_analyzed
+        self.workers = workers
+        self.pool: Optional[ProcessPoolExecutor] = None
+        self.tasks: Dict[str, asyncio.Task] = {}
+
+    def submit(self, key: str) -> None:
+        """Analyze a cached track in the background unless it already has results"""
+        meta = self.cache.meta(key)
+        if meta is None or 'loudness' in meta or key in self.tasks:
+            return
+        task = asyncio.get_running_loop().create_task(self._analyze(key))
+        self.tasks[key] = task
+        task.add_done_callback(lambda _: self.tasks.pop(key, None))
+
+    def backfill(self) -> None:
+        """Queue cached tracks from before analysis existed (or whose analysis was interrupted)"""
+        for key in list(self.cache.entries):
+            self.submit(key)
+
+    async def _analyze(self, key: str) -> None:
+        path = self.cache.location(key)
+        if path is None:
+            return
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(max_workers=self.workers)
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(self.pool, analyze_file, path)
+        except Exception as e:
+            logger.warning(f"Audio analysis of {key} failed: {e}")
+            result = {'loudness': None, 'replay_gain': None, 'peak': None, 'bpm': None}  # Not retried
+        self.cache.update_meta(key, **result)
+        logger.info(f"Analyzed {key}: {result['loudness']} LUFS, {result['bpm']} BPM")
+        if self.on_analyzed:
+            self.on_analyzed(key, result)
+
+    def close(self) -> None:
+        for task in self.tasks.values():
+            task.cancel()
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
@@ -0,0 +1,273 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+from scheduler import Scheduler
+
+logger = logging.getLogger(__name__)
+
+AUDIO_CACHE_DIR = os.getenv('AUDIO_CACHE_DIR', 'audio_cache')
+AUDIO_CACHE_BYTES = int(os.getenv('AUDIO_CACHE_MB', '1024')) * 1024 * 1024
+INDEX_FILE = 'index.json'
+SAVE_DELAY = 5              # seconds; index writes are coalesced
+PREFETCH_AHEAD = 3          # queue entries fetched ahead of the current song
+PREFETCH_CONCURRENCY = 2    # fetches running at once
+FETCH_TIMEOUT = 300         # seconds per track
+MAX_ATTEMPTS = 3
+RETRY_DELAY = 10            # seconds, doubled per failed attempt
+
+
+def audio_key(song: Dict[str, Any]) -> str:
+    """Cache key: platform and the platform's track id (or a hash of the URL when there is no id)"""
+    platform = (song.get('platform') or 'unknown').lower()
+    track_id = song.get('id') or hashlib.sha1((song.get('url') or '').encode('utf-8')).hexdigest()[:16]
+    return f"{platform}/{track_id}"
+
+
+class AudioCache:
+    """Size-bounded on-disk LRU of fetched tracks.
+
+    Files live under <directory>/<platform>/<track id>.<format>, and an index
+    keeps them in least recently used order together with per-track metadata
+    (format, source, analysis results). Entries for the current song and the
+    prefetch window are pinned so eviction never removes audio about to play.
+    """
+
+    def __init__(self, scheduler: Scheduler, directory: str = AUDIO_CACHE_DIR, max_bytes: int = AUDIO_CACHE_BYTES):
+        self.scheduler = scheduler
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.index_file = os.path.join(directory, INDEX_FILE)
+        self.entries: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()  # least recently used first
+        self.pinned: set = set()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.save_job = None
+        os.makedirs(directory, exist_ok=True)
+        self.load_data()
+
+    def load_data(self) -> None:
+        """Load the index, dropping entries whose files are gone and fetches cut short by a restart"""
+        entries = {}
+        if os.path.exists(self.index_file):
+            try:
+                with open(self.index_file, 'r') as f:
+                    entries = json.load(f)
+            except ValueError as e:
+                logger.error(f"Ignoring unreadable audio cache index: {e}")
+
+        for key, entry in sorted(entries.items(), key=lambda item: item[1]['used']):
+            if os.path.exists(os.path.join(self.directory, entry['file'])):
+                self.entries[key] = entry
+                self.size += entry['size']
+
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith('.part'):
+                    os.remove(os.path.join(root, name))
+
+    def save_data(self) -> None:
+        self.save_job = None
+        tmp_file = self.index_file + '.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump(self.entries, f)
+        os.replace(tmp_file, self.index_file)
+
+    def _schedule_save(self) -> None:
+        if self.save_job is None:
+            self.save_job = self.scheduler.call_later(SAVE_DELAY, self.save_data, name='audio_cache_save')
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.entries
+
+    def path(self, key: str) -> Optional[str]:
+        """Local file for a track, marking it recently used; None on a miss"""
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        entry['used'] = time.time()
+        self.entries.move_to_end(key)
+        self._schedule_save()
+        return os.path.join(self.directory, entry['file'])
+
+    def location(self, key: str) -> Optional[str]:
+        """Local file for a track without counting it as a use"""
+        entry = self.entries.get(key)
+        return os.path.join(self.directory, entry['file']) if entry else None
+
+    def meta(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self.entries.get(key)
+        return entry['meta'] if entry else None
+
+    def update_meta(self, key: str, **values: Any) -> None:
+        entry = self.entries.get(key)
+        if entry is not None:
+            entry['meta'].update(values)
+            self._schedule_save()
+
+    def partial_path(self, key: str) -> str:
+        """Where a fetch writes before the track is added"""
+        return os.path.join(self.directory, self._file_name(key, 'part'))
+
+    def add(self, key: str, partial_path: str, meta: Dict[str, Any]) -> str:
+        """Move a finished fetch into the cache and evict down to the size limit"""
+        file = self._file_name(key, meta.get('format') or 'audio')
+        path = os.path.join(self.directory, file)
+        os.replace(partial_path, path)
+
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.size -= old['size']
+            if old['file'] != file:
+                self._remove_file(old['file'])
+        entry = {'file': file, 'size': os.path.getsize(path), 'used': time.time(), 'meta': meta}
+        self.entries[key] = entry
+        self.size += entry['size']
+        self.evict()
+        self._schedule_save()
+        return path
+
+    def pin(self, keys: set) -> None:
+        """Replace the set of entries that must not be evicted"""
+        self.pinned = set(keys)
+        self.evict()
+
+    def evict(self) -> None:
+        if self.size <= self.max_bytes:
+            return
+        for key in list(self.entries):
+            if self.size <= self.max_bytes:
+                break
+            if key in self.pinned:
+                continue
+            entry = self.entries.pop(key)
+            self.size -= entry['size']
+            self._remove_file(entry['file'])
+            logger.debug(f"Evicted {key} from the audio cache")
+        self._schedule_save()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'tracks': len(self.entries),
+            'bytes': self.size,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses
+        }
+
+    def _file_name(self, key: str, extension: str) -> str:
+        platform, _, track_id = key.partition('/')
+        return os.path.join(platform, f"{re.sub(r'[^A-Za-z0-9_-]', '_', track_id)}.{extension}")
+
+    def _remove_file(self, file: str) -> None:
+        try:
+            os.remove(os.path.join(self.directory, file))
+        except FileNotFoundError:
+            pass
+
+
+class AudioPrefetcher:
+    """Keeps the current song and the next few queue entries in the audio cache.
+
+    notify() is cheap and coalesced, so the bot calls it on every queue
+    change. Each sync pins the window, cancels fetches for songs that left it
+    (skips, cleared queues) and starts missing ones in queue order, with at
+    most `concurrency` fetches running. Failed tracks are retried with
+    backoff a few times and then left as plain links.
+    """
+
+    def __init__(self, scheduler: Scheduler, cache: AudioCache, source: Any,
+                 upcoming: Callable[[], List[Dict[str, Any]]],
+                 lookahead: int = PREFETCH_AHEAD, concurrency: int = PREFETCH_CONCURRENCY,
+                 on_cached: Optional[Callable[[str], None]] = None):
+        self.scheduler = scheduler
+        self.cache = cache
+        self.source = source  # async fetch(song, path) -> metadata including 'format'
+        self.upcoming = upcoming  # current song first, then the queue
+        self.on_cached = on_cached  # called with the key of every newly cached track
+        self.lookahead = lookahead
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.tasks: Dict[str, asyncio.Task] = {}
+        self.attempts: Dict[str, int] = {}
+        self.sync_job = None
+        self.closed = False
+
+    def notify(self) -> None:
+        """The queue changed; resync on the next scheduler tick"""
+        if self.sync_job is None and not self.closed:
+            self.sync_job = self.scheduler.call_later(0, self.sync, name='audio_prefetch')
+
+    def sync(self) -> None:
+        self.sync_job = None
+        window: Dict[str, Dict[str, Any]] = {}
+        for song in self.upcoming()[:self.lookahead + 1]:
+            window.setdefault(audio_key(song), song)
+        self.cache.pin(set(window))
+
+        for key, task in list(self.tasks.items()):
+            if key not in window:
+                task.cancel()
+
+        loop = asyncio.get_running_loop()
+        for key, song in window.items():
+            if key in self.cache or key in self.tasks or self.attempts.get(key, 0) >= MAX_ATTEMPTS:
+                continue
+            # Tasks queue on the semaphore in creation order, so nearer songs are fetched first
+            self.tasks[key] = loop.create_task(self._fetch(key, song))
+
+    def path_for(self, song: Dict[str, Any]) -> Optional[str]:
+        return self.cache.path(audio_key(song))
+
+    async def wait_for(self, song: Dict[str, Any], timeout: float) -> Optional[str]:
+        """Cached path once an in-flight fetch finishes, or None after timeout"""
+        if self.sync_job is not None:
+            # A queue change is still pending; start its fetches now rather than on the next tick
+            self.sync_job.cancel()
+            self.sync()
+        task = self.tasks.get(audio_key(song))
+        if task is not None:
+            await asyncio.wait({task}, timeout=timeout)
+        return self.path_for(song)
+
+    async def _fetch(self, key: str, song: Dict[str, Any]) -> None:
+        partial_path = self.cache.partial_path(key)
+        try:
+            async with self.semaphore:
+                os.makedirs(os.path.dirname(partial_path), exist_ok=True)
+                started = time.monotonic()
+                meta = await asyncio.wait_for(self.source.fetch(song, partial_path), FETCH_TIMEOUT)
+                self.cache.add(key, partial_path, meta)
+                self.attempts.pop(key, None)
+                if self.on_cached:
+                    self.on_cached(key)
+                logger.info(f"Prefetched {song.get('title')} ({key}) in {time.monotonic() - started:.1f}s")
+        except asyncio.CancelledError:
+            logger.debug(f"Prefetch of {key} cancelled")
+            self.notify()  # The song may have come back into the window meanwhile
+        except Exception as e:
+            attempts = self.attempts.get(key, 0) + 1
+            self.attempts[key] = attempts
+            logger.warning(f"Prefetch of {key} failed (attempt {attempts}/{MAX_ATTEMPTS}): {e}")
+            if attempts < MAX_ATTEMPTS:
+                self.scheduler.call_later(RETRY_DELAY * 2 ** (attempts - 1), self.notify, name='audio_prefetch_retry')
+        finally:
+            self.tasks.pop(key, None)
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+
+    def close(self) -> None:
+        self.closed = True
+        if self.sync_job is not None:
+            self.sync_job.cancel()
+            self.sync_job = None
+        for task in self.tasks.values():
+            task.cancel()
@@ -0,0 +1,245 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional, Set
+
+from aiohttp import web
+
+from scheduler import Scheduler
+
+logger = logging.getLogger(__name__)
+
+AUDIO_RELAY_HOST = os.getenv('AUDIO_RELAY_HOST', '0.0.0.0')
+AUDIO_RELAY_PORT = int(os.getenv('AUDIO_RELAY_PORT', '8765'))  # one per room when bots share a host
+AUDIO_RELAY_PUBLIC_URL = os.getenv('AUDIO_RELAY_PUBLIC_URL', '')  # what -listen announces; unset keeps the stream private
+RING_BYTES = 1 << 20        # about a minute of 128 kbit/s audio
+PUMP_INTERVAL = 0.25        # seconds between reads from the cached file
+LEAD_SECONDS = 2            # audio kept ahead of the playback clock; new listeners start with it buffered
+SEND_TIMEOUT = 10           # seconds a listener may stall before it is disconnected
+IDLE_CHECK = 1              # seconds between disconnect checks while there is nothing to send
+MAX_LISTENERS = 200
+DEFAULT_BYTE_RATE = 16000   # 128 kbit/s, when neither bitrate nor duration is known
+
+
+class RingBuffer:
+    """Fixed-size byte ring addressed by absolute stream position"""
+
+    def __init__(self, capacity: int = RING_BYTES):
+        self.capacity = capacity
+        self.buffer = bytearray(capacity)
+        self.view = memoryview(self.buffer)
+        self.written = 0  # absolute position of the next byte
+
+    @property
+    def oldest(self) -> int:
+        return max(0, self.written - self.capacity)
+
+    def write(self, data: bytes) -> None:
+        skipped = max(0, len(data) - self.capacity)  # Only the newest ring's worth survives anyway
+        self.written += skipped
+        data = memoryview(data)[skipped:]
+        start = self.written % self.capacity
+        first = min(len(data), self.capacity - start)
+        self.view[start:start + first] = data[:first]
+        self.view[:len(data) - first] = data[first:]
+        self.written += len(data)
+
+    def slices(self, start: int, end: int) -> List[memoryview]:
+        """Views over [start, end) without copying; two when the range wraps"""
+        offset = start % self.capacity
+        length = end - start
+        if offset + length <= self.capacity:
+            return [self.view[offset:offset + length]]
+        return [self.view[offset:], self.view[:offset + length - self.capacity]]
+
+
+class Listener:
+    __slots__ = ('position', 'sent', 'drops', 'connected_at')
+
+    def __init__(self, position: int):
+        self.position = position
+        self.sent = 0
+        self.drops = 0
+        self.connected_at = time.time()
+
+
+class AudioRelay:
+    """Streams the current song from the audio cache to any number of HTTP listeners.
+
+    One pump reads the cached file at the playback clock's pace (plus
+    LEAD_SECONDS) into a ring buffer, and every listener is sent memoryview
+    slices of that same ring, so a song is read from disk once no matter how
+    many people listen. Listeners share the clock: a new one starts
+    LEAD_SECONDS behind the ring's head, which is where the room is now.
+    Songs follow each other on the same stream, so tracks must be MP3 (its
+    frames resync after a cut).
+
+    Writes apply the transport's backpressure. A listener that falls more
+    than a ring behind skips ahead to the live position, and one stalled for
+    SEND_TIMEOUT is dropped before its pending slices can be overwritten.
+    """
+
+    def __init__(self, scheduler: Scheduler, host: str = AUDIO_RELAY_HOST, port: int = AUDIO_RELAY_PORT,
+                 public_url: str = AUDIO_RELAY_PUBLIC_URL):
+        self.scheduler = scheduler
+        self.host = host
+        self.port = port
+        self.public_url = public_url
+        self.ring = RingBuffer()
+        self.listeners: Set[Listener] = set()
+        self.data_ready = asyncio.Event()
+        self.track: Optional[Dict[str, Any]] = None
+        self.file = None
+        self.runner: Optional[web.AppRunner] = None
+        self.timer = None
+
+    async def start(self) -> Optional[str]:
+        """Start serving; returns the public listen URL, if one is configured"""
+        if self.runner is None:
+            app = web.Application()
+            app.router.add_get('/listen', self.handle_listen)
+            app.router.add_get('/status', self.handle_status)
+            self.runner = web.AppRunner(app, access_log=None)
+            await self.runner.setup()
+            await web.TCPSite(self.runner, self.host, self.port).start()
+            self.port = self.runner.addresses[0][1]
+            self.timer = self.scheduler.call_every(PUMP_INTERVAL, self.pump, name='audio_relay_pump')
+            logger.info(f"Audio relay listening on port {self.port}")
+        return self.url
+
+    @property
+    def running(self) -> bool:
+        return self.runner is not None
+
+    @property
+    def url(self) -> Optional[str]:
+        """Where room users can listen; the bind address is only reachable from the bot's host"""
+        if self.runner is None or not self.public_url:
+            return None
+        return self.public_url
+
+    async def stop(self) -> None:
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        self.clear()
+        if self.runner is not None:
+            runner, self.runner = self.runner, None
+            self.data_ready.set()  # Idle listeners see the relay is gone and return
+            await runner.cleanup()
+
+    def play(self, path: str, meta: Dict[str, Any], started_at: float, duration: float) -> None:
+        """Switch the stream to a cached track that started playing at started_at"""
+        if (meta or {}).get('format') != 'mp3':
+            logger.info(f"Not relaying {path}: only MP3 tracks can be joined into one stream")
+            self.clear()
+            return
+        self.clear()
+        size = os.path.getsize(path)
+        self.file = open(path, 'rb')
+        self.track = {
+            'path': path,
+            'size': size,
+            'started_at': started_at,
+            'byte_rate': self._byte_rate(meta, size, duration),
+            'meta': meta,  # the cache's own dict, so analysis finishing later shows up here
+            'sent': 0  # file offset already pushed into the ring
+        }
+        self.pump()
+
+    def clear(self) -> None:
+        """Stop feeding the stream; listeners stay connected for the next song"""
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        self.track = None
+
+    def pump(self) -> None:
+        """Move the current track into the ring up to the playback clock plus the lead"""
+        track = self.track
+        if track is None or not self.listeners:
+            return
+        elapsed = time.time() - track['started_at']
+        # Nobody heard the part played while the relay was idle; keep to the room's clock
+        track['sent'] = max(track['sent'], min(int(elapsed * track['byte_rate']), track['size']))
+        target = min(int((elapsed + LEAD_SECONDS) * track['byte_rate']), track['size'])
+        if target <= track['sent']:
+            return
+        self.file.seek(track['sent'])
+        data = self.file.read(target - track['sent'])
+        track['sent'] += len(data)
+        self.ring.write(data)
+
+        # Wake every waiting listener, then arm a fresh event for the next write
+        self.data_ready.set()
+        self.data_ready = asyncio.Event()
+
+    async def handle_listen(self, request: web.Request) -> web.StreamResponse:
+        if len(self.listeners) >= MAX_LISTENERS:
+            raise web.HTTPServiceUnavailable(text="Too many listeners")
+        response = web.StreamResponse(headers={
+            'Content-Type': 'audio/mpeg',
+            'Cache-Control': 'no-cache, no-store',
+            'Access-Control-Allow-Origin': '*'
+        })
+        await response.prepare(request)
+
+        listener = Listener(self._live_position())
+        self.listeners.add(listener)
+        if len(self.listeners) == 1:
+            self.pump()  # Nothing was read while nobody listened
+            listener.position = self._live_position()
+        try:
+            while True:
+                end = self.ring.written
+                if listener.position >= end:
+                    if self.runner is None or request.transport is None or request.transport.is_closing():
+                        break  # Shutting down, or the client left between songs
+                    try:
+                        await asyncio.wait_for(self.data_ready.wait(), IDLE_CHECK)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                if listener.position < self.ring.oldest:
+                    listener.position = self._live_position()
+                    listener.drops += 1
+                    continue
+                for view in self.ring.slices(listener.position, end):
+                    await asyncio.wait_for(response.write(view), SEND_TIMEOUT)
+                listener.sent += end - listener.position
+                listener.position = end
+        except (ConnectionError, asyncio.TimeoutError) as e:
+            logger.debug(f"Listener disconnected after {listener.sent} bytes: {e!r}")
+        finally:
+            self.listeners.discard(listener)
+        return response
+
+    async def handle_status(self, request: web.Request) -> web.Response:
+        return web.json_response(self.status())
+
+    def status(self) -> Dict[str, Any]:
+        track = self.track
+        return {
+            'url': self.url,
+            'port': self.port if self.running else None,
+            'listeners': len(self.listeners),
+            'playing': track is not None,
+            'position': round(track['sent'] / track['byte_rate'], 1) if track else None,
+            'replay_gain': track['meta'].get('replay_gain') if track else None,
+            'drops': sum(listener.drops for listener in self.listeners)
+        }
+
+    def _live_position(self) -> int:
+        """Where the room is now: LEAD_SECONDS behind the ring's head"""
+        byte_rate = self.track['byte_rate'] if self.track else DEFAULT_BYTE_RATE
+        return max(self.ring.oldest, self.ring.written - int(LEAD_SECONDS * byte_rate))
+
+    @staticmethod
+    def _byte_rate(meta: Dict[str, Any], size: int, duration: float) -> float:
+        bitrate = str(meta.get('bitrate') or '')
+        if bitrate.endswith('k') and bitrate[:-1].isdigit():
+            return int(bitrate[:-1]) * 1000 / 8
+        if duration:
+            return size / duration
+        return DEFAULT_BYTE_RATE
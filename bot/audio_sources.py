@@ -0,0 +1,107 @@
+import asyncio
+import glob
+import logging
+import os
+import shutil
+from typing import Any, Dict, Optional
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+AUDIO_LOCAL_DIR = os.getenv('AUDIO_LOCAL_DIR', '')  # serve tracks from local files instead of the platforms
+TRANSCODE_BITRATE = '128k'
+DOWNLOAD_CHUNK = 64 * 1024
+
+
+class LocalFileSource:
+    """Resolves tracks to files under <directory>/<platform>/<track id>.<ext>.
+
+    Stands in for the network sources in development and tests: the
+    prefetcher and cache behave exactly as they do against youtube-dl.
+    """
+
+    def __init__(self, directory: str = AUDIO_LOCAL_DIR):
+        self.directory = directory
+
+    async def resolve(self, song: Dict[str, Any]) -> str:
+        platform = (song.get('platform') or 'unknown').lower()
+        matches = sorted(glob.glob(os.path.join(glob.escape(self.directory), platform, f"{glob.escape(str(song.get('id')))}.*")))
+        if not matches:
+            raise FileNotFoundError(f"no local audio for {platform}/{song.get('id')}")
+        return matches[0]
+
+    async def fetch(self, song: Dict[str, Any], path: str) -> Dict[str, Any]:
+        source = await self.resolve(song)
+        await asyncio.get_running_loop().run_in_executor(None, shutil.copyfile, source, path)
+        return {'format': os.path.splitext(source)[1].lstrip('.') or 'audio', 'source': 'local'}
+
+
+class YoutubeDLSource:
+    """Resolves stream URLs with youtube-dl and stores them as MP3 when ffmpeg is available.
+
+    Spotify only serves DRM-protected streams, so Spotify tracks are matched
+    to a YouTube search on artist and title.
+    """
+
+    def __init__(self, ffmpeg: Optional[str] = None, bitrate: str = TRANSCODE_BITRATE):
+        self.ffmpeg = ffmpeg or shutil.which('ffmpeg')
+        self.bitrate = bitrate
+
+    async def resolve(self, song: Dict[str, Any]) -> Dict[str, Any]:
+        """Direct stream URL, container format and the headers the provider expects"""
+        if (song.get('platform') or '').lower() == 'spotify' or not song.get('url'):
+            query = f"ytsearch1:{song.get('artist', '')} {song.get('title', '')} audio"
+        else:
+            query = song['url']
+        info = await asyncio.get_running_loop().run_in_executor(None, self._extract, query)
+        if 'entries' in info:
+            if not info['entries']:
+                raise LookupError(f"no match for {query}")
+            info = info['entries'][0]
+        return {'url': info['url'], 'ext': info.get('ext') or 'audio', 'headers': info.get('http_headers') or {}}
+
+    def _extract(self, query: str) -> Dict[str, Any]:
+        import youtube_dl
+        options = {'format': 'bestaudio/best', 'quiet': True, 'no_warnings': True, 'noplaylist': True}
+        with youtube_dl.YoutubeDL(options) as ydl:
+            return ydl.extract_info(query, download=False)
+
+    async def fetch(self, song: Dict[str, Any], path: str) -> Dict[str, Any]:
+        stream = await self.resolve(song)
+        if self.ffmpeg:
+            await self._transcode(stream, path)
+            return {'format': 'mp3', 'source': 'youtube-dl', 'bitrate': self.bitrate}
+        await self._download(stream, path)
+        return {'format': stream['ext'], 'source': 'youtube-dl'}
+
+    async def _transcode(self, stream: Dict[str, Any], path: str) -> None:
+        headers = ''.join(f"{name}: {value}\r\n" for name, value in stream['headers'].items())
+        args = [self.ffmpeg, '-nostdin', '-loglevel', 'error', '-y']
+        if headers:
+            args += ['-headers', headers]
+        args += ['-i', stream['url'], '-vn', '-ac', '2', '-ar', '44100', '-b:a', self.bitrate, '-f', 'mp3', path]
+        process = await asyncio.create_subprocess_exec(*args, stderr=asyncio.subprocess.PIPE)
+        try:
+            _, stderr = await process.communicate()
+        except asyncio.CancelledError:
+            process.kill()
+            await process.wait()
+            raise
+        if process.returncode != 0:
+            raise RuntimeError(f"ffmpeg exited with {process.returncode}: {stderr.decode(errors='replace')[-200:]}")
+
+    async def _download(self, stream: Dict[str, Any], path: str) -> None:
+        async with aiohttp.ClientSession(headers=stream['headers']) as session:
+            async with session.get(stream['url']) as response:
+                response.raise_for_status()
+                with open(path, 'wb') as f:
+                    async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK):
+                        f.write(chunk)
+
+
+def default_audio_source() -> Any:
+    """Local files when AUDIO_LOCAL_DIR is set, otherwise the platforms via youtube-dl"""
+    if AUDIO_LOCAL_DIR:
+        return LocalFileSource(AUDIO_LOCAL_DIR)
+    return YoutubeDLSource()
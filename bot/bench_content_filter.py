@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+
+"""
+Measure per-message cost of the content filter as the blocklist grows.
+
+Builds blocklists of random words at each size and times ContentFilter.find
+on a fixed set of chat-sized messages (search queries and "title by artist"
+lines, a few with leetspeak and accents). "automaton" is the Aho-Corasick
+matcher the bot uses; "scan" checks every normalized term against the
+message in turn, the way a per-term loop or regex alternation would.
+
+    python bot/bench_content_filter.py --terms 100 1000 10000 100000
+"""
+
+import argparse
+import random
+import string
+import sys
+import time
+from typing import Callable, List, Optional
+
+from content_filter import ContentFilter, normalize
+
+MESSAGES = 2000
+
+
+def random_word(rng: random.Random) -> str:
+    return ''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 10)))
+
+
+def build_messages(rng: random.Random) -> List[str]:
+    samples = [
+        "Blinding Lights by The Weeknd", "lofi hip hop radio beats to relax", "Björk - Jóga (live)",
+        "l3v1t4t1ng dua lipa", "Good 4 U by Olivia Rodrigo", "Sabrina Carpenter Espresso official video"
+    ]
+    messages = []
+    for i in range(MESSAGES):
+        words = [random_word(rng) for _ in range(rng.randint(2, 8))]
+        messages.append(f"{samples[i % len(samples)]} {' '.join(words)}")
+    return messages
+
+
+def per_message_us(find: Callable[[str], Optional[str]], messages: List[str]) -> float:
+    start = time.perf_counter()
+    for message in messages:
+        find(message)
+    return (time.perf_counter() - start) / len(messages) * 1e6
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Content filter cost per message vs blocklist size")
+    parser.add_argument('--terms', type=int, nargs='+', default=[100, 1000, 10000, 100000])
+    parser.add_argument('--scan-limit', type=int, default=10000, help="skip the per-term scan above this size")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    messages = build_messages(rng)
+    print(f"{len(messages)} messages, {sum(map(len, messages)) / len(messages):.0f} chars on average")
+    print(f"{'terms':>8}{'build ms':>11}{'states':>10}{'automaton us/msg':>19}{'scan us/msg':>14}")
+
+    for size in args.terms:
+        terms = [random_word(rng) for _ in range(size)]
+        start = time.perf_counter()
+        content_filter = ContentFilter(terms)
+        build_ms = (time.perf_counter() - start) * 1e3
+        automaton = per_message_us(content_filter.find, messages)
+
+        scan = float('nan')
+        if size <= args.scan_limit:
+            padded = [f" {normalize(term)} " for term in terms]
+
+            def find_by_scan(text: str) -> Optional[str]:
+                text = f" {normalize(text)} "
+                return next((term for term in padded if term in text), None)
+
+            scan = per_message_us(find_by_scan, messages)
+        print(f"{size:>8}{build_ms:>11.1f}{len(content_filter.goto):>10}{automaton:>19.1f}{scan:>14.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
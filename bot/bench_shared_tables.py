@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+
+"""
+Measure per-process memory of the recommendation tables with 1 vs N bot processes.
+
+Each worker is a fresh interpreter (like the per-room bots BotManager spawns) that
+opens the catalog and neighbor tables, touches every page and reports its RSS and
+PSS while all workers are alive. "mmap" maps the shared snapshot read-only; "copy"
+loads private copies the way a per-process JSON/pickle load would.
+
+    python bot/bench_shared_tables.py --tracks 50000 --processes 1 50
+"""
+
+import argparse
+import multiprocessing as mp
+import os
+import sys
+import tempfile
+from typing import Dict, List
+
+import numpy as np
+
+from shared_tables import TrackCatalog
+
+TOP_K = 20
+
+
+def build_tables(path: str, n_tracks: int) -> None:
+    rng = np.random.default_rng(0)
+    keys = [f"youtube:https://www.youtube.com/watch?v={i:011d}" for i in range(n_tracks)]
+    tracks = [{'title': f"Track {i}", 'artist': f"Artist {i % 5000}", 'platform': 'YouTube'} for i in range(n_tracks)]
+    TrackCatalog.from_tracks(keys, tracks).save(path)
+    np.save(os.path.join(path, 'neighbors.npy'), rng.integers(0, n_tracks, (n_tracks, TOP_K), dtype=np.int32))
+    np.save(os.path.join(path, 'scores.npy'), rng.random((n_tracks, TOP_K), dtype=np.float32))
+
+
+def memory_kb() -> Dict[str, int]:
+    stats = {}
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                stats['rss'] = int(line.split()[1])
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            if line.startswith('Pss:'):
+                stats['pss'] = int(line.split()[1])
+    return stats
+
+
+def worker(path: str, mode: str, ready, release) -> None:
+    mmap_mode = 'r' if mode == 'mmap' else None
+    tables = [
+        np.load(os.path.join(path, name), mmap_mode=mmap_mode)
+        for name in ('catalog.npy', 'catalog_hashes.npy', 'catalog_order.npy', 'neighbors.npy', 'scores.npy')
+    ]
+    # Touch every page so the measurement reflects a fully warmed process
+    for table in tables:
+        view = np.asarray(table).view(np.uint8).reshape(-1)
+        int(view[::4096].sum())
+
+    ready.put(memory_kb())
+    release.wait()
+
+
+def run(path: str, mode: str, processes: int) -> List[Dict[str, int]]:
+    ctx = mp.get_context('spawn')
+    ready = ctx.Queue()
+    release = ctx.Event()
+    workers = [ctx.Process(target=worker, args=(path, mode, ready, release)) for _ in range(processes)]
+    for proc in workers:
+        proc.start()
+    stats = [ready.get() for _ in workers]
+    release.set()
+    for proc in workers:
+        proc.join()
+    return stats
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="RSS/PSS of shared recommendation tables")
+    parser.add_argument('--tracks', type=int, default=50000)
+    parser.add_argument('--processes', type=int, nargs='+', default=[1, 50])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as path:
+        build_tables(path, args.tracks)
+        size_mb = sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path)) / 1024 / 1024
+        print(f"Tables: {args.tracks} tracks, {size_mb:.1f} MB on disk")
+        print(f"{'mode':<6}{'procs':>7}{'RSS/proc MB':>14}{'PSS/proc MB':>14}{'total PSS MB':>15}")
+
+        for mode in ('copy', 'mmap'):
+            for processes in args.processes:
+                stats = run(path, mode, processes)
+                rss = sum(s['rss'] for s in stats) / len(stats) / 1024
+                pss = sum(s['pss'] for s in stats) / 1024
+                print(f"{mode:<6}{processes:>7}{rss:>14.1f}{pss / len(stats):>14.1f}{pss:>15.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,118 @@
+import logging
+import math
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from scheduler import Scheduler
+
+logger = logging.getLogger(__name__)
+
+# Animation length in seconds; an emote is only re-sent once the previous one has finished
+EMOTE_DURATIONS: Dict[str, float] = {
+    "dance-tiktok2": 10.4,
+    "dance-tiktok8": 10.9,
+    "dance-tiktok10": 8.2,
+    "dance-blackpink": 7.2,
+    "dance-weird": 21.8,
+    "dance-pinguin": 11.6,
+    "dance-anime": 8.5,
+    "dance-russian": 10.3,
+    "dance-shoppingcart": 4.3
+}
+DEFAULT_DURATION = 5.0
+BEATS_PER_BAR = 4
+MIN_BPM, MAX_BPM = 40, 240
+MAX_FAILURES = 5       # consecutive send failures before the routine stops
+RETRY_DELAY = 2.0      # seconds, doubled per consecutive failure
+
+
+def song_tempo(song: Optional[Dict[str, Any]]) -> Optional[float]:
+    """BPM from song metadata, if known and plausible"""
+    if not song:
+        return None
+    bpm = song.get('bpm') or song.get('tempo')
+    try:
+        bpm = float(bpm)
+    except (TypeError, ValueError):
+        return None
+    return bpm if MIN_BPM <= bpm <= MAX_BPM else None
+
+
+class Choreographer:
+    """Runs one dance routine at a time as a single job on the shared scheduler.
+
+    Each emote is held for its animation length from EMOTE_DURATIONS. With a
+    known tempo the hold is stretched to the next bar boundary so moves change
+    on the downbeat.
+    """
+
+    def __init__(self, scheduler: Scheduler, send_emote: Callable[[str], Awaitable[Any]],
+                 on_stop: Optional[Callable[[str], Awaitable[None]]] = None):
+        self.scheduler = scheduler
+        self.send_emote = send_emote
+        self.on_stop = on_stop  # called with a reason when the routine gives up
+        self.routine: List[str] = []
+        self.index = 0
+        self.bpm: Optional[float] = None
+        self.failures = 0
+        self.timer = None
+        self.generation = 0  # bumped per start so a step from an old routine never reschedules
+
+    @property
+    def dancing(self) -> bool:
+        return self.timer is not None
+
+    def start(self, routine: List[str]) -> bool:
+        """Start dancing; False if a routine is already running"""
+        if self.dancing or not routine:
+            return False
+        self.routine = list(routine)
+        self.index = 0
+        self.failures = 0
+        self.generation += 1
+        self.timer = self.scheduler.call_later(0, self._step, self.generation, name='dance')
+        return True
+
+    def stop(self) -> bool:
+        if not self.dancing:
+            return False
+        self.timer.cancel()
+        self.timer = None
+        return True
+
+    def set_tempo(self, bpm: Optional[float]) -> None:
+        """Align upcoming moves to this tempo (None for free timing)"""
+        self.bpm = bpm
+
+    def hold_time(self, emote: str) -> float:
+        duration = EMOTE_DURATIONS.get(emote, DEFAULT_DURATION)
+        if self.bpm is None:
+            return duration
+        bar = BEATS_PER_BAR * 60.0 / self.bpm
+        return math.ceil(duration / bar) * bar
+
+    async def _step(self, generation: int) -> None:
+        emote = self.routine[self.index]
+        try:
+            await self.send_emote(emote)
+            sent = True
+        except Exception as e:
+            logger.error(f"Dance emote {emote} failed: {e}")
+            sent = False
+
+        if generation != self.generation or not self.dancing:
+            return  # Stopped or restarted while the emote was being sent
+
+        if sent:
+            self.failures = 0
+            self.index = (self.index + 1) % len(self.routine)
+            delay = self.hold_time(emote)
+        else:
+            self.failures += 1
+            if self.failures >= MAX_FAILURES:
+                self.timer = None
+                if self.on_stop:
+                    await self.on_stop("too many failed emotes")
+                return
+            delay = RETRY_DELAY * 2 ** (self.failures - 1)
+
+        self.timer = self.scheduler.call_later(delay, self._step, generation, name='dance')
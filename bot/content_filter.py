@@ -0,0 +1,142 @@
+import logging
+import os
+import re
+import string
+import unicodedata
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# One term per line, '#' comments; a leading/trailing '*' matches inside words (e.g. "*word*")
+CONTENT_BLOCKLIST = os.getenv('CONTENT_BLOCKLIST', '')
+
+# Leetspeak and look-alike symbols, applied after accents are stripped
+LEET = {
+    '0': 'o', '1': 'i', '3': 'e', '4': 'a', '5': 's', '7': 't', '8': 'b', '9': 'g',
+    '@': 'a', '$': 's', '€': 'e', '£': 'l'
+}
+# Plain ASCII (most messages) needs only one translate; other punctuation becomes a word break
+ASCII_TABLE = str.maketrans({**{ch: ' ' for ch in string.punctuation}, **LEET})
+LEET_TABLE = str.maketrans(LEET)
+SEPARATORS = re.compile(r'[\W_]+')
+RUNS = re.compile(r'(.)\1\1+')  # three or more of the same character; doubles are real spelling
+
+
+def normalize(text: str) -> str:
+    """Lower-case words separated by single spaces, without accents or leetspeak.
+
+    Terms and messages go through the same steps, so "Ünicöde" and
+    "un1c0de" both meet "unicode" on common ground. Stretched letters
+    in messages are handled in ContentFilter.find.
+    """
+    if text.isascii():
+        text = text.lower().translate(ASCII_TABLE)
+    else:
+        text = unicodedata.normalize('NFKD', text)
+        text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+        text = SEPARATORS.sub(' ', text.casefold().translate(LEET_TABLE))
+    return ' '.join(text.split())
+
+
+class ContentFilter:
+    """Blocklist matcher built once into an Aho-Corasick automaton.
+
+    Every term becomes a path in a trie of characters, with failure links
+    to the longest suffix that is also a prefix of some term, so a message
+    is scanned once, character by character, no matter how many terms
+    there are. Terms are padded with spaces to match whole words only;
+    a '*' at either end drops that side's padding.
+    """
+
+    def __init__(self, terms: Iterable[str]):
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.match: List[Optional[str]] = [None]  # a term ending here or at a failure-link ancestor
+        self.terms = 0
+        for term in terms:
+            self._add(term)
+        self._link()
+
+    @classmethod
+    def from_file(cls, path: str) -> 'ContentFilter':
+        with open(path, encoding='utf-8') as f:
+            return cls(line for line in f if not line.lstrip().startswith('#'))
+
+    def __len__(self) -> int:
+        return self.terms
+
+    def find(self, text: str) -> Optional[str]:
+        """The first blocked term in text, or None"""
+        if not self.terms or not text:
+            return None
+        text = normalize(text)
+        if not RUNS.search(text):
+            return self._scan(text)
+        # A stretched letter ("baaad", "asssss") stands for a single or a double one
+        return self._scan(RUNS.sub(r'\1', text)) or self._scan(RUNS.sub(r'\1\1', text))
+
+    def _scan(self, text: str) -> Optional[str]:
+        goto, fail, match = self.goto, self.fail, self.match
+        state = 0
+        for ch in f" {text} ":
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if match[state] is not None:
+                return match[state]
+        return None
+
+    def allows(self, text: str) -> bool:
+        return self.find(text) is None
+
+    def allows_song(self, song: Dict[str, Any]) -> bool:
+        """Whether a song's title and artist may be queued or shown in chat"""
+        return self.allows(song.get('title') or '') and self.allows(song.get('artist') or '')
+
+    def _add(self, term: str) -> None:
+        term = term.strip()
+        prefix, suffix = ('' if term.startswith('*') else ' '), ('' if term.endswith('*') else ' ')
+        words = normalize(term.strip('*'))
+        if not words:
+            return
+        state = 0
+        for ch in f"{prefix}{words}{suffix}":
+            next_state = self.goto[state].get(ch)
+            if next_state is None:
+                next_state = len(self.goto)
+                self.goto.append({})
+                self.fail.append(0)
+                self.match.append(None)
+                self.goto[state][ch] = next_state
+            state = next_state
+        if self.match[state] is None:
+            self.match[state] = words
+            self.terms += 1
+
+    def _link(self) -> None:
+        # Breadth-first, so every failure target is finished before the states that point at it
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, child in self.goto[state].items():
+                queue.append(child)
+                target = self.fail[state]
+                while target and ch not in self.goto[target]:
+                    target = self.fail[target]
+                self.fail[child] = self.goto[target].get(ch, 0)
+                if self.match[child] is None:
+                    self.match[child] = self.match[self.fail[child]]
+
+
+def load_content_filter(path: str = CONTENT_BLOCKLIST) -> ContentFilter:
+    """The configured blocklist, or an empty filter that allows everything"""
+    if not path:
+        return ContentFilter([])
+    try:
+        content_filter = ContentFilter.from_file(path)
+    except OSError as e:
+        logger.error(f"Failed to load content blocklist {path}: {e}")
+        return ContentFilter([])
+    logger.info(f"Loaded {len(content_filter)} blocked terms from {path}")
+    return content_filter
@@ -0,0 +1,105 @@
+import asyncio
+import json
+import logging
+import sys
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+PROTOCOL_VERSION = 1
+MAX_LINE = 1024 * 1024  # bytes; longer requests are rejected
+
+
+class ControlChannel:
+    """NDJSON request/response and event channel over the process's stdio.
+
+    The bot manager writes one JSON object per line to stdin:
+
+        {"id": 7, "type": "config.update", "params": {...}}
+
+    and reads replies and unsolicited events from stdout:
+
+        {"type": "response", "id": 7, "ok": true, "result": {...}}
+        {"type": "event", "event": "song_started", "data": {...}}
+
+    Anything else on stdout (SDK prints, tracebacks) is not a JSON object with
+    one of those types, so the manager treats it as plain log output.
+    """
+
+    def __init__(self, handlers: Dict[str, Callable[[Dict[str, Any]], Awaitable[Any]]],
+                 stdin: Any = None, stdout: Any = None):
+        self.handlers = handlers  # request type -> coroutine taking the params
+        self.stdin = stdin or sys.stdin
+        self.stdout = stdout or sys.stdout
+        self.reader_task: Optional[asyncio.Task] = None
+        self.requests: set = set()
+
+    def start(self) -> bool:
+        """Start reading requests; False when stdin is not a pipe (e.g. run from a terminal)"""
+        if self.reader_task is not None:
+            return True
+        if self.stdin.isatty():
+            return False
+        self.reader_task = asyncio.get_running_loop().create_task(self._read_loop())
+        self.emit('ready', {'protocol': PROTOCOL_VERSION, 'requests': sorted(self.handlers)})
+        return True
+
+    def emit(self, event: str, data: Any = None) -> bool:
+        """Send an unsolicited event to the manager; False when not attached to one"""
+        if self.reader_task is None:
+            return False
+        self._write({'type': 'event', 'event': event, 'data': data})
+        return True
+
+    async def _read_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        reader = asyncio.StreamReader(limit=MAX_LINE)
+        await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), self.stdin)
+
+        while True:
+            try:
+                line = await reader.readline()
+            except ValueError:
+                # Over-long line: the reader drops it; answer without an id
+                self._write({'type': 'response', 'id': None, 'ok': False, 'error': 'request too large'})
+                continue
+            if not line:
+                logger.info("Control channel closed by the manager")
+                return
+            if not line.strip():
+                continue
+
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise ValueError("request must be a JSON object")
+            except ValueError as e:
+                self._write({'type': 'response', 'id': None, 'ok': False, 'error': f"invalid request: {e}"})
+                continue
+
+            # Requests run concurrently; a slow status query never holds up a config update
+            task = loop.create_task(self._dispatch(request))
+            self.requests.add(task)
+            task.add_done_callback(self.requests.discard)
+
+    async def _dispatch(self, request: Dict[str, Any]) -> None:
+        request_id = request.get('id')
+        handler = self.handlers.get(request.get('type'))
+        if handler is None:
+            self._write({'type': 'response', 'id': request_id, 'ok': False,
+                         'error': f"unknown request type: {request.get('type')}"})
+            return
+
+        try:
+            result = await handler(request.get('params') or {})
+            self._write({'type': 'response', 'id': request_id, 'ok': True, 'result': result})
+        except ValueError as e:
+            self._write({'type': 'response', 'id': request_id, 'ok': False, 'error': str(e)})
+        except Exception as e:
+            logger.error(f"Control request {request.get('type')} failed: {e}")
+            self._write({'type': 'response', 'id': request_id, 'ok': False, 'error': 'internal error'})
+
+    def _write(self, message: Dict[str, Any]) -> None:
+        # One write call per line so messages never interleave with other output
+        self.stdout.write(json.dumps(message, default=str) + '\n')
+        self.stdout.flush()
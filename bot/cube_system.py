@@ -1,14 +1,41 @@
+import asyncio
+import heapq
 import json
 import os
-from datetime import datetime, timedelta
-from typing import Dict, Any
+import uuid
+import logging
+from datetime import date, datetime, timezone, tzinfo
+from typing import Callable, Dict, Iterable, List, Any, Optional, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from scheduler import Scheduler
+
+logger = logging.getLogger(__name__)
+
+SAVE_DELAY = 1  # seconds; balance writes are batched, the transaction ledger is appended right away
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
 
 class CubeSystem:
-    def __init__(self):
+    def __init__(self, reset_timezone: str = "UTC", scheduler: Optional[Scheduler] = None):
+        self.scheduler = scheduler  # without one every change is written immediately
+        self.save_timer = None
         self.data_file = "cube_data.json"
+        self.ledger_file = "cube_transactions.jsonl"
         self.daily_limit = 50
+        self.reset_timezone = self._load_timezone(reset_timezone)
+        self.locks: Dict[str, asyncio.Lock] = {}
+        self.on_balance_change: Optional[Callable[[str, str, int], None]] = None  # (room_id, username, cubes)
+        self.on_transaction: Optional[Callable[[Dict[str, Any]], None]] = None
         self.load_data()
 
+    @staticmethod
+    def _load_timezone(name: str) -> tzinfo:
+        try:
+            return ZoneInfo(name)
+        except (ZoneInfoNotFoundError, ValueError):
+            logger.warning(f"Unknown daily reset timezone '{name}', using UTC")
+            return timezone.utc
+
     def load_data(self) -> None:
         """Load cube data from file"""
         if os.path.exists(self.data_file):
@@ -17,20 +44,105 @@ class CubeSystem:
         else:
             self.data = {}
 
+        # Reservations cannot survive a restart: the request that held them is gone
+        refunded = False
+        for room_data in self.data.values():
+            room_data.pop('daily_reset_time', None)
+            room_data.pop('idempotency_keys', None)
+            for user_data in room_data['users'].values():
+                self._migrate_reward_day(user_data)
+            for username, hold in room_data.pop('reservations', {}).items():
+                for amount in hold.values():
+                    room_data['users'][username]['cubes'] += amount
+                    refunded = True
+        if refunded:
+            self.save_data()
+
     def save_data(self) -> None:
-        """Save cube data to file"""
-        with open(self.data_file, 'w') as f:
+        """Save cube data to file atomically"""
+        self.save_timer = None
+        tmp_file = self.data_file + '.tmp'
+        with open(tmp_file, 'w') as f:
             json.dump(self.data, f, indent=2, default=str)
+        os.replace(tmp_file, self.data_file)
+
+    def schedule_save(self) -> None:
+        """Save soon, once for every change made until then"""
+        if self.scheduler is None:
+            self.save_data()
+        elif self.save_timer is None:
+            self.save_timer = self.scheduler.call_later(SAVE_DELAY, self.save_data, name='cube_save')
+
+    def _migrate_reward_day(self, user_data: Dict[str, Any]) -> None:
+        # Older files stored an ISO timestamp; the reward state is now an epoch-day integer
+        if 'last_daily_reward' in user_data:
+            last_reward = user_data.pop('last_daily_reward')
+            day = None
+            if last_reward:
+                claimed = datetime.fromisoformat(last_reward)
+                if claimed.tzinfo is None:
+                    claimed = claimed.astimezone()
+                day = claimed.astimezone(self.reset_timezone).date().toordinal() - EPOCH_ORDINAL
+            user_data['last_reward_day'] = day
+
+    def _ensure_user(self, users: Dict[str, Any], username: str, starting_cubes: Optional[int] = None) -> Dict[str, Any]:
+        """User record, created in memory (not persisted) if missing"""
+        if username not in users:
+            cubes = self.daily_limit if starting_cubes is None else starting_cubes
+            users[username] = {
+                'cubes': cubes,
+                'last_reward_day': None,
+                'total_earned': cubes,
+                'total_spent': 0
+            }
+        return users[username]
+
+    def _credit(self, room_id: str, username: str, amount: int) -> None:
+        user_data = self.data[room_id]['users'][username]
+        user_data['cubes'] += amount
+        user_data['total_earned'] += amount
+        self.data[room_id]['total_cubes_distributed'] += amount
+        self._balance_changed(room_id, username)
+
+    def _balance_changed(self, room_id: str, username: str) -> None:
+        if self.on_balance_change is not None:
+            self.on_balance_change(room_id, username, self.data[room_id]['users'][username]['cubes'])
+
+    def lock_for(self, username: str, room_id: str = "default") -> asyncio.Lock:
+        """Per-user lock serializing balance changes"""
+        key = f"{room_id}:{username}"
+        if key not in self.locks:
+            self.locks[key] = asyncio.Lock()
+        return self.locks[key]
+
+    def record_transaction(self, username: str, tx_type: str, amount: int, description: str,
+                           room_id: str = "default", gold_spent: Optional[float] = None) -> Dict[str, Any]:
+        """Append a transaction to the audit trail in the cubeTransactions shape"""
+        transaction = {
+            'id': uuid.uuid4().hex,
+            'roomId': room_id,
+            'userId': username,
+            'type': tx_type,  # purchase, spend, daily_reward, tip_bonus, prize
+            'amount': amount,
+            'description': description,
+            'goldSpent': gold_spent,
+            'createdAt': datetime.now().isoformat()
+        }
+        with open(self.ledger_file, 'a') as f:
+            f.write(json.dumps(transaction) + '\n')
+        if self.on_transaction is not None:
+            self.on_transaction(transaction)
+        return transaction
 
     async def initialize_room(self, room_id: str) -> None:
         """Initialize cube system for a room"""
         if room_id not in self.data:
             self.data[room_id] = {
                 'users': {},
-                'total_cubes_distributed': 0,
-                'daily_reset_time': datetime.now().isoformat()
+                'reservations': {},
+                'total_cubes_distributed': 0
             }
-            self.save_data()
+            self.schedule_save()
 
     async def get_user_cubes(self, username: str, room_id: str = "default") -> int:
         """Get user's cube balance"""
@@ -39,71 +151,114 @@ class CubeSystem:
         
         users = self.data[room_id]['users']
         if username not in users:
-            users[username] = {
-                'cubes': self.daily_limit,
-                'last_daily_reward': None,
-                'total_earned': self.daily_limit,
-                'total_spent': 0
-            }
-            self.save_data()
+            self._ensure_user(users, username)
+            self.schedule_save()
         
         return users[username]['cubes']
 
-    async def add_cubes(self, username: str, amount: int, room_id: str = "default") -> bool:
+    async def add_cubes(self, username: str, amount: int, room_id: str = "default",
+                        tx_type: str = "purchase", description: str = "Cubes added",
+                        gold_spent: Optional[float] = None) -> bool:
         """Add cubes to user's balance"""
         if room_id not in self.data:
             await self.initialize_room(room_id)
         
-        users = self.data[room_id]['users']
-        if username not in users:
-            users[username] = {
-                'cubes': 0,
-                'last_daily_reward': None,
-                'total_earned': 0,
-                'total_spent': 0
-            }
-        
-        users[username]['cubes'] += amount
-        users[username]['total_earned'] += amount
-        self.data[room_id]['total_cubes_distributed'] += amount
-        self.save_data()
-        return True
+        async with self.lock_for(username, room_id):
+            self._ensure_user(self.data[room_id]['users'], username, starting_cubes=0)
+            self._credit(room_id, username, amount)
+            self.record_transaction(username, tx_type, amount, description, room_id, gold_spent)
+            self.schedule_save()
+            return True
 
-    async def spend_cubes(self, username: str, amount: int, room_id: str = "default") -> bool:
-        """Spend cubes from user's balance"""
-        current_cubes = await self.get_user_cubes(username, room_id)
-        
-        if current_cubes < amount:
+    async def spend_cubes(self, username: str, amount: int, room_id: str = "default",
+                          description: str = "Cubes spent") -> bool:
+        """Spend cubes from user's balance in one step"""
+        reservation = await self.reserve_cubes(username, amount, room_id)
+        if reservation is None:
             return False
+        return await self.commit_reservation(reservation, description)
+
+    async def reserve_cubes(self, username: str, amount: int, room_id: str = "default") -> Optional[Dict[str, Any]]:
+        """Hold cubes for a pending purchase; returns None if the balance is too low"""
+        await self.get_user_cubes(username, room_id)  # Ensure user exists
         
-        users = self.data[room_id]['users']
-        users[username]['cubes'] -= amount
-        users[username]['total_spent'] += amount
-        self.save_data()
-        return True
+        async with self.lock_for(username, room_id):
+            room_data = self.data[room_id]
+            user_data = room_data['users'][username]
+            if user_data['cubes'] < amount:
+                return None
+            
+            reservation = {
+                'id': uuid.uuid4().hex,
+                'username': username,
+                'room_id': room_id,
+                'amount': amount,
+                'state': 'held'
+            }
+            if amount > 0:
+                user_data['cubes'] -= amount
+                room_data.setdefault('reservations', {}).setdefault(username, {})[reservation['id']] = amount
+                self.schedule_save()
+                self._balance_changed(room_id, username)
+            return reservation
+
+    async def commit_reservation(self, reservation: Dict[str, Any], description: str) -> bool:
+        """Turn held cubes into a spend; a no-op for anything not currently held"""
+        username = reservation['username']
+        room_id = reservation['room_id']
+        async with self.lock_for(username, room_id):
+            if reservation['state'] != 'held':
+                return False
+            reservation['state'] = 'committed'
+
+            amount = reservation['amount']
+            if amount > 0:
+                room_data = self.data[room_id]
+                room_data['reservations'][username].pop(reservation['id'], None)
+                room_data['users'][username]['total_spent'] += amount
+                self.record_transaction(username, 'spend', -amount, description, room_id)
+                self.schedule_save()
+            return True
+
+    async def refund_reservation(self, reservation: Dict[str, Any]) -> bool:
+        """Return held cubes to the balance; a no-op once committed or refunded"""
+        username = reservation['username']
+        room_id = reservation['room_id']
+        async with self.lock_for(username, room_id):
+            if reservation['state'] != 'held':
+                return False
+            reservation['state'] = 'refunded'
+
+            amount = reservation['amount']
+            if amount > 0:
+                room_data = self.data[room_id]
+                room_data['reservations'][username].pop(reservation['id'], None)
+                room_data['users'][username]['cubes'] += amount
+                self.schedule_save()
+                self._balance_changed(room_id, username)
+            return True
 
     async def check_daily_reward(self, username: str, room_id: str = "default") -> bool:
-        """Check and grant daily cube reward"""
+        """Grant the daily reward on the user's first interaction of the day (one write)"""
         if room_id not in self.data:
             await self.initialize_room(room_id)
         
+        today = self.current_day()
         users = self.data[room_id]['users']
-        if username not in users:
-            await self.get_user_cubes(username, room_id)  # Initialize user
-        
-        user_data = users[username]
-        last_reward = user_data.get('last_daily_reward')
-        
-        if last_reward:
-            last_reward_date = datetime.fromisoformat(last_reward)
-            if datetime.now() - last_reward_date < timedelta(days=1):
-                return False  # Already claimed today
+        user_data = users.get(username)
+        if user_data is not None and (user_data.get('last_reward_day') or -1) >= today:
+            return False  # Already claimed today; no lock, no I/O
         
-        # Grant daily reward
-        await self.add_cubes(username, self.daily_limit, room_id)
-        user_data['last_daily_reward'] = datetime.now().isoformat()
-        self.save_data()
-        return True
+        async with self.lock_for(username, room_id):
+            user_data = self._ensure_user(users, username)
+            if (user_data.get('last_reward_day') or -1) >= today:
+                return False
+            
+            user_data['last_reward_day'] = today
+            self._credit(room_id, username, self.daily_limit)
+            self.record_transaction(username, "daily_reward", self.daily_limit, "Daily cube reward", room_id)
+            self.schedule_save()
+            return True
 
     async def get_user_stats(self, username: str, room_id: str = "default") -> Dict[str, Any]:
         """Get user's cube statistics"""
@@ -117,25 +272,20 @@ class CubeSystem:
             'current_cubes': user_data['cubes'],
             'total_earned': user_data['total_earned'],
             'total_spent': user_data['total_spent'],
-            'last_daily_reward': user_data.get('last_daily_reward'),
+            'last_reward_day': user_data.get('last_reward_day'),
             'can_claim_daily': await self.can_claim_daily_reward(username, room_id)
         }
 
     async def can_claim_daily_reward(self, username: str, room_id: str = "default") -> bool:
         """Check if user can claim daily reward"""
-        if room_id not in self.data:
-            return True
-        
-        users = self.data[room_id]['users']
-        if username not in users:
-            return True
-        
-        last_reward = users[username].get('last_daily_reward')
-        if not last_reward:
+        user_data = self.data.get(room_id, {}).get('users', {}).get(username)
+        if user_data is None:
             return True
-        
-        last_reward_date = datetime.fromisoformat(last_reward)
-        return datetime.now() - last_reward_date >= timedelta(days=1)
+        return (user_data.get('last_reward_day') or -1) < self.current_day()
+
+    def current_day(self) -> int:
+        """Days since the Unix epoch in the reset timezone"""
+        return datetime.now(self.reset_timezone).date().toordinal() - EPOCH_ORDINAL
 
     async def get_room_stats(self, room_id: str = "default") -> Dict[str, Any]:
         """Get room cube statistics"""
@@ -144,30 +294,29 @@ class CubeSystem:
         
         room_data = self.data[room_id]
         active_users = len(room_data['users'])
-        total_cubes = sum(user['cubes'] for user in room_data['users'].values())
+        total_cubes = self.cubes_in_circulation(room_id)
         
         return {
             'active_users': active_users,
             'total_cubes_in_circulation': total_cubes,
             'total_cubes_distributed': room_data['total_cubes_distributed'],
-            'daily_reset_time': room_data.get('daily_reset_time')
+            'reset_timezone': str(self.reset_timezone)
         }
 
-    async def reset_daily_cubes(self, room_id: str = "default") -> None:
-        """Reset daily cube limits (called by scheduler)"""
+    def cubes_in_circulation(self, room_id: str = "default") -> int:
+        """Sum of all balances in a room"""
+        users = self.data.get(room_id, {}).get('users', {})
+        return sum(user['cubes'] for user in users.values())
+
+    async def get_top_users(self, limit: int = 5, room_id: str = "default",
+                            usernames: Optional[Iterable[str]] = None) -> List[Tuple[str, int]]:
+        """Highest (username, cubes) balances in a room, optionally among the given users only"""
         if room_id not in self.data:
-            return
-        
-        # Reset last daily reward for all users to allow new claims
-        for username in self.data[room_id]['users']:
-            user_data = self.data[room_id]['users'][username]
-            # Don't reset if already claimed today
-            last_reward = user_data.get('last_daily_reward')
-            if last_reward:
-                last_reward_date = datetime.fromisoformat(last_reward)
-                if datetime.now() - last_reward_date >= timedelta(days=1):
-                    # User is eligible for new daily reward
-                    pass
+            await self.initialize_room(room_id)
         
-        self.data[room_id]['daily_reset_time'] = datetime.now().isoformat()
-        self.save_data()
+        users = self.data[room_id]['users']
+        if usernames is None:
+            balances = ((username, data['cubes']) for username, data in users.items())
+        else:
+            balances = ((username, users[username]['cubes']) for username in usernames if username in users)
+        return heapq.nlargest(limit, balances, key=lambda entry: entry[1])
@@ -0,0 +1,256 @@
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+
+from scheduler import Scheduler
+
+logger = logging.getLogger(__name__)
+
+EVENT_LOG_DIR = os.getenv('EVENT_LOG_DIR', 'event_log')
+FLUSH_INTERVAL = 5          # seconds
+BUFFER_ROWS = 4096          # rows buffered in memory before an early flush
+SEGMENT_ROWS = 1 << 20      # rows per segment directory before rotating
+SCAN_CHUNK_ROWS = 1 << 18   # rows per chunk yielded by EventLogReader.scan
+NO_STRING = np.uint32(0xFFFFFFFF)
+
+# Event kinds
+COMMAND, PLAY, LIKE, TIP, JOIN, LEAVE, SPEND = 1, 2, 3, 4, 5, 6, 7
+KIND_NAMES = {COMMAND: 'command', PLAY: 'play', LIKE: 'like', TIP: 'tip', JOIN: 'join', LEAVE: 'leave', SPEND: 'spend'}
+
+# One raw little-endian file per column in every segment
+COLUMNS = {
+    'ts': np.dtype('<i8'),       # unix milliseconds
+    'kind': np.dtype('u1'),
+    'user': np.dtype('<u4'),     # string id of the username
+    'subject': np.dtype('<u4'),  # string id of the command or encoded track, NO_STRING if none
+    'value': np.dtype('<i4')     # cubes, gold, likes ... depending on kind
+}
+EVENT_DTYPE = np.dtype([(name, dtype) for name, dtype in COLUMNS.items()])
+STRINGS_FILE = 'strings.txt'
+
+
+def encode_track(song: Dict[str, Any]) -> str:
+    """Single-line track descriptor stored in the string dictionary"""
+    fields = (song.get('platform'), song.get('url') or song.get('id'), song.get('title'), song.get('artist'))
+    return '\t'.join(str(field or '').replace('\t', ' ').replace('\n', ' ') for field in fields)
+
+
+def decode_track(value: str) -> Dict[str, Any]:
+    platform, url, title, artist = value.split('\t')
+    return {'platform': platform, 'url': url, 'title': title, 'artist': artist}
+
+
+class EventLog:
+    """Append-only columnar log of room activity.
+
+    Appends only fill a row of an in-memory numpy buffer and intern strings in
+    a dictionary, so hot paths never touch the disk. Full buffers are swapped
+    out and appended to per-column files by an executor thread; new strings
+    are appended to strings.txt first, so every id on disk resolves. Segments
+    rotate every SEGMENT_ROWS rows and can be memory-mapped column by column.
+    """
+
+    def __init__(self, scheduler: Scheduler, path: str):
+        self.scheduler = scheduler
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.strings: Dict[str, int] = {}
+        self.new_strings: List[str] = []
+        self._load_strings()
+
+        self.buffer = np.zeros(BUFFER_ROWS, dtype=EVENT_DTYPE)
+        self.rows = 0
+        self.segment, self.segment_rows = self._last_segment()
+        # A single writer thread keeps batches, and the string ids they rely on, in order
+        self.writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='event_log')
+        self.early_flush = None
+        self.timer = None
+
+    def _load_strings(self) -> None:
+        strings_file = os.path.join(self.path, STRINGS_FILE)
+        if os.path.exists(strings_file):
+            with open(strings_file, 'rb+') as f:
+                data = f.read()
+                complete = data.rfind(b'\n') + 1
+                if complete < len(data):
+                    f.truncate(complete)  # Drop a string torn by a crash mid-write
+            for line in data[:complete].decode('utf-8').split('\n')[:-1]:
+                self.strings.setdefault(line, len(self.strings))
+
+    def _last_segment(self) -> tuple:
+        segments = sorted(name for name in os.listdir(self.path) if name.startswith('segment-'))
+        if not segments:
+            return 0, 0
+        segment_path = os.path.join(self.path, segments[-1])
+        rows = segment_length(segment_path)
+        # Align the columns again if a crash left some of them longer
+        for name, dtype in COLUMNS.items():
+            column_file = os.path.join(segment_path, f"{name}.bin")
+            if os.path.exists(column_file) and os.path.getsize(column_file) > rows * dtype.itemsize:
+                os.truncate(column_file, rows * dtype.itemsize)
+        return int(segments[-1].split('-')[1]), rows
+
+    def start(self) -> None:
+        if self.timer is None:
+            self.timer = self.scheduler.call_every(FLUSH_INTERVAL, self.flush, name='event_log_flush')
+
+    def intern(self, value: Optional[str]) -> np.uint32:
+        if value is None:
+            return NO_STRING
+        # One string per line; a stray '\r' would also split the line for text-mode readers
+        value = value.replace('\r', ' ').replace('\n', ' ')
+        string_id = self.strings.get(value)
+        if string_id is None:
+            string_id = len(self.strings)
+            self.strings[value] = string_id
+            self.new_strings.append(value)
+        return string_id
+
+    def append(self, kind: int, username: str, subject: Optional[str] = None, value: int = 0) -> None:
+        """Record one event; O(1) and never blocks"""
+        row = self.buffer[self.rows]
+        row['ts'] = int(time.time() * 1000)
+        row['kind'] = kind
+        row['user'] = self.intern(username)
+        row['subject'] = self.intern(subject)
+        row['value'] = value
+        self.rows += 1
+        if self.rows == len(self.buffer):
+            # Keep accepting events until the flush job runs
+            self.buffer = np.concatenate([self.buffer, np.zeros(len(self.buffer), dtype=EVENT_DTYPE)])
+            if self.early_flush is None:
+                self.early_flush = self.scheduler.call_later(0, self.flush, name='event_log_flush')
+
+    # Convenience wrappers for the bot's hot paths
+
+    def command(self, username: str, command: str) -> None:
+        self.append(COMMAND, username, command)
+
+    def play(self, username: str, song: Dict[str, Any]) -> None:
+        self.append(PLAY, username, encode_track(song))
+
+    def like(self, username: str, song: Dict[str, Any], likes: int) -> None:
+        self.append(LIKE, username, encode_track(song), likes)
+
+    def spend(self, username: str, song: Dict[str, Any], cubes: int) -> None:
+        self.append(SPEND, username, encode_track(song), cubes)
+
+    def tip(self, username: str, gold: int) -> None:
+        self.append(TIP, username, None, gold)
+
+    def join(self, username: str) -> None:
+        self.append(JOIN, username)
+
+    def leave(self, username: str) -> None:
+        self.append(LEAVE, username)
+
+    async def flush(self) -> None:
+        """Hand buffered rows to the writer thread"""
+        self.early_flush = None
+        if self.rows == 0:
+            return
+        rows, strings = self.buffer[:self.rows].copy(), self.new_strings
+        self.buffer = np.zeros(BUFFER_ROWS, dtype=EVENT_DTYPE)
+        self.rows = 0
+        self.new_strings = []
+        try:
+            await asyncio.get_running_loop().run_in_executor(self.writer, self._write, rows, strings)
+        except Exception as e:
+            logger.error(f"Failed to write {len(rows)} events: {e}")
+
+    def close(self) -> None:
+        """Write everything still buffered and wait for the writer (shutdown)"""
+        if self.rows:
+            self.writer.submit(self._write, self.buffer[:self.rows].copy(), self.new_strings)
+            self.rows = 0
+            self.new_strings = []
+        self.writer.shutdown(wait=True)
+
+    def _write(self, rows: np.ndarray, strings: List[str]) -> None:
+        if strings:
+            with open(os.path.join(self.path, STRINGS_FILE), 'a', encoding='utf-8', newline='\n') as f:
+                f.write(''.join(value + '\n' for value in strings))
+
+        start = 0
+        while start < len(rows):
+            if self.segment_rows >= SEGMENT_ROWS or self.segment == 0:
+                self.segment += 1
+                self.segment_rows = 0
+                os.makedirs(self._segment_path(self.segment), exist_ok=True)
+            take = min(len(rows) - start, SEGMENT_ROWS - self.segment_rows)
+            chunk = rows[start:start + take]
+            for name in COLUMNS:
+                with open(os.path.join(self._segment_path(self.segment), f"{name}.bin"), 'ab') as f:
+                    f.write(np.ascontiguousarray(chunk[name]).tobytes())
+            self.segment_rows += take
+            start += take
+
+    def _segment_path(self, segment: int) -> str:
+        return os.path.join(self.path, f"segment-{segment:06d}")
+
+
+def segment_length(segment_path: str) -> int:
+    """Complete rows in a segment; a torn write leaves columns of unequal length"""
+    lengths = []
+    for name, dtype in COLUMNS.items():
+        column_file = os.path.join(segment_path, f"{name}.bin")
+        lengths.append(os.path.getsize(column_file) // dtype.itemsize if os.path.exists(column_file) else 0)
+    return min(lengths)
+
+
+class EventLogReader:
+    """Memory-mapped, chunked scans over an event log directory"""
+
+    def __init__(self, path: str = EVENT_LOG_DIR):
+        self.path = path
+        self._strings: Optional[List[str]] = None
+
+    @property
+    def strings(self) -> List[str]:
+        if self._strings is None:
+            strings_file = os.path.join(self.path, STRINGS_FILE)
+            self._strings = []
+            if os.path.exists(strings_file):
+                # Only '\n' ends a string, matching the writer and _load_strings
+                with open(strings_file, 'r', encoding='utf-8', newline='\n') as f:
+                    self._strings = [line[:-1] for line in f if line.endswith('\n')]
+        return self._strings
+
+    def segments(self) -> List[str]:
+        if not os.path.isdir(self.path):
+            return []
+        return sorted(
+            os.path.join(self.path, name) for name in os.listdir(self.path) if name.startswith('segment-')
+        )
+
+    def columns(self, segment_path: str, names: Optional[List[str]] = None) -> Dict[str, np.ndarray]:
+        """Read-only memory maps of a segment's columns, trimmed to complete rows"""
+        rows = segment_length(segment_path)
+        mapped = {}
+        for name in names or COLUMNS:
+            if rows == 0:
+                mapped[name] = np.zeros(0, dtype=COLUMNS[name])
+            else:
+                mapped[name] = np.memmap(os.path.join(segment_path, f"{name}.bin"),
+                                         dtype=COLUMNS[name], mode='r', shape=(rows,))
+        return mapped
+
+    def scan(self, names: Optional[List[str]] = None,
+             chunk_rows: int = SCAN_CHUNK_ROWS) -> Iterator[Dict[str, np.ndarray]]:
+        """Yield column chunks across all segments in write order"""
+        for segment_path in self.segments():
+            mapped = self.columns(segment_path, names)
+            rows = len(next(iter(mapped.values())))
+            for start in range(0, rows, chunk_rows):
+                yield {name: column[start:start + chunk_rows] for name, column in mapped.items()}
+
+    def count_by_kind(self) -> Dict[str, int]:
+        counts = np.zeros(256, dtype=np.int64)
+        for chunk in self.scan(['kind']):
+            counts += np.bincount(chunk['kind'], minlength=256)
+        return {KIND_NAMES.get(kind, str(kind)): int(counts[kind]) for kind in np.flatnonzero(counts)}
@@ -0,0 +1,114 @@
+import asyncio
+import logging
+import math
+from typing import Any, Awaitable, Callable, Optional
+
+from highrise import Position
+
+from presence import PresenceIndex
+from scheduler import Scheduler
+
+logger = logging.getLogger(__name__)
+
+MIN_WALK_INTERVAL = 0.5  # seconds between walk_to calls
+MIN_DISTANCE = 0.75      # tiles; smaller target displacements are ignored
+OFFSET = 1.0             # stay this far behind the target on x and z
+
+
+class Follower:
+    """Keeps the bot walking after one user, driven by presence move events.
+
+    Moves that arrive faster than MIN_WALK_INTERVAL are coalesced: only the
+    latest target position is kept and walked to when the interval allows.
+    Following stops by itself when the target leaves the room.
+    """
+
+    def __init__(self, scheduler: Scheduler, presence: PresenceIndex,
+                 walk: Callable[[Position], Awaitable[Any]],
+                 on_stop: Callable[[str], Awaitable[None]]):
+        self.scheduler = scheduler
+        self.presence = presence
+        self.walk = walk
+        self.on_stop = on_stop  # called with the username when the target leaves
+        self.target_id: Optional[str] = None
+        self.target_name: Optional[str] = None
+        self.latest: Optional[Position] = None   # newest target position not yet walked to
+        self.walked: Optional[Position] = None   # target position of the last walk
+        self.last_walk = -math.inf
+        self.timer = None
+        self.walking = False
+
+    @property
+    def active(self) -> bool:
+        return self.target_id is not None
+
+    def start(self, user_id: str, username: str) -> None:
+        """Follow a user, replacing any current target"""
+        self.stop()
+        self.target_id = user_id
+        self.target_name = username
+        self.walked = None
+        self.presence.watch(user_id, self._on_event)
+
+        position = self.presence.position_of(user_id)
+        if isinstance(position, Position):
+            self._on_event('move', position)
+
+    def stop(self) -> None:
+        if self.target_id is not None:
+            self.presence.unwatch(self.target_id, self._on_event)
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        self.target_id = None
+        self.target_name = None
+        self.latest = None
+
+    def _on_event(self, event: str, position: Any) -> None:
+        if event == 'leave':
+            username = self.target_name
+            self.stop()
+            self.scheduler.call_later(0, self.on_stop, username, name='follow_stopped')
+            return
+
+        if not isinstance(position, Position):
+            return  # Sitting on furniture; wait until they stand up
+        if self.walked is not None and self._distance(position, self.walked) < MIN_DISTANCE:
+            self.latest = None
+            return
+
+        self.latest = position
+        if self.timer is None and not self.walking:
+            delay = self.last_walk + MIN_WALK_INTERVAL - asyncio.get_running_loop().time()
+            self.timer = self.scheduler.call_later(delay, self._flush, name='follow_walk')
+
+    async def _flush(self) -> None:
+        self.timer = None
+        target = self.latest
+        if target is None or not self.active:
+            return
+
+        self.latest = None
+        self.walking = True
+        self.last_walk = asyncio.get_running_loop().time()
+        try:
+            await self.walk(Position(
+                x=target.x + OFFSET,
+                y=target.y,
+                z=target.z + OFFSET,
+                facing=target.facing
+            ))
+            self.walked = target
+        except Exception as e:
+            logger.error(f"Follow walk failed: {e}")
+        finally:
+            self.walking = False
+
+        # Moves that arrived mid-walk were coalesced into self.latest
+        if self.latest is not None and self.active and self.timer is None:
+            delay = self.last_walk + MIN_WALK_INTERVAL - asyncio.get_running_loop().time()
+            self.timer = self.scheduler.call_later(delay, self._flush, name='follow_walk')
+
+    @staticmethod
+    def _distance(a: Position, b: Position) -> float:
+        return math.sqrt((a.x - b.x) ** 2 + (a.y - b.y) ** 2 + (a.z - b.z) ** 2)
@@ -0,0 +1,229 @@
+import asyncio
+import json
+import logging
+import os
+import uuid
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+from highrise.models import Error
+
+from scheduler import Scheduler
+
+logger = logging.getLogger(__name__)
+
+CONCURRENCY = 5          # invites in flight at once
+RATE_LIMIT = 10.0        # invites per second across all workers
+MAX_ATTEMPTS = 3         # per conversation, within one run
+RETRY_DELAY = 2.0        # seconds, doubled per attempt
+PROGRESS_INTERVAL = 30   # seconds between progress reports
+SAVE_DELAY = 5           # seconds; checkpoint writes are batched
+
+
+class RateLimiter:
+    """Spaces calls evenly so at most `rate` start per second"""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate
+        self.next_slot = 0.0
+        self.lock = asyncio.Lock()
+
+    async def wait(self) -> None:
+        async with self.lock:
+            loop = asyncio.get_running_loop()
+            now = loop.time()
+            delay = self.next_slot - now
+            self.next_slot = max(now, self.next_slot) + self.interval
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+
+class InviteCampaign:
+    """Background room-invite campaign over every conversation of registered users.
+
+    Conversations are paged with get_conversations and fed to a small pool of
+    senders through a bounded queue. Every conversation that received its invite
+    is checkpointed per room, so an interrupted campaign resumes where it stopped
+    and a conversation is never invited twice by the same campaign.
+    """
+
+    def __init__(self, scheduler: Scheduler,
+                 list_conversations: Callable[[Optional[str]], Awaitable[Any]],
+                 send_invite: Callable[[str, str], Awaitable[Any]],
+                 targets: Callable[[], Set[str]],
+                 report: Callable[[str], Awaitable[None]],
+                 data_file: Optional[str] = None):
+        self.scheduler = scheduler
+        self.list_conversations = list_conversations
+        self.send_invite = send_invite
+        self.targets = targets  # user ids that should receive the invite
+        self.report = report
+        self.room_id: Optional[str] = None
+        self.data_file = data_file  # set by attach unless given
+        self.state: Optional[Dict[str, Any]] = None
+        self.invited: Set[str] = set()
+        self.task: Optional[asyncio.Task] = None
+        self.progress_timer = None
+        self.save_timer = None
+
+    def attach(self, room_id: str) -> None:
+        """Scope the checkpoint to the room once it is known and pick up an unfinished campaign"""
+        if self.room_id is None:
+            self.room_id = room_id
+            self.data_file = self.data_file or f"invite_campaign_{room_id}.json"
+            self.load_data()
+
+    def load_data(self) -> None:
+        """Load the last campaign checkpoint from file"""
+        if self.data_file and os.path.exists(self.data_file):
+            with open(self.data_file, 'r') as f:
+                state = json.load(f)
+            if state.get('room_id') != self.room_id:
+                logger.warning(f"Ignoring invite checkpoint for room {state.get('room_id')} in {self.room_id}")
+                return
+            self.invited = set(state.pop('invited', []))
+            self.state = state
+
+    def save_data(self) -> None:
+        """Save the campaign checkpoint atomically"""
+        self.save_timer = None
+        if self.state is None or self.data_file is None:
+            return
+        tmp_file = self.data_file + '.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump({**self.state, 'invited': sorted(self.invited)}, f)
+        os.replace(tmp_file, self.data_file)
+
+    @property
+    def running(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+    @property
+    def resumable(self) -> bool:
+        return self.state is not None and self.state['status'] != 'completed'
+
+    def start(self, room_id: str) -> bool:
+        """Start a new campaign, or resume an unfinished one; False if already running"""
+        if self.running:
+            return False
+
+        # Invites always go to the room this bot runs in, never to one a checkpoint names
+        if not self.resumable or self.state['room_id'] != room_id:
+            self.state = {
+                'id': uuid.uuid4().hex,
+                'room_id': room_id,
+                'status': 'running',
+                'started_at': datetime.now().isoformat(),
+                'finished_at': None,
+                'scanned': 0,
+                'failed': 0
+            }
+            self.invited = set()
+        # Each run rescans from the first page; checkpointed conversations are skipped
+        self.state['status'] = 'running'
+        self.state['scanned'] = 0
+        self.state['failed'] = 0
+        self.save_data()
+
+        self.task = asyncio.get_running_loop().create_task(self._run())
+        self.progress_timer = self.scheduler.call_every(PROGRESS_INTERVAL, self._report_progress,
+                                                        name='invite_progress')
+        return True
+
+    async def stop(self) -> bool:
+        """Pause the running campaign; it can be resumed later"""
+        if not self.running:
+            return False
+        self.task.cancel()
+        await asyncio.gather(self.task, return_exceptions=True)
+        return True
+
+    def progress(self) -> str:
+        if self.state is None:
+            return "No invite campaign has been run yet."
+        return (f"Invite campaign {self.state['status']}: {len(self.invited)} invited, "
+                f"{self.state['scanned']} conversations scanned, {self.state['failed']} failed")
+
+    async def _run(self) -> None:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=CONCURRENCY * 2)
+        limiter = RateLimiter(RATE_LIMIT)
+        workers = [asyncio.create_task(self._sender(queue, limiter)) for _ in range(CONCURRENCY)]
+        status = 'paused'
+        try:
+            await self._page_conversations(queue)
+            await queue.join()
+            status = 'completed'
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"Invite campaign failed: {e}")
+            status = 'failed'
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            self._finish(status)
+
+        await self.report(f"📨 {self.progress()}")
+
+    async def _page_conversations(self, queue: asyncio.Queue) -> None:
+        last_id = None
+        while True:
+            response = await self.list_conversations(last_id)
+            conversations = getattr(response, 'conversations', None)
+            if conversations is None:
+                raise RuntimeError(f"get_conversations failed: {response}")
+            if not conversations:
+                return
+
+            targets = self.targets()
+            for conversation in conversations:
+                self.state['scanned'] += 1
+                if conversation.id in self.invited:
+                    continue
+                if not targets.intersection(conversation.member_ids or ()):
+                    continue
+                await queue.put(conversation.id)
+
+            last_id = conversations[-1].id
+
+    async def _sender(self, queue: asyncio.Queue, limiter: RateLimiter) -> None:
+        while True:
+            conversation_id = await queue.get()
+            try:
+                await self._invite(conversation_id, limiter)
+            finally:
+                queue.task_done()
+
+    async def _invite(self, conversation_id: str, limiter: RateLimiter) -> None:
+        for attempt in range(MAX_ATTEMPTS):
+            await limiter.wait()
+            try:
+                result = await self.send_invite(conversation_id, self.state['room_id'])
+                if not isinstance(result, Error):
+                    self.invited.add(conversation_id)
+                    if self.save_timer is None:
+                        self.save_timer = self.scheduler.call_later(SAVE_DELAY, self.save_data,
+                                                                    name='invite_checkpoint')
+                    return
+                logger.warning(f"Invite to {conversation_id} rejected: {result.message}")
+            except Exception as e:
+                logger.warning(f"Invite to {conversation_id} failed: {e}")
+            await asyncio.sleep(RETRY_DELAY * 2 ** attempt)
+
+        self.state['failed'] += 1
+
+    def _finish(self, status: str) -> None:
+        self.state['status'] = status
+        if status == 'completed':
+            self.state['finished_at'] = datetime.now().isoformat()
+        if self.progress_timer is not None:
+            self.progress_timer.cancel()
+            self.progress_timer = None
+        if self.save_timer is not None:
+            self.save_timer.cancel()
+        self.save_data()
+
+    async def _report_progress(self) -> None:
+        if self.running:
+            await self.report(f"📨 {self.progress()}")
@@ -1,40 +1,117 @@
 import asyncio
 import json
 import logging
-from typing import Dict, List, Optional, Any
+import os
+import time
+from typing import Dict, List, Optional, Any, Callable, Awaitable
 from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
 from highrise import BaseBot, User, Item, Position, CurrencyItem, Reaction
 from highrise.models import SessionMetadata
 
 from cube_system import CubeSystem
-from music_platforms import MusicPlatforms
+from music_platforms import MusicPlatforms, parse_track_link, parse_playlist_link
+from recommendations import RecommendationEngine
+from scheduler import Scheduler
+from private_messages import PrivateMessageInbox, UserDirectory
+from invite_campaign import InviteCampaign
+from presence import PresenceIndex
+from follow import Follower
+from choreography import Choreographer, song_tempo
+from room_snapshot import RoomSnapshotter
+from control_channel import ControlChannel
+from state_stream import StateStream, compact_item
+from analytics import AnalyticsAggregator
+from event_log import EventLog, EVENT_LOG_DIR
+from audio_cache import AudioCache, AudioPrefetcher, AUDIO_CACHE_DIR, audio_key
+from audio_relay import AudioRelay
+from audio_analysis import AudioAnalyzer
+from repeat_filter import RepeatFilter, REPEAT_WINDOW_MINUTES, REPEAT_HISTORY_HOURS
+from vote_skip import VoteSkip
+from content_filter import load_content_filter
+from playlist_import import PlaylistImporter, ADDED, SKIPPED, QUEUE_FULL, NO_CUBES
+from audio_sources import default_audio_source
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Dashboard config key -> (attribute, type); applied at start and on live updates
+CONFIG_FIELDS = {
+    'welcomeMessage': ('welcome_message', str),
+    'maxQueueSize': ('max_queue_size', int),
+    'songCost': ('song_cost', int),
+    'enableCompetitions': ('enable_competitions', bool),
+    'platformPreference': ('platform_preference', str),
+    'repeatWindowMinutes': ('repeat_window_minutes', int),
+    'repeatHistoryHours': ('repeat_history_hours', int)
+}
+PLATFORM_PREFERENCES = ('all', 'youtube', 'spotify', 'soundcloud')
+
 class HighriseMusicBot(BaseBot):
     def __init__(self, config: Dict[str, Any] = None):
         super().__init__()
-        self.config = config or {}
-        self.cube_system = CubeSystem()
-        self.music_platforms = MusicPlatforms()
+        # The SDK CLI constructs the bot without arguments; BotManager passes the config in the environment
+        self.config = config or json.loads(os.environ.get('BOT_CONFIG') or '{}')
+        self.scheduler = Scheduler()  # Shared timer source for every delayed/periodic job
+        self.cube_system = CubeSystem(reset_timezone=self.config.get('dailyResetTimezone', 'UTC'),
+                                      scheduler=self.scheduler)
+        self.music_platforms = MusicPlatforms(scheduler=self.scheduler)
+        self.recommender = RecommendationEngine()
         self.room_id = None
         self.current_song = None
+        self.song_timer = None
         self.music_queue = []
         self.competitions = {}
         self.user_data = {}
         self.vip_users = set()
         self.owner_users = set()
         self.registered_users = set()  # Users who sent -buyvisa in PM
-        self.is_dancing = False
+        self.pending_registrations = set()  # User ids that sent -buyvisa before we knew their username
+        self.user_directory = UserDirectory(self.scheduler)
+        self.presence = PresenceIndex()  # Who is in the room and where, from SDK events
+        self.follower = Follower(
+            self.scheduler, self.presence,
+            walk=lambda position: self.highrise.walk_to(position),
+            on_stop=self.handle_follow_stopped
+        )
+        self.inbox = PrivateMessageInbox(
+            self.scheduler,
+            fetch=lambda conversation_id, last_id: self.highrise.get_messages(conversation_id, last_id=last_id),
+            handler=self.handle_private_message
+        )
+        self.invite_campaign = InviteCampaign(
+            self.scheduler,
+            list_conversations=lambda last_id: self.highrise.get_conversations(not_joined=False, last_id=last_id),
+            send_invite=self.send_room_invite,
+            targets=self.registered_user_ids,
+            report=lambda text: self.highrise.chat(text)
+        )
+        self.choreographer = Choreographer(
+            self.scheduler,
+            send_emote=lambda emote: self.highrise.send_emote(emote),
+            on_stop=self.handle_dance_stopped
+        )
+        self.content_filter = load_content_filter()  # Blocklist for queries and titles echoed into chat
+        self.repeat_filter = RepeatFilter()  # Recently requested tracks and queries, refused before any search
+        self.vote_skip = VoteSkip(
+            self.scheduler,
+            present=self.room_listener_count,
+            current=lambda: self.current_song,
+            skip=self.play_next_song
+        )
+        self.playlists = PlaylistImporter(report=lambda text: self.highrise.chat(text))
+        self.snapshotter = None  # Created once the room id is known
+        self.event_log = None  # Columnar activity log, opened once the room id is known
+        self.prefetcher = None  # Fetches upcoming songs into the room's audio cache
+        self.audio_analyzer = None  # Loudness and tempo of cached tracks, on a process pool
+        self.audio_relay = AudioRelay(self.scheduler)  # Streams the current song from the cache to listeners
         self.dance_emotes = [
             "dance-tiktok2", "dance-tiktok8", "dance-tiktok10", 
             "dance-blackpink", "dance-weird", "dance-pinguin",
             "dance-anime", "dance-russian", "dance-shoppingcart"
         ]
-        self.current_dance_index = 0
         
         # Load configuration
         self.welcome_message = self.config.get('welcomeMessage', '🎵 Welcome! Use cubes to request songs!')
@@ -42,10 +119,36 @@ class HighriseMusicBot(BaseBot):
         self.song_cost = self.config.get('songCost', 10)
         self.enable_competitions = self.config.get('enableCompetitions', True)
         self.platform_preference = self.config.get('platformPreference', 'all')
+        self.repeat_window_minutes = self.config.get('repeatWindowMinutes', REPEAT_WINDOW_MINUTES)
+        self.repeat_history_hours = self.config.get('repeatHistoryHours', REPEAT_HISTORY_HOURS)
+        self.repeat_filter.configure(self.repeat_window_minutes, self.repeat_history_hours)
+        self.competition_duration = 600  # seconds
+        
+        # Live control from BotManager over stdio
+        self.control = ControlChannel({
+            'config.get': self.control_get_config,
+            'config.update': self.control_update_config,
+            'status': self.control_status,
+            'command': self.control_command,
+            'state.snapshot': self.control_state_snapshot
+        })
+        # Sequenced queue / now-playing / likes / balance deltas for the dashboard
+        self.state_stream = StateStream(self.scheduler, emit=self.control.emit, snapshot=self.dashboard_state)
+        self.cube_system.on_balance_change = lambda room_id, username, cubes: self.state_stream.balance(username, cubes)
+        # Pre-aggregated botStatistics rows, sent to the manager in batches
+        self.analytics = AnalyticsAggregator(
+            self.scheduler,
+            emit=lambda rows: self.control.emit('analytics.rows', {
+                'rows': rows,
+                'cubes_circulating': self.cube_system.cubes_in_circulation()
+            })
+        )
+        self.cube_system.on_transaction = self.analytics.record_transaction
         
         # Command handlers
         self.commands = {
             '-play': self.handle_play_command,
+            '-playlist': self.handle_playlist_command,
             '-queue': self.handle_queue_command,
             '-skip': self.handle_skip_command,
             '-like': self.handle_like_command,
@@ -67,6 +170,7 @@ class HighriseMusicBot(BaseBot):
             '-followme': self.handle_follow_command,
             '-dance': self.handle_dance_command,
             '-stopdance': self.handle_stop_dance_command,
+            '-listen': self.handle_listen_command,
             '-link': self.handle_song_link,
             '-url': self.handle_song_link,
             '-help': self.handle_help_command
@@ -79,6 +183,49 @@ class HighriseMusicBot(BaseBot):
         # Store session metadata and extract room ID
         self.session_metadata = session_metadata
         self.room_id = getattr(session_metadata.room_info, 'id', 'unknown')
+        self.inbox.ignored_senders.add(session_metadata.user_id)  # Our own replies
+        
+        # Before the first await: room events and requests can be handled while on_start is still waiting on the API
+        if self.event_log is None:
+            self.event_log = EventLog(self.scheduler, os.path.join(EVENT_LOG_DIR, self.room_id))
+            self.event_log.start()
+        self.invite_campaign.attach(self.room_id)
+        self.recommender.attach(self.room_id)
+        self.analytics.start(self.room_id)
+        
+        if self.prefetcher is None:
+            audio_cache = AudioCache(self.scheduler, os.path.join(AUDIO_CACHE_DIR, self.room_id))
+            self.audio_analyzer = AudioAnalyzer(audio_cache, on_analyzed=self.apply_audio_analysis)
+            self.prefetcher = AudioPrefetcher(
+                self.scheduler, audio_cache, default_audio_source(),
+                upcoming=self.upcoming_songs,
+                on_cached=self.audio_analyzer.submit
+            )
+            self.audio_analyzer.backfill()
+        
+        # Warm restart: pick up queue, current song, competitions and roles where we left off
+        if self.snapshotter is None:  # on_start runs again after a reconnect
+            self.snapshotter = RoomSnapshotter(self.scheduler, self.capture_room_state, f"room_state_{self.room_id}.bin")
+            self.restore_room_state()
+            self.snapshotter.start()
+        
+        # Seed presence once; join/leave/move events keep it current afterwards
+        try:
+            room_users = await self.highrise.get_room_users()
+            self.presence.seed(room_users.content)
+            for room_user, _ in room_users.content:
+                self.user_directory.remember(room_user.id, room_user.username)
+        except Exception as e:
+            logger.error(f"Failed to seed presence: {e}")
+        
+        try:
+            await self.audio_relay.start()
+        except OSError as e:
+            logger.error(f"Failed to start audio relay: {e}")
+        
+        if self.control.start():
+            self.control.emit('started', {'room_id': self.room_id})
+            self.state_stream.start()
         
         # Initialize room data  
         try:
@@ -104,18 +251,24 @@ class HighriseMusicBot(BaseBot):
         """Handle user joining the room"""
         logger.info(f"User joined: {user.username}")
         
+        self.presence.join(user, position)
+        self.analytics.record_user(user.username)
+        self.event_log.join(user.username)
+        self.user_directory.remember(user.id, user.username)
+        if user.id in self.pending_registrations:
+            self.pending_registrations.discard(user.id)
+            self.registered_users.add(user.username)
+        
         # Initialize user if not exists
         if user.username not in self.user_data:
             # Check if user is an owner
             user_role = 'owner' if user.username in ['OLD_SINNER_', 'admin'] else 'regular'
-            starting_cubes = 999999 if user_role == 'owner' else 50
             
+            # Balances live only in the cube ledger so the two never drift
             self.user_data[user.username] = {
                 'user_id': user.id,
-                'cubes': starting_cubes,
                 'songs_played': 0,
                 'songs_liked': 0,
-                'last_daily_reward': None,
                 'role': user_role
             }
             
@@ -123,11 +276,11 @@ class HighriseMusicBot(BaseBot):
             if user_role == 'owner':
                 self.owner_users.add(user.username)
                 self.registered_users.add(user.username)  # Owners are auto-registered
-            
-            # Grant daily cubes if it's a new day
-            await self.cube_system.check_daily_reward(user.username)
         
-        user_cubes = self.user_data[user.username]['cubes']
+        # Grant daily cubes on the first interaction of a new day
+        await self.cube_system.check_daily_reward(user.username)
+        
+        user_cubes = await self.cube_system.get_user_cubes(user.username)
         user_role = self.user_data[user.username]['role']
         
         if user_role == 'owner':
@@ -138,10 +291,18 @@ class HighriseMusicBot(BaseBot):
     async def on_user_leave(self, user: User) -> None:
         """Handle user leaving the room"""
         logger.info(f"User left: {user.username}")
+        self.presence.leave(user)
+        self.vote_skip.leave(user.id)
+        self.event_log.leave(user.username)
+
+    async def on_user_move(self, user: User, destination: Any) -> None:
+        """Track user movement"""
+        self.presence.move(user, destination)
 
     async def on_chat(self, user: User, message: str) -> None:
         """Handle chat messages and commands"""
         logger.info(f"Chat from {user.username}: {message}")
+        self.user_directory.remember(user.id, user.username)
         
         # Check if message is a command
         if message.startswith('-'):
@@ -150,7 +311,12 @@ class HighriseMusicBot(BaseBot):
             args = command_parts[1] if len(command_parts) > 1 else ""
             
             if command in self.commands:
+                self.analytics.record_user(user.username)
+                self.analytics.record_command(command)
+                self.event_log.command(user.username, command)
                 try:
+                    # O(1) and write-free unless this is the user's first interaction today
+                    await self.cube_system.check_daily_reward(user.username)
                     await self.commands[command](user, args)
                 except Exception as e:
                     logger.error(f"Error executing command {command}: {e}")
@@ -162,6 +328,8 @@ class HighriseMusicBot(BaseBot):
         """Handle tip reactions for cube purchases"""
         if receiver.username == "musicbot":  # Bot's username
             logger.info(f"Tip received from {sender.username}: {tip.amount} gold")
+            self.analytics.record_tip(tip.amount)
+            self.event_log.tip(sender.username, tip.amount)
             
             # Convert gold to cubes (10 gold = 1 cube, 100 gold = 10 cubes)
             if tip.amount >= 10:
@@ -173,46 +341,57 @@ class HighriseMusicBot(BaseBot):
                 elif tip.amount >= 10:
                     cubes_to_add = 1
                 
+                # TipReactionEvent carries no id, so there is nothing to deduplicate redeliveries on;
+                # identical tips sent in quick succession are each credited
                 if cubes_to_add > 0:
-                    await self.cube_system.add_cubes(sender.username, cubes_to_add)
+                    await self.cube_system.add_cubes(
+                        sender.username, cubes_to_add,
+                        tx_type="purchase", description=f"Tip of {tip.amount} gold",
+                        gold_spent=tip.amount
+                    )
                     await self.highrise.chat(f"🎁 {sender.username} received {cubes_to_add} cubes! Thanks for the tip!")
             else:
                 await self.highrise.chat(f"💝 Thanks for the tip {sender.username}! Tip 10+ gold to get cubes.")
 
     async def on_message(self, user_id: str, conversation_id: str, is_new_conversation: bool) -> None:
         """Handle private messages"""
+        # Only new messages are fetched; bursts for one conversation are coalesced
+        self.inbox.notify(conversation_id)
+
+    async def handle_private_message(self, conversation_id: str, message: Any) -> None:
+        """Handle a single new private message"""
         try:
-            # Get messages from this conversation
-            messages = await self.highrise.get_messages(conversation_id, last_id=None)
+            message_content = message.content.lower().strip()
             
-            if messages and len(messages.messages) > 0:
-                latest_message = messages.messages[0]  # Most recent message
-                message_content = latest_message.content.lower().strip()
-                
-                # Get user info from the message
-                sender_username = latest_message.user_id  # This would need proper user lookup
-                
-                # Handle -buyvisa registration
-                if message_content == '-buyvisa':
-                    # Add user to registered users
+            # Resolve the sender from the identity index filled by room events
+            sender_id = message.sender_id
+            sender_username = self.user_directory.username_for(sender_id)
+            
+            # Handle -buyvisa registration
+            if message_content == '-buyvisa':
+                # Add user to registered users
+                if sender_username:
                     self.registered_users.add(sender_username)
-                    
-                    # Send confirmation message
-                    await self.highrise.send_message(
-                        conversation_id=conversation_id,
-                        message="✅ Registration successful! You can now use the music bot in the room. Welcome to the community!",
-                        type="text"
-                    )
-                    
-                    logger.info(f"User {sender_username} registered via -buyvisa in PM")
                 else:
-                    # Send help message for unrecognized commands
-                    await self.highrise.send_message(
-                        conversation_id=conversation_id,
-                        message="📧 Send '-buyvisa' to register and access the music bot features!",
-                        type="text"
-                    )
-                    
+                    # Not seen in the room yet; completed when they join
+                    self.pending_registrations.add(sender_id)
+                
+                # Send confirmation message
+                await self.highrise.send_message(
+                    conversation_id=conversation_id,
+                    content="✅ Registration successful! You can now use the music bot in the room. Welcome to the community!",
+                    message_type="text"
+                )
+                
+                logger.info(f"User {sender_username or sender_id} registered via -buyvisa in PM")
+            else:
+                # Send help message for unrecognized commands
+                await self.highrise.send_message(
+                    conversation_id=conversation_id,
+                    content="📧 Send '-buyvisa' to register and access the music bot features!",
+                    message_type="text"
+                )
+                
         except Exception as e:
             logger.error(f"Error handling private message: {e}")
 
@@ -222,32 +401,92 @@ class HighriseMusicBot(BaseBot):
             await self.highrise.chat("Usage: -play <song name>")
             return
         
+        link = parse_track_link(args)
+        if link:
+            # A pasted track link is an exact match; look it up instead of searching for it
+            async def lookup() -> List[Dict[str, Any]]:
+                song = await self.music_platforms.get_song_info(*link)
+                return [song] if song else []
+            
+            await self.request_song(user, lookup, f"❌ Couldn't load that {link[0].capitalize()} link", args)
+            return
+        
+        async def search() -> List[Dict[str, Any]]:
+            return await self.music_platforms.search_all_platforms(
+                args, platform_preference=self.platform_preference
+            )
+        
+        await self.request_song(user, search, f"❌ No songs found for '{args}'", args)
+
+    async def check_can_request(self, user: User) -> bool:
+        """Check registration before a song request"""
         # Check if user is registered (sent -buyvisa in PM)
         if user.username not in self.registered_users and user.username not in ['OLD_SINNER_', 'admin']:
             await self.highrise.chat(f"❌ {user.username}, you must send me '-buyvisa' in PM first to use the bot!")
-            return
+            return False
+        
+        return True
 
-        # Check if user has enough cubes (unless VIP/Owner)
-        user_role = self.user_data.get(user.username, {}).get('role', 'regular')
-        if user_role not in ['owner', 'vip']:
-            user_cubes = self.user_data.get(user.username, {}).get('cubes', 0)
-            if user_cubes < 10:
-                await self.highrise.chat(f"❌ {user.username}, you need 10 cubes to request a song. You have {user_cubes}.")
-                return
+    async def request_song(self, user: User, search: Callable[[], Awaitable[List[Dict[str, Any]]]],
+                           not_found_message: str, query: str) -> None:
+        """Reserve the song cost, resolve the song and enqueue it, refunding on any failure"""
+        if not await self.check_can_request(user):
+            return
         
-        # Search for the song
-        search_results = await self.music_platforms.search_all_platforms(args)
+        if not self.content_filter.allows(query):
+            await self.highrise.chat(f"🚫 {user.username}, that request isn't allowed here.")
+            return
         
-        if not search_results:
-            await self.highrise.chat(f"❌ No songs found for '{args}'")
+        # Repeated requests are refused before they cost a reservation or a search
+        query_key = 'query:' + ' '.join(query.lower().split())
+        if await self.refuse_repeat(user, query_key):
             return
         
-        # Use the first result
-        song = search_results[0]
+        cost = self.request_cost(user.username)
         
-        # Deduct cubes if not VIP/Owner
-        if user_role not in ['owner', 'vip']:
-            await self.cube_system.spend_cubes(user.username, 10)
+        # Held before the search so concurrent requests cannot overspend
+        reservation = await self.cube_system.reserve_cubes(user.username, cost)
+        if reservation is None:
+            user_cubes = await self.cube_system.get_user_cubes(user.username)
+            await self.highrise.chat(f"❌ {user.username}, you need {cost} cubes to request a song. You have {user_cubes}.")
+            return
+        
+        try:
+            # Results are ranked, so the first one is the best match
+            results = [song for song in await search() if self.content_filter.allows_song(song)]
+            if not results:
+                await self.highrise.chat(not_found_message)
+                return
+            
+            if await self.refuse_repeat(user, audio_key(results[0])):
+                return
+            
+            await self.enqueue_song(user, results[0], reservation)
+            self.repeat_filter.record(query_key)
+        finally:
+            # No-op once the reservation has been committed
+            await self.cube_system.refund_reservation(reservation)
+
+    async def refuse_repeat(self, user: User, key: str) -> bool:
+        """Tell the user when a track or query was requested too recently; True if refused"""
+        wait = self.repeat_filter.wait_time(key)
+        if wait is None:
+            return False
+        if self.repeat_filter.recent_age(key) is not None:
+            await self.highrise.chat(f"🔁 {user.username}, that song was requested recently. Try again in {max(1, round(wait / 60))} min.")
+        else:
+            await self.highrise.chat(f"🔁 {user.username}, that song was played in the last {self.repeat_history_hours} hours.")
+        return True
+
+    def request_cost(self, username: str) -> int:
+        """Cubes charged per song; VIP/Owner requests are free but still go through the ledger"""
+        user_role = self.user_data.get(username, {}).get('role', 'regular')
+        return 0 if user_role in ['owner', 'vip'] else self.song_cost
+
+    async def enqueue_song(self, user: User, song: Dict[str, Any], reservation: Dict[str, Any],
+                           announce: bool = True) -> None:
+        """Commit the reserved cubes and add an already resolved song to the queue"""
+        await self.cube_system.commit_reservation(reservation, f"Song request: {song['title']}")
         
         # Add to queue
         queue_item = {
@@ -255,20 +494,72 @@ class HighriseMusicBot(BaseBot):
             'requested_by': user.username,
             'likes': 0,
             'timestamp': datetime.now(),
-            'cubes_spent': 0 if user_role in ['owner', 'vip'] else 10
+            'cubes_spent': reservation['amount']
         }
         
         self.music_queue.append(queue_item)
-        
-        await self.highrise.chat(f"🎵 {song['title']} by {song['artist']} added to queue by {user.username}!")
-        # Share the direct link for listening
-        if song.get('url'):
-            await self.highrise.chat(f"🔗 Listen here: {song['url']}")
+        self.repeat_filter.record(audio_key(song))
+        self.state_stream.queue_add(len(self.music_queue) - 1, queue_item)
+        self.prefetcher.notify()
+        self.recommender.record_spend(user.username, song, queue_item['cubes_spent'])
+        self.event_log.spend(user.username, song, queue_item['cubes_spent'])
+        self.schedule_recommendation_rebuild()
+        
+        if announce:
+            await self.highrise.chat(f"🎵 {song['title']} by {song['artist']} added to queue by {user.username}!")
+            # Share the direct link for listening
+            if song.get('url'):
+                await self.highrise.chat(f"🔗 Listen here: {song['url']}")
         
         # Start playing if nothing is currently playing
         if not self.current_song:
             await self.play_next_song()
 
+    async def handle_playlist_command(self, user: User, args: str) -> None:
+        """Handle -playlist command"""
+        args = args.strip()
+        if args.lower() in ('stop', 'stop all'):
+            user_role = self.user_data.get(user.username, {}).get('role', 'regular')
+            if args.lower() == 'stop all' and user_role == 'owner':
+                stopped = self.playlists.stop_all()
+                await self.highrise.chat(f"⏹️ Stopping {stopped} playlist import(s).")
+            elif not self.playlists.stop(user.username):
+                await self.highrise.chat(f"❌ {user.username}, you have no playlist import running.")
+            return
+        
+        link = parse_playlist_link(args)
+        if not link:
+            await self.highrise.chat("Usage: -playlist <YouTube/Spotify/SoundCloud playlist link> | -playlist stop")
+            return
+        if not await self.check_can_request(user):
+            return
+        
+        pages = self.music_platforms.playlist_pages(*link)
+        if not self.playlists.start(user.username, pages, add_song=lambda song: self.add_playlist_song(user, song)):
+            await pages.aclose()
+            await self.highrise.chat(f"❌ {user.username}, your playlist is still importing. Use -playlist stop to cancel it.")
+            return
+        await self.highrise.chat(f"📥 Importing {link[0].capitalize()} playlist for {user.username} ({self.request_cost(user.username)} cubes per song)...")
+
+    async def add_playlist_song(self, user: User, song: Dict[str, Any]) -> str:
+        """Queue one imported song under the same limit and price as -play"""
+        if len(self.music_queue) >= self.max_queue_size:
+            return QUEUE_FULL
+        if not self.content_filter.allows_song(song):
+            return SKIPPED
+        key = audio_key(song)
+        if self.repeat_filter.wait_time(key) is not None or any(audio_key(item['song']) == key for item in self.music_queue):
+            return SKIPPED
+        
+        reservation = await self.cube_system.reserve_cubes(user.username, self.request_cost(user.username))
+        if reservation is None:
+            return NO_CUBES
+        try:
+            await self.enqueue_song(user, song, reservation, announce=False)
+        finally:
+            await self.cube_system.refund_reservation(reservation)
+        return ADDED
+
     async def handle_queue_command(self, user: User, args: str) -> None:
         """Handle -queue command"""
         if not self.music_queue:
@@ -278,7 +569,7 @@ class HighriseMusicBot(BaseBot):
         queue_text = "🎵 **Music Queue:**\n"
         for i, item in enumerate(self.music_queue[:5], 1):
             song = item['song']
-            queue_text += f"{i}. {song['title']} by {song['artist']} (👤 {item['requested_by']}, ❤️ {item['likes']})\n"
+            queue_text += f"{i}. {self.song_label(song)} (👤 {item['requested_by']}, ❤️ {item['likes']})\n"
         
         if len(self.music_queue) > 5:
             queue_text += f"... and {len(self.music_queue) - 5} more songs"
@@ -291,13 +582,23 @@ class HighriseMusicBot(BaseBot):
             await self.highrise.chat("❌ No song is currently playing.")
             return
         
-        # Only VIP/Owner can skip, or if majority vote
+        # VIP/Owner skip outright; everyone else votes, and a majority of the room skips
         user_role = self.user_data.get(user.username, {}).get('role', 'regular')
         if user_role in ['owner', 'vip']:
-            await self.highrise.chat(f"⏭️ {user.username} skipped the current song.")
-            await self.play_next_song()
+            if self.vote_skip.skip_now():
+                await self.highrise.chat(f"⏭️ {user.username} skipped the current song.")
+            else:
+                await self.highrise.chat(f"⏭️ {user.username}, a skip is already pending for this song.")
+            return
+        
+        passed = self.vote_skip.vote(user.id)
+        votes, needed = len(self.vote_skip.voters), self.vote_skip.needed()
+        if passed is None:
+            await self.highrise.chat(f"🗳️ {user.username}, you already voted to skip ({votes}/{needed}).")
+        elif passed:
+            await self.highrise.chat(f"⏭️ Vote passed ({votes}/{needed}), skipping the current song.")
         else:
-            await self.highrise.chat("❌ Only VIP/Owner users can skip songs.")
+            await self.highrise.chat(f"🗳️ {user.username} voted to skip ({votes}/{needed}).")
 
     async def handle_like_command(self, user: User, args: str) -> None:
         """Handle -like command"""
@@ -305,17 +606,19 @@ class HighriseMusicBot(BaseBot):
             await self.highrise.chat("❌ No song is currently playing to like.")
             return
         
-        # Find current song in queue and increment likes
-        for item in self.music_queue:
-            if item == self.current_song:
-                item['likes'] += 1
-                break
+        # The playing song has already left the queue, so count the like on it directly
+        self.current_song['likes'] += 1
+        self.state_stream.likes(self.current_song['likes'])
+        
+        self.recommender.record_like(user.username, self.current_song['song'])
+        self.event_log.like(user.username, self.current_song['song'], self.current_song['likes'])
+        self.schedule_recommendation_rebuild()
         
         await self.highrise.chat(f"❤️ {user.username} liked the current song! ({self.current_song['likes']} likes)")
 
     async def handle_cubes_command(self, user: User, args: str) -> None:
         """Handle -cubes command"""
-        user_cubes = self.user_data.get(user.username, {}).get('cubes', 0)
+        user_cubes = await self.cube_system.get_user_cubes(user.username)
         user_role = self.user_data.get(user.username, {}).get('role', 'regular')
         
         role_text = ""
@@ -335,8 +638,8 @@ class HighriseMusicBot(BaseBot):
             return
         
         song = self.current_song['song']
-        if song.get('url'):
-            await self.highrise.chat(f"🔗 Current song: {song['title']} by {song['artist']}")
+        if song.get('url') and self.content_filter.allows_song(song):
+            await self.highrise.chat(f"🔗 Current song: {self.song_label(song)}")
             await self.highrise.chat(f"🎧 Listen here: {song['url']}")
         else:
             await self.highrise.chat("❌ No URL available for the current song.")
@@ -347,7 +650,14 @@ class HighriseMusicBot(BaseBot):
             await self.highrise.chat("Usage: -search <song name>")
             return
         
-        search_results = await self.music_platforms.search_all_platforms(args, limit=3)
+        if not self.content_filter.allows(args):
+            await self.highrise.chat(f"🚫 {user.username}, that search isn't allowed here.")
+            return
+        
+        search_results = await self.music_platforms.search_all_platforms(
+            args, limit=3, platform_preference=self.platform_preference
+        )
+        search_results = [song for song in search_results if self.content_filter.allows_song(song)]
         
         if not search_results:
             await self.highrise.chat(f"❌ No songs found for '{args}'")
@@ -362,8 +672,13 @@ class HighriseMusicBot(BaseBot):
 
     async def handle_recommend_command(self, user: User, args: str) -> None:
         """Handle -recommend command"""
-        # Get AI recommendations based on user history
-        recommendations = await self.music_platforms.get_recommendations(user.username)
+        # Served from the precomputed neighbor table built from room history
+        allowed = self.content_filter.allows_song
+        recommendations = [song for song in self.recommender.recommend(user.username) if allowed(song)]
+        
+        if not recommendations:
+            recommendations = [song for song in await self.music_platforms.get_recommendations(user.username)
+                               if allowed(song)]
         
         if not recommendations:
             recommendations = [
@@ -384,11 +699,12 @@ class HighriseMusicBot(BaseBot):
             await self.highrise.chat("Usage: -youtube <song name>")
             return
         
-        results = await self.music_platforms.search_youtube(args, limit=1)
-        if results:
-            await self.handle_play_command(user, results[0]['title'])
-        else:
-            await self.highrise.chat(f"❌ No YouTube results for '{args}'")
+        async def search() -> List[Dict[str, Any]]:
+            results = await self.music_platforms.search_youtube(args, limit=3)
+            # Enqueue the resolved track instead of searching every platform again
+            return self.music_platforms.rank_results(args, results)
+        
+        await self.request_song(user, search, f"❌ No YouTube results for '{args}'", args)
 
     async def handle_spotify_command(self, user: User, args: str) -> None:
         """Handle -spotify command"""
@@ -396,11 +712,12 @@ class HighriseMusicBot(BaseBot):
             await self.highrise.chat("Usage: -spotify <song name>")
             return
         
-        results = await self.music_platforms.search_spotify(args, limit=1)
-        if results:
-            await self.handle_play_command(user, results[0]['title'])
-        else:
-            await self.highrise.chat(f"❌ No Spotify results for '{args}'")
+        async def search() -> List[Dict[str, Any]]:
+            results = await self.music_platforms.search_spotify(args, limit=3)
+            # Enqueue the resolved track instead of searching every platform again
+            return self.music_platforms.rank_results(args, results)
+        
+        await self.request_song(user, search, f"❌ No Spotify results for '{args}'", args)
 
     async def handle_soundcloud_command(self, user: User, args: str) -> None:
         """Handle -soundcloud command"""
@@ -408,11 +725,12 @@ class HighriseMusicBot(BaseBot):
             await self.highrise.chat("Usage: -soundcloud <song name>")
             return
         
-        results = await self.music_platforms.search_soundcloud(args, limit=1)
-        if results:
-            await self.handle_play_command(user, results[0]['title'])
-        else:
-            await self.highrise.chat(f"❌ No SoundCloud results for '{args}'")
+        async def search() -> List[Dict[str, Any]]:
+            results = await self.music_platforms.search_soundcloud(args, limit=3)
+            # Enqueue the resolved track instead of searching every platform again
+            return self.music_platforms.rank_results(args, results)
+        
+        await self.request_song(user, search, f"❌ No SoundCloud results for '{args}'", args)
 
     async def handle_start_competition(self, user: User, args: str) -> None:
         """Handle -startcomp command"""
@@ -430,10 +748,12 @@ class HighriseMusicBot(BaseBot):
             'name': comp_name,
             'start_time': datetime.now(),
             'participants': {},
-            'active': True
+            'active': True,
+            'ends_at': time.time() + self.competition_duration,
+            'timer': self.scheduler.call_later(self.competition_duration, self.end_competition, name='competition_end')
         }
         
-        await self.highrise.chat(f"🏆 {comp_name} started! Most liked song wins. Duration: 10 minutes.")
+        await self.highrise.chat(f"🏆 {comp_name} started! Most liked song wins. Duration: {self.competition_duration // 60} minutes.")
 
     async def handle_end_competition(self, user: User, args: str) -> None:
         """Handle -endcomp command"""
@@ -446,6 +766,15 @@ class HighriseMusicBot(BaseBot):
             await self.highrise.chat("❌ No active competition.")
             return
         
+        await self.end_competition()
+
+    async def end_competition(self) -> None:
+        """End the active competition and award the prize (manually or when its timer fires)"""
+        competition = self.competitions.pop('music_comp', None)
+        if not competition:
+            return
+        competition['timer'].cancel()
+        
         # Find winner (most liked song)
         winner = None
         max_likes = 0
@@ -456,25 +785,23 @@ class HighriseMusicBot(BaseBot):
                 winner = item['requested_by']
         
         if winner:
-            await self.cube_system.add_cubes(winner, 100)  # Prize: 100 cubes
+            await self.cube_system.add_cubes(
+                winner, 100, tx_type="prize", description=f"Competition prize: {competition['name']}"
+            )  # Prize: 100 cubes
             await self.highrise.chat(f"🏆 Competition ended! Winner: {winner} with {max_likes} likes! Prize: 100 cubes!")
         else:
             await self.highrise.chat("🏆 Competition ended! No winner this time.")
-        
-        del self.competitions['music_comp']
 
     async def handle_leaderboard(self, user: User, args: str) -> None:
         """Handle -leaderboard command"""
-        # Sort users by cubes
-        sorted_users = sorted(
-            self.user_data.items(),
-            key=lambda x: x[1]['cubes'],
-            reverse=True
-        )
+        online_only = args.strip().lower() == 'online'
+        usernames = self.presence.online_usernames() if online_only else None
+        top_users = await self.cube_system.get_top_users(limit=5, usernames=usernames)
         
-        response = "🏆 **Leaderboard (Top Cubes):**\n"
-        for i, (username, data) in enumerate(sorted_users[:5], 1):
-            response += f"{i}. {username}: {data['cubes']} cubes\n"
+        title = "Top Cubes Online" if online_only else "Top Cubes"
+        response = f"🏆 **Leaderboard ({title}):**\n"
+        for i, (username, cubes) in enumerate(top_users, 1):
+            response += f"{i}. {username}: {cubes} cubes\n"
         
         await self.highrise.chat(response)
 
@@ -501,10 +828,20 @@ class HighriseMusicBot(BaseBot):
         """Handle -syncmusic command"""
         if self.current_song:
             song = self.current_song['song']
-            await self.highrise.chat(f"🎵 Now Playing: {song['title']} by {song['artist']} ({song['platform']})")
+            await self.highrise.chat(f"🎵 Now Playing: {self.song_label(song)} ({song['platform']})")
         else:
             await self.highrise.chat("🎵 No song currently playing.")
 
+    async def handle_listen_command(self, user: User, args: str) -> None:
+        """Handle -listen command"""
+        if not self.audio_relay.running:
+            await self.highrise.chat("❌ The audio stream is not available right now. Use -link instead.")
+            return
+        if self.audio_relay.url is None:
+            await self.highrise.chat("❌ The audio stream has no public address configured. Use -link instead.")
+            return
+        await self.highrise.chat(f"🎧 Listen in sync with the room: {self.audio_relay.url}")
+
     async def handle_invite_command(self, user: User, args: str) -> None:
         """Handle -inv command (owner only)"""
         user_role = self.user_data.get(user.username, {}).get('role', 'regular')
@@ -512,44 +849,48 @@ class HighriseMusicBot(BaseBot):
             await self.highrise.chat("❌ Only room owners can use invite commands.")
             return
         
-        if args.strip().lower() == 'all':
+        action = args.strip().lower()
+        if action == 'all':
             if len(self.registered_users) == 0:
                 await self.highrise.chat("❌ No registered users to invite.")
                 return
             
-            # Send room invite to all registered users
-            await self.highrise.chat(f"📨 Sending room invites to {len(self.registered_users)} registered users...")
+            resuming = self.invite_campaign.resumable
+            if not self.invite_campaign.start(self.room_id):
+                await self.highrise.chat(f"⏳ {self.invite_campaign.progress()}")
+                return
             
-            invite_count = 0
-            try:
-                # Get all conversations and send room invites
-                conversations = await self.highrise.get_conversations(not_joined=False)
-                
-                for conversation in conversations.conversations:
-                    if hasattr(conversation, 'id'):
-                        try:
-                            # Send room invite message
-                            await self.highrise.send_message(
-                                conversation_id=conversation.id,
-                                message=f"🎵 You're invited to join our music room! Come listen and request songs!",
-                                type="invite",
-                                room_id=self.room_id
-                            )
-                            invite_count += 1
-                        except Exception as e:
-                            logger.error(f"Failed to send invite to conversation {conversation.id}: {e}")
-                
-                await self.highrise.chat(f"✅ Room invites sent to {invite_count} registered users!")
-                
-            except Exception as e:
-                logger.error(f"Error sending room invites: {e}")
-                # Fallback to chat notification
-                registered_list = ', '.join(list(self.registered_users)[:10])
-                if len(self.registered_users) > 10:
-                    registered_list += f" and {len(self.registered_users) - 10} more"
-                await self.highrise.chat(f"📋 Registered users: {registered_list}")
+            if resuming:
+                await self.highrise.chat("📨 Resuming room invites; already invited conversations are skipped.")
+            else:
+                await self.highrise.chat(f"📨 Sending room invites to {len(self.registered_users)} registered users in the background...")
+        elif action == 'status':
+            await self.highrise.chat(f"📨 {self.invite_campaign.progress()}")
+        elif action == 'stop':
+            if await self.invite_campaign.stop():
+                await self.highrise.chat("⏸️ Room invites paused. Use -inv all to resume.")
+            else:
+                await self.highrise.chat("❌ No invite campaign is running.")
         else:
-            await self.highrise.chat("Usage: -inv all (invites all registered users)")
+            await self.highrise.chat("Usage: -inv all | status | stop (invites all registered users)")
+
+    async def send_room_invite(self, conversation_id: str, room_id: str) -> Any:
+        """Send a room invite into one conversation"""
+        return await self.highrise.send_message(
+            conversation_id=conversation_id,
+            content="🎵 You're invited to join our music room! Come listen and request songs!",
+            message_type="invite",
+            room_id=room_id
+        )
+
+    def registered_user_ids(self) -> set:
+        """User ids of everyone registered, for targeting invites"""
+        user_ids = set(self.pending_registrations)
+        for username in self.registered_users:
+            user_id = self.user_directory.user_id_for(username)
+            if user_id:
+                user_ids.add(user_id)
+        return user_ids
 
     async def handle_vip_command(self, user: User, args: str) -> None:
         """Handle -vip command (owner only)"""
@@ -576,33 +917,25 @@ class HighriseMusicBot(BaseBot):
             await self.highrise.chat("❌ Only room owners can make the bot follow them.")
             return
         
-        try:
-            # Get the user's current position
-            room_users = await self.highrise.get_room_users()
-            user_position = None
-            
-            for room_user in room_users.content:
-                if room_user[0].username == user.username:
-                    user_position = room_user[1]
-                    break
-            
-            if user_position:
-                # Move bot to user's position (slightly offset)
-                new_position = Position(
-                    x=user_position.x + 1,  # Slightly offset
-                    y=user_position.y,
-                    z=user_position.z + 1,
-                    facing=user_position.facing
-                )
-                
-                await self.highrise.walk_to(new_position)
-                await self.highrise.chat(f"🤖 Following {user.username}! I'm right behind you!")
+        if args.strip().lower() == 'stop':
+            if self.follower.active:
+                self.follower.stop()
+                await self.highrise.chat("🛑 Stopped following.")
             else:
-                await self.highrise.chat(f"❌ Could not find {user.username}'s position.")
-                
-        except Exception as e:
-            logger.error(f"Error in follow command: {e}")
-            await self.highrise.chat("❌ Failed to follow. Make sure I have movement permissions!")
+                await self.highrise.chat("❌ I'm not following anyone.")
+            return
+        
+        if not self.presence.is_online(user.id):
+            await self.highrise.chat(f"❌ Could not find {user.username}'s position.")
+            return
+        
+        # Every later move of the user is picked up from presence events
+        self.follower.start(user.id, user.username)
+        await self.highrise.chat(f"🤖 Following {user.username}! I'm right behind you! (-followme stop to end)")
+
+    async def handle_follow_stopped(self, username: str) -> None:
+        """Called when the followed user leaves the room"""
+        await self.highrise.chat(f"👋 {username} left, so I stopped following.")
 
     async def handle_dance_command(self, user: User, args: str) -> None:
         """Handle -dance command (owner only)"""
@@ -611,21 +944,13 @@ class HighriseMusicBot(BaseBot):
             await self.highrise.chat("❌ Only room owners can make the bot dance.")
             return
         
-        if self.is_dancing:
+        if self.choreographer.dancing:
             await self.highrise.chat("🕺 I'm already dancing! Use -stopdance to stop me.")
             return
         
-        self.is_dancing = True
+        self.choreographer.set_tempo(song_tempo(self.current_song['song']) if self.current_song else None)
+        self.choreographer.start(self.dance_emotes)
         await self.highrise.chat("🕺 Let's dance! Starting my dance moves!")
-        
-        # Start dancing with emotes in background
-        try:
-            # Start the dance loop as a background task
-            asyncio.create_task(self.start_dance_loop())
-        except Exception as e:
-            logger.error(f"Error starting dance: {e}")
-            self.is_dancing = False
-            await self.highrise.chat("❌ Failed to start dancing!")
 
     async def handle_stop_dance_command(self, user: User, args: str) -> None:
         """Handle -stopdance command (owner only)"""
@@ -634,41 +959,25 @@ class HighriseMusicBot(BaseBot):
             await self.highrise.chat("❌ Only room owners can stop the bot's dancing.")
             return
         
-        if not self.is_dancing:
+        if not self.choreographer.stop():
             await self.highrise.chat("💤 I'm not dancing right now!")
             return
         
-        self.is_dancing = False
         await self.highrise.chat("🛑 Dance stopped! Thanks for the fun!")
 
-    async def start_dance_loop(self) -> None:
-        """Start the dance loop with different emotes"""        
-        while self.is_dancing:
-            try:
-                # Get current dance emote
-                dance_emote = self.dance_emotes[self.current_dance_index]
-                
-                # Perform the dance emote
-                await self.highrise.send_emote(dance_emote)
-                
-                # Move to next dance emote
-                self.current_dance_index = (self.current_dance_index + 1) % len(self.dance_emotes)
-                
-                # Wait before next dance move
-                await asyncio.sleep(3)
-                
-            except Exception as e:
-                logger.error(f"Error in dance loop: {e}")
-                await asyncio.sleep(2)  # Wait a bit before retrying
+    async def handle_dance_stopped(self, reason: str) -> None:
+        """Called when the dance routine gives up on its own"""
+        await self.highrise.chat(f"💤 Dance stopped ({reason}).")
 
     async def handle_help_command(self, user: User, args: str) -> None:
         """Handle -help command"""
         help_text = """🎵 **Highrise Music Bot Commands:**
 
 **Music Commands:**
--play <song> - Add song to queue (10 cubes)
+-play <song or link> - Add song to queue (10 cubes)
+-playlist <link> - Queue a playlist (10 cubes per song); -playlist stop to cancel
 -queue - Show current music queue
--skip - Skip current song (VIP/Owner only)
+-skip - Vote to skip (VIP/Owner skip instantly)
 -like - Like the current song
 -link / -url - Get current song URL to listen
 -search <song> - Search for songs
@@ -686,14 +995,15 @@ class HighriseMusicBot(BaseBot):
 **Competition Commands:**
 -startcomp [name] - Start competition (VIP/Owner)
 -endcomp - End competition (VIP/Owner)
--leaderboard - Show top users
+-leaderboard [online] - Show top users
 
 **Room Commands:**
 -createlink - Create shareable room link (VIP/Owner)
 -syncmusic - Show current playing song
+-listen - Get the room's live audio stream
 -vip <user> - Grant VIP status (Owner only)
 -inv all - Invite all registered users (Owner only)
--followme - Make bot follow you (Owner only)
+-followme [stop] - Make bot follow you (Owner only)
 -dance - Start bot dancing (Owner only)
 -stopdance - Stop bot dancing (Owner only)
 
@@ -707,28 +1017,271 @@ Tip the bot 10+ gold to buy cubes!"""
 
     async def play_next_song(self) -> None:
         """Play the next song in queue"""
+        # A skip replaces the pending advance instead of racing it
+        if self.song_timer:
+            self.song_timer.cancel()
+            self.song_timer = None
+        
         if not self.music_queue:
             self.current_song = None
+            self.choreographer.set_tempo(None)
+            self.state_stream.now_playing(None)
+            self.prefetcher.notify()
+            self.audio_relay.clear()
             await self.highrise.chat("🎵 Queue is empty. Add songs with -play!")
             return
         
         # Get next song
         next_item = self.music_queue.pop(0)
+        next_item['started_at'] = time.time()
         self.current_song = next_item
+        self.state_stream.queue_remove(0)
+        self.state_stream.now_playing(next_item)
+        self.apply_cached_analysis(next_item['song'])
+        self.choreographer.set_tempo(song_tempo(next_item['song']))
+        self.prefetcher.notify()
+        
+        self.scheduler.call_later(0, self.relay_current_song, name='audio_relay')
         
         song = next_item['song']
-        await self.highrise.chat(f"🎵 Now Playing: {song['title']} by {song['artist']} (Requested by {next_item['requested_by']})")
+        self.recommender.record_play(next_item['requested_by'], song)
+        self.analytics.record_play(song)
+        self.event_log.play(next_item['requested_by'], song)
+        self.schedule_recommendation_rebuild()
+        await self.highrise.chat(f"🎵 Now Playing: {self.song_label(song)} (Requested by {next_item['requested_by']})")
         
         # Simulate song duration (in a real bot, this would be the actual song length)
         song_duration = song.get('duration', 180)  # Default 3 minutes
         
         # Schedule next song
-        asyncio.create_task(self.schedule_next_song(song_duration))
+        self.song_timer = self.scheduler.call_later(song_duration, self.play_next_song, name='next_song')
+
+    def apply_config(self, changes: Dict[str, Any]) -> Dict[str, Any]:
+        """Validate config changes and apply them all at once; raises ValueError and applies nothing on bad input"""
+        updates = {}
+        reset_timezone = None
+        for key, value in changes.items():
+            if key == 'dailyResetTimezone':
+                try:
+                    reset_timezone = ZoneInfo(value)
+                except (ZoneInfoNotFoundError, ValueError, TypeError):
+                    raise ValueError(f"Unknown timezone: {value}")
+                continue
+            if key not in CONFIG_FIELDS:
+                continue  # Dashboard rows carry ids, tokens and timestamps the bot does not use
+            
+            attribute, expected = CONFIG_FIELDS[key]
+            if value is None and key == 'welcomeMessage':
+                updates[attribute] = None
+                continue
+            if not isinstance(value, expected) or (expected is int and isinstance(value, bool)):
+                raise ValueError(f"{key} must be of type {expected.__name__}")
+            if expected is int and value < 0:
+                raise ValueError(f"{key} must not be negative")
+            if key == 'maxQueueSize' and value < 1:
+                raise ValueError("maxQueueSize must be at least 1")
+            if key == 'platformPreference' and value not in PLATFORM_PREFERENCES:
+                raise ValueError(f"platformPreference must be one of {', '.join(PLATFORM_PREFERENCES)}")
+            updates[attribute] = value
+        
+        # No awaits from here on, so handlers never see a half-applied config
+        for attribute, value in updates.items():
+            setattr(self, attribute, value)
+        if reset_timezone is not None:
+            self.cube_system.reset_timezone = reset_timezone
+        self.repeat_filter.configure(self.repeat_window_minutes, self.repeat_history_hours)
+        self.config = {**self.config, **changes}
+        return self.current_config()
+
+    def current_config(self) -> Dict[str, Any]:
+        config = {key: getattr(self, attribute) for key, (attribute, _) in CONFIG_FIELDS.items()}
+        config['dailyResetTimezone'] = str(self.cube_system.reset_timezone)
+        return config
+
+    async def control_get_config(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        return self.current_config()
+
+    async def control_update_config(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        config = self.apply_config(params.get('config') or {})
+        logger.info(f"Configuration updated: Max queue: {self.max_queue_size}, Song cost: {self.song_cost} cubes")
+        self.control.emit('config_updated', config)
+        return config
+
+    async def control_status(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        current = self.current_song
+        return {
+            'room_id': self.room_id,
+            'current_song': {
+                **current['song'],
+                'requested_by': current['requested_by'],
+                'elapsed': int(time.time() - current['started_at'])
+            } if current else None,
+            'queue_length': len(self.music_queue),
+            'users_online': len(self.presence),
+            'registered_users': len(self.registered_users),
+            'competition_active': 'music_comp' in self.competitions,
+            'dancing': self.choreographer.dancing,
+            'following': self.follower.target_name,
+            'invites': self.invite_campaign.progress(),
+            'audio_cache': self.prefetcher.cache.stats(),
+            'audio_relay': self.audio_relay.status(),
+            'scheduled_jobs': len(self.scheduler.pending()),
+            'config': self.current_config()
+        }
+
+    async def control_state_snapshot(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        return self.state_stream.send_snapshot()
+
+    def dashboard_state(self) -> Dict[str, Any]:
+        """Full state behind the dashboard's delta stream"""
+        users = self.cube_system.data.get('default', {}).get('users', {})
+        return {
+            'room_id': self.room_id,
+            'now_playing': compact_item(self.current_song),
+            'queue': [compact_item(item) for item in self.music_queue],
+            'balances': {
+                username: users[username]['cubes']
+                for username in self.presence.online_usernames() if username in users
+            }
+        }
+
+    async def control_command(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Run a manager-issued room action"""
+        name = params.get('name')
+        if name == 'say':
+            message = str(params.get('message') or '').strip()
+            if not message:
+                raise ValueError("say needs a message")
+            await self.highrise.chat(message)
+        elif name == 'skip':
+            return {'skipped': self.vote_skip.skip_now()}
+        elif name == 'clear_queue':
+            cleared = len(self.music_queue)
+            self.music_queue = []
+            self.state_stream.queue_clear()
+            self.prefetcher.notify()
+            return {'cleared': cleared}
+        else:
+            raise ValueError(f"unknown command: {name}")
+        return {}
+
+    def capture_room_state(self) -> Dict[str, Any]:
+        """Room state for warm-restart snapshots, one entry per snapshot section"""
+        return {
+            'queue': self.music_queue,
+            'current': self.current_song,
+            'competitions': {
+                key: {k: v for k, v in competition.items() if k != 'timer'}
+                for key, competition in self.competitions.items()
+            },
+            'users': {
+                'user_data': self.user_data,
+                'vip_users': sorted(self.vip_users),
+                'owner_users': sorted(self.owner_users),
+                'registered_users': sorted(self.registered_users),
+                'pending_registrations': sorted(self.pending_registrations)
+            }
+        }
+
+    def restore_room_state(self) -> None:
+        """Restore the last room snapshot and resume the current song at its offset"""
+        snapshot = self.snapshotter.load()
+        if not snapshot:
+            return
+        
+        sections = snapshot['sections']
+        users = sections.get('users') or {}
+        self.user_data.update(users.get('user_data', {}))
+        self.vip_users.update(users.get('vip_users', []))
+        self.owner_users.update(users.get('owner_users', []))
+        self.registered_users.update(users.get('registered_users', []))
+        self.pending_registrations.update(users.get('pending_registrations', []))
+        restored_queue = sections.get('queue') or []
+        for item in restored_queue:
+            self.repeat_filter.record(audio_key(item['song']))
+        # Requests already taken this session stay, after the ones that were waiting before the restart
+        self.music_queue = restored_queue + self.music_queue
+        
+        now = time.time()
+        for key, competition in (sections.get('competitions') or {}).items():
+            competition['timer'] = self.scheduler.call_later(
+                competition['ends_at'] - now, self.end_competition, name='competition_end'
+            )
+            self.competitions[key] = competition
+        
+        current = sections.get('current')
+        if current and self.current_song is None:
+            # Listeners kept playing while we were down, so the offset is wall-clock time
+            elapsed = now - current['started_at']
+            remaining = current['song'].get('duration', 180) - elapsed
+            if remaining > 0:
+                self.current_song = current
+                self.repeat_filter.record(audio_key(current['song']))
+                self.apply_cached_analysis(current['song'])
+                self.choreographer.set_tempo(song_tempo(current['song']))
+                if self.song_timer:
+                    self.song_timer.cancel()
+                self.song_timer = self.scheduler.call_later(remaining, self.play_next_song, name='next_song')
+                self.scheduler.call_later(0, self.relay_current_song, name='audio_relay')
+                logger.info(f"Resumed {current['song']['title']} at {int(elapsed)}s")
+            else:
+                self.scheduler.call_later(0, self.play_next_song, name='next_song')
+        
+        self.prefetcher.notify()
+        logger.info(f"Restored room state from snapshot ({len(self.music_queue)} queued songs)")
+
+    async def relay_current_song(self) -> None:
+        """Point the audio relay at the current song once its audio is in the cache"""
+        item = self.current_song
+        if item is None:
+            return
+        song = item['song']
+        duration = song.get('duration', 180)
+        path = self.prefetcher.path_for(song)
+        if path is None:
+            logger.info(f"{song['title']} was not prefetched in time")
+            path = await self.prefetcher.wait_for(song, timeout=duration)
+        # The song may have been skipped while we waited
+        if path and self.current_song is item:
+            self.audio_relay.play(path, self.prefetcher.cache.meta(audio_key(song)), item['started_at'], duration)
+
+    def apply_cached_analysis(self, song: Dict[str, Any]) -> None:
+        """Copy tempo and replay gain from the audio cache onto a song, when it has been analyzed"""
+        meta = self.prefetcher.cache.meta(audio_key(song)) or {}
+        for field in ('bpm', 'replay_gain'):
+            if meta.get(field) is not None:
+                song[field] = meta[field]
+
+    def apply_audio_analysis(self, key: str, result: Dict[str, Any]) -> None:
+        """A cached track was analyzed: update its queue entries and retime the dance if it is playing"""
+        items = [self.current_song] + self.music_queue if self.current_song else self.music_queue
+        for item in items:
+            if audio_key(item['song']) == key:
+                self.apply_cached_analysis(item['song'])
+                if item is self.current_song:
+                    self.choreographer.set_tempo(song_tempo(item['song']))
+
+    def song_label(self, song: Dict[str, Any]) -> str:
+        """'Title by Artist' for chat, hidden when it is blocked"""
+        # Queued songs were checked on the way in; this covers snapshots from before the blocklist changed
+        if not self.content_filter.allows_song(song):
+            return "🚫 (hidden)"
+        return f"{song['title']} by {song['artist']}"
+
+    def room_listener_count(self) -> int:
+        """People in the room, not counting the bot"""
+        bot_id = getattr(getattr(self, 'session_metadata', None), 'user_id', None)
+        return len(self.presence) - (bot_id in self.presence.users)
+
+    def upcoming_songs(self) -> List[Dict[str, Any]]:
+        """The current song followed by the queue, in play order"""
+        items = [self.current_song] + self.music_queue if self.current_song else self.music_queue
+        return [item['song'] for item in items]
 
-    async def schedule_next_song(self, duration: int) -> None:
-        """Schedule the next song to play"""
-        await asyncio.sleep(duration)
-        await self.play_next_song()
+    def schedule_recommendation_rebuild(self) -> None:
+        """Refresh the recommendation table in the background once enough events accumulate"""
+        if self.recommender.needs_rebuild():
+            self.scheduler.call_later(0, self.recommender.rebuild_async, name='recommendation_rebuild')
 
     async def start(self, room_id: str, api_token: str) -> None:
         """Start the bot"""
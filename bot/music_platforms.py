@@ -1,22 +1,74 @@
 import os
+import re
 import json
+import time
 import asyncio
 import aiohttp
-from typing import List, Dict, Any, Optional
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Tuple, AsyncIterator
 import logging
 
+from scheduler import Scheduler
+from track_ranking import TrackRanker
+
 logger = logging.getLogger(__name__)
 
+SONG_INFO_BATCH = 50        # ids per videos.list / tracks lookup, the APIs' maximum
+SONG_INFO_WINDOW = 0.05     # seconds a lookup waits for others to share its batch
+SONG_INFO_TTL = 6 * 3600    # seconds resolved songs stay cached
+SONG_INFO_CACHE_SIZE = 2000
+PLAYLIST_MAX_TRACKS = 200   # songs taken from one playlist
+
+# Pasted track links -> (platform, track id); a SoundCloud permalink is its own id
+TRACK_LINK_PATTERNS = [
+    ('youtube', re.compile(r'(?:youtube\.com/(?:watch\?(?:\S*&)?v=|shorts/|embed/|live/)|youtu\.be/)([A-Za-z0-9_-]{11})')),
+    ('spotify', re.compile(r'(?:open\.spotify\.com/(?:intl-[a-z-]+/)?track/|spotify:track:)([A-Za-z0-9]{22})')),
+    ('soundcloud', re.compile(r'api\.soundcloud\.com/tracks/(\d+)')),
+    ('soundcloud', re.compile(r'(https?://(?:www\.|m\.)?soundcloud\.com/[\w-]+/(?!sets(?:[/?#]|$))[\w-]+)(?:[/?#\s]|$)'))
+]
+
+PLAYLIST_LINK_PATTERNS = [
+    ('youtube', re.compile(r'(?:youtube\.com|youtu\.be)/\S*[?&]list=([A-Za-z0-9_-]+)')),
+    ('spotify', re.compile(r'(?:open\.spotify\.com/(?:intl-[a-z-]+/)?playlist/|spotify:playlist:)([A-Za-z0-9]{22})')),
+    ('soundcloud', re.compile(r'(https?://(?:www\.|m\.)?soundcloud\.com/[\w-]+/sets/[\w-]+)'))
+]
+
+
+def parse_track_link(text: str) -> Optional[Tuple[str, str]]:
+    """Platform and track id of a YouTube, Spotify or SoundCloud track link, if text contains one"""
+    for platform, pattern in TRACK_LINK_PATTERNS:
+        match = pattern.search(text)
+        if match:
+            return platform, match.group(1)
+    return None
+
+
+def parse_playlist_link(text: str) -> Optional[Tuple[str, str]]:
+    """Platform and playlist id of a YouTube, Spotify or SoundCloud playlist link, if text contains one"""
+    for platform, pattern in PLAYLIST_LINK_PATTERNS:
+        match = pattern.search(text)
+        if match:
+            return platform, match.group(1)
+    return None
+
+
 class MusicPlatforms:
-    def __init__(self):
+    def __init__(self, scheduler: Optional[Scheduler] = None):
         self.youtube_api_key = os.getenv('YOUTUBE_API_KEY', '')
         self.spotify_client_id = os.getenv('SPOTIFY_CLIENT_ID', '')
         self.spotify_client_secret = os.getenv('SPOTIFY_CLIENT_SECRET', '')
         self.soundcloud_client_id = os.getenv('SOUNDCLOUD_CLIENT_ID', '')
         self.spotify_token = None
+        self.spotify_refresh = None
+        self.scheduler = scheduler or Scheduler()
+        self.song_info_cache: OrderedDict = OrderedDict()  # (platform, id) -> (expires, song)
+        self.song_info_pending: Dict[Tuple[str, str], asyncio.Future] = {}  # lookups batched or in flight
+        self.song_info_batches: Dict[str, Dict[str, asyncio.Future]] = {}  # platform -> id -> lookup not yet sent
+        self.song_info_flush: Dict[str, Any] = {}  # platform -> pending batch timer
 
-    async def search_all_platforms(self, query: str, limit: int = 5) -> List[Dict[str, Any]]:
-        """Search all platforms for music"""
+    async def search_all_platforms(self, query: str, limit: int = 5,
+                                   platform_preference: str = 'all') -> List[Dict[str, Any]]:
+        """Search all platforms for music, best match first"""
         results = []
         
         # Search each platform concurrently
@@ -33,7 +85,13 @@ class MusicPlatforms:
             if isinstance(platform_result, list):
                 results.extend(platform_result)
         
-        return results[:limit]
+        # Rank before truncating so gather order never decides the winner
+        return self.rank_results(query, results, platform_preference)[:limit]
+
+    def rank_results(self, query: str, results: List[Dict[str, Any]],
+                     platform_preference: str = 'all') -> List[Dict[str, Any]]:
+        """Order search results by relevance to the query and drop duplicates"""
+        return TrackRanker(platform_preference).rank(query, results)
 
     async def search_youtube(self, query: str, limit: int = 5) -> List[Dict[str, Any]]:
         """Search YouTube for music"""
@@ -102,19 +160,7 @@ class MusicPlatforms:
                     if response.status == 200:
                         data = await response.json()
                         
-                        results = []
-                        for item in data.get('tracks', {}).get('items', []):
-                            results.append({
-                                'id': item['id'],
-                                'title': item['name'],
-                                'artist': ', '.join([artist['name'] for artist in item['artists']]),
-                                'duration': item['duration_ms'] // 1000,
-                                'platform': 'Spotify',
-                                'url': item['external_urls']['spotify'],
-                                'thumbnail': item['album']['images'][1]['url'] if len(item['album']['images']) > 1 else ''
-                            })
-                        
-                        return results
+                        return [self._spotify_track(item) for item in data.get('tracks', {}).get('items', [])]
                     else:
                         logger.error(f"Spotify API error: {response.status}")
                         return []
@@ -142,19 +188,7 @@ class MusicPlatforms:
                     if response.status == 200:
                         data = await response.json()
                         
-                        results = []
-                        for item in data:
-                            results.append({
-                                'id': str(item['id']),
-                                'title': item['title'],
-                                'artist': item['user']['username'],
-                                'duration': item['duration'] // 1000,
-                                'platform': 'SoundCloud',
-                                'url': item['permalink_url'],
-                                'thumbnail': item.get('artwork_url', '')
-                            })
-                        
-                        return results
+                        return [self._soundcloud_track(item) for item in data]
                     else:
                         logger.error(f"SoundCloud API error: {response.status}")
                         return []
@@ -183,13 +217,17 @@ class MusicPlatforms:
                     
                     # Schedule token refresh
                     expires_in = token_data.get('expires_in', 3600)
-                    asyncio.create_task(self._refresh_spotify_token(expires_in - 60))
+                    if self.spotify_refresh:
+                        self.spotify_refresh.cancel()
+                    self.spotify_refresh = self.scheduler.call_later(
+                        expires_in - 60, self._refresh_spotify_token, name='spotify_token_refresh'
+                    )
                 else:
                     logger.error(f"Spotify token error: {response.status}")
 
-    async def _refresh_spotify_token(self, delay: int) -> None:
-        """Refresh Spotify token after delay"""
-        await asyncio.sleep(delay)
+    async def _refresh_spotify_token(self) -> None:
+        """Refresh Spotify token shortly before it expires"""
+        self.spotify_refresh = None
         self.spotify_token = None
         await self._ensure_spotify_token()
 
@@ -222,70 +260,299 @@ class MusicPlatforms:
         return popular_songs
 
     async def get_song_info(self, platform: str, song_id: str) -> Optional[Dict[str, Any]]:
-        """Get detailed information about a specific song"""
-        if platform.lower() == 'youtube':
-            return await self._get_youtube_song_info(song_id)
-        elif platform.lower() == 'spotify':
-            return await self._get_spotify_song_info(song_id)
-        elif platform.lower() == 'soundcloud':
-            return await self._get_soundcloud_song_info(song_id)
-        
-        return None
+        """Get detailed information about a specific song.
+
+        Results are cached, and lookups for the same platform made within
+        SONG_INFO_WINDOW share one API call (videos.list costs 1 quota unit for
+        up to 50 ids, where a search costs 100).
+        """
+        platform = platform.lower()
+        if platform not in ('youtube', 'spotify', 'soundcloud'):
+            return None
+
+        key = (platform, song_id)
+        cached = self.song_info_cache.get(key)
+        if cached and cached[0] > time.monotonic():
+            self.song_info_cache.move_to_end(key)
+            return dict(cached[1])
+
+        future = self.song_info_pending.get(key)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            self.song_info_pending[key] = future
+            batch = self.song_info_batches.setdefault(platform, {})
+            batch[song_id] = future
+            if len(batch) >= SONG_INFO_BATCH:
+                self._flush_song_info(platform)
+            elif platform not in self.song_info_flush:
+                self.song_info_flush[platform] = self.scheduler.call_later(
+                    SONG_INFO_WINDOW, self._flush_song_info, platform, name='song_info_batch'
+                )
+
+        song = await asyncio.shield(future)
+        return dict(song) if song else None
+
+    def _flush_song_info(self, platform: str) -> None:
+        timer = self.song_info_flush.pop(platform, None)
+        if timer:
+            timer.cancel()
+        batch = self.song_info_batches.pop(platform, None)
+        if batch:
+            self.scheduler.call_later(0, self._load_song_info, platform, batch, name='song_info_batch')
+
+    async def _load_song_info(self, platform: str, batch: Dict[str, asyncio.Future]) -> None:
+        """Resolve one batch of lookups with a single API call"""
+        fetch = {
+            'youtube': self._get_youtube_songs_info,
+            'spotify': self._get_spotify_songs_info,
+            'soundcloud': self._get_soundcloud_songs_info
+        }[platform]
+        try:
+            found = await fetch(list(batch))
+        except Exception as e:
+            logger.error(f"{platform} song info error: {e}")
+            found = {}
+
+        expires = time.monotonic() + SONG_INFO_TTL
+        for song_id, future in batch.items():
+            song = found.get(song_id)
+            self.song_info_pending.pop((platform, song_id), None)
+            if song:
+                self.song_info_cache[(platform, song_id)] = (expires, song)
+                self.song_info_cache.move_to_end((platform, song_id))
+            if not future.done():
+                future.set_result(song)
+        while len(self.song_info_cache) > SONG_INFO_CACHE_SIZE:
+            self.song_info_cache.popitem(last=False)
 
     async def _get_youtube_song_info(self, video_id: str) -> Optional[Dict[str, Any]]:
         """Get YouTube video information"""
+        return (await self._get_youtube_songs_info([video_id])).get(video_id)
+
+    async def _get_youtube_songs_info(self, video_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Look up to 50 YouTube videos up in one videos.list call"""
         if not self.youtube_api_key:
-            return None
-        
-        try:
-            url = f"https://www.googleapis.com/youtube/v3/videos"
-            params = {
-                'part': 'snippet,contentDetails',
-                'id': video_id,
-                'key': self.youtube_api_key
+            logger.warning("YouTube API key not configured")
+            return {}
+
+        url = "https://www.googleapis.com/youtube/v3/videos"
+        params = {
+            'part': 'snippet,contentDetails',
+            'id': ','.join(video_ids),
+            'maxResults': SONG_INFO_BATCH,
+            'key': self.youtube_api_key
+        }
+
+        async with aiohttp.ClientSession() as session:
+            async with session.get(url, params=params) as response:
+                if response.status != 200:
+                    logger.error(f"YouTube API error: {response.status}")
+                    return {}
+                data = await response.json()
+
+        songs = {}
+        for item in data.get('items', []):
+            songs[item['id']] = {
+                'id': item['id'],
+                'title': item['snippet']['title'],
+                'artist': item['snippet']['channelTitle'],
+                'duration': self._parse_youtube_duration(item['contentDetails']['duration']),
+                'platform': 'YouTube',
+                'url': f"https://www.youtube.com/watch?v={item['id']}",
+                'thumbnail': item['snippet']['thumbnails'].get('medium', {}).get('url', '')
             }
-            
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, params=params) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        if data.get('items'):
-                            item = data['items'][0]
-                            return {
-                                'title': item['snippet']['title'],
-                                'artist': item['snippet']['channelTitle'],
-                                'duration': self._parse_youtube_duration(item['contentDetails']['duration']),
-                                'thumbnail': item['snippet']['thumbnails'].get('medium', {}).get('url', '')
-                            }
-            
-            return None
-        
-        except Exception as e:
-            logger.error(f"YouTube song info error: {e}")
-            return None
+        return songs
 
     def _parse_youtube_duration(self, duration_str: str) -> int:
         """Parse YouTube duration string (PT4M13S) to seconds"""
-        import re
-        
         pattern = r'PT(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?'
         match = re.match(pattern, duration_str)
-        
+
         if not match:
             return 180  # Default 3 minutes
-        
+
         hours = int(match.group(1) or 0)
         minutes = int(match.group(2) or 0)
         seconds = int(match.group(3) or 0)
-        
+
         return hours * 3600 + minutes * 60 + seconds
 
     async def _get_spotify_song_info(self, track_id: str) -> Optional[Dict[str, Any]]:
         """Get Spotify track information"""
-        # Implementation similar to search but for specific track
-        return None
+        return (await self._get_spotify_songs_info([track_id])).get(track_id)
+
+    async def _get_spotify_songs_info(self, track_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Look up to 50 Spotify tracks up in one call"""
+        if not self.spotify_client_id or not self.spotify_client_secret:
+            logger.warning("Spotify credentials not configured")
+            return {}
+
+        await self._ensure_spotify_token()
+        url = "https://api.spotify.com/v1/tracks"
+        params = {'ids': ','.join(track_ids)}
+        headers = {'Authorization': f'Bearer {self.spotify_token}'}
+
+        async with aiohttp.ClientSession() as session:
+            async with session.get(url, params=params, headers=headers) as response:
+                if response.status != 200:
+                    logger.error(f"Spotify API error: {response.status}")
+                    return {}
+                data = await response.json()
+
+        # Unknown ids come back as null entries
+        return {item['id']: self._spotify_track(item) for item in data.get('tracks', []) if item}
 
     async def _get_soundcloud_song_info(self, track_id: str) -> Optional[Dict[str, Any]]:
-        """Get SoundCloud track information"""
-        # Implementation similar to search but for specific track
-        return None
+        """Get SoundCloud track information (numeric id or permalink URL)"""
+        return (await self._get_soundcloud_songs_info([track_id])).get(track_id)
+
+    async def _get_soundcloud_songs_info(self, track_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Numeric ids in one /tracks call; permalinks need a /resolve call each"""
+        if not self.soundcloud_client_id:
+            logger.warning("SoundCloud client ID not configured")
+            return {}
+
+        numeric = [track_id for track_id in track_ids if track_id.isdigit()]
+        permalinks = [track_id for track_id in track_ids if not track_id.isdigit()]
+        songs = {}
+
+        async with aiohttp.ClientSession() as session:
+            async def get(url: str, params: Dict[str, Any]) -> Any:
+                async with session.get(url, params={**params, 'client_id': self.soundcloud_client_id}) as response:
+                    if response.status != 200:
+                        logger.error(f"SoundCloud API error: {response.status}")
+                        return None
+                    return await response.json()
+
+            requests = [get("https://api.soundcloud.com/resolve", {'url': link}) for link in permalinks]
+            if numeric:
+                requests.append(get("https://api.soundcloud.com/tracks", {'ids': ','.join(numeric)}))
+            responses = await asyncio.gather(*requests)
+
+        for link, item in zip(permalinks, responses):
+            if item and item.get('kind') == 'track':
+                songs[link] = self._soundcloud_track(item)
+        if numeric:
+            for item in responses[-1] or []:
+                songs[str(item['id'])] = self._soundcloud_track(item)
+        return songs
+
+    async def playlist_pages(self, platform: str, playlist_id: str,
+                             limit: int = PLAYLIST_MAX_TRACKS) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Yield a playlist's songs page by page, in playlist order, as full song dicts"""
+        pages = {
+            'youtube': self._youtube_playlist_pages,
+            'spotify': self._spotify_playlist_pages,
+            'soundcloud': self._soundcloud_playlist_pages
+        }[platform.lower()](playlist_id)
+        remaining = limit
+        try:
+            async for page in pages:
+                yield page[:remaining]
+                remaining -= len(page)
+                if remaining <= 0:
+                    return
+        finally:
+            await pages.aclose()
+
+    async def _youtube_playlist_pages(self, playlist_id: str) -> AsyncIterator[List[Dict[str, Any]]]:
+        if not self.youtube_api_key:
+            logger.warning("YouTube API key not configured")
+            return
+
+        url = "https://www.googleapis.com/youtube/v3/playlistItems"
+        params = {
+            'part': 'contentDetails',
+            'playlistId': playlist_id,
+            'maxResults': 50,
+            'key': self.youtube_api_key
+        }
+
+        async with aiohttp.ClientSession() as session:
+            while True:
+                async with session.get(url, params=params) as response:
+                    if response.status != 200:
+                        raise RuntimeError(f"YouTube API error: {response.status}")
+                    data = await response.json()
+
+                # One videos.list call per page; private and deleted videos drop out here
+                video_ids = [item['contentDetails']['videoId'] for item in data.get('items', [])]
+                songs = await self._get_youtube_songs_info(video_ids) if video_ids else {}
+                yield [songs[video_id] for video_id in video_ids if video_id in songs]
+
+                if not data.get('nextPageToken'):
+                    return
+                params['pageToken'] = data['nextPageToken']
+
+    async def _spotify_playlist_pages(self, playlist_id: str) -> AsyncIterator[List[Dict[str, Any]]]:
+        if not self.spotify_client_id or not self.spotify_client_secret:
+            logger.warning("Spotify credentials not configured")
+            return
+
+        await self._ensure_spotify_token()
+        url = f"https://api.spotify.com/v1/playlists/{playlist_id}/tracks"
+        params = {
+            'limit': 100,
+            'additional_types': 'track',
+            'fields': 'next,items(track(id,name,is_local,duration_ms,artists(name),external_urls,album(images)))'
+        }
+
+        async with aiohttp.ClientSession() as session:
+            while url:
+                headers = {'Authorization': f'Bearer {self.spotify_token}'}
+                async with session.get(url, params=params, headers=headers) as response:
+                    if response.status != 200:
+                        raise RuntimeError(f"Spotify API error: {response.status}")
+                    data = await response.json()
+
+                # Pages already carry full track objects; local files and removed tracks have no id
+                tracks = [item.get('track') for item in data.get('items', [])]
+                yield [self._spotify_track(track) for track in tracks
+                       if track and track.get('id') and not track.get('is_local')]
+
+                url = data.get('next')  # Already carries the query
+                params = None
+
+    async def _soundcloud_playlist_pages(self, playlist_url: str) -> AsyncIterator[List[Dict[str, Any]]]:
+        if not self.soundcloud_client_id:
+            logger.warning("SoundCloud client ID not configured")
+            return
+
+        params = {'url': playlist_url, 'client_id': self.soundcloud_client_id}
+        async with aiohttp.ClientSession() as session:
+            async with session.get("https://api.soundcloud.com/resolve", params=params) as response:
+                if response.status != 200:
+                    raise RuntimeError(f"SoundCloud API error: {response.status}")
+                data = await response.json()
+
+        # Long sets only include full metadata for their first tracks; the rest are looked up 50 at a time
+        tracks = data.get('tracks', [])
+        for start in range(0, len(tracks), SONG_INFO_BATCH):
+            chunk = tracks[start:start + SONG_INFO_BATCH]
+            missing = [str(track['id']) for track in chunk if 'title' not in track]
+            found = await self._get_soundcloud_songs_info(missing) if missing else {}
+            page = [self._soundcloud_track(track) if 'title' in track else found.get(str(track['id']))
+                    for track in chunk]
+            yield [song for song in page if song]
+
+    def _spotify_track(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            'id': item['id'],
+            'title': item['name'],
+            'artist': ', '.join([artist['name'] for artist in item['artists']]),
+            'duration': item['duration_ms'] // 1000,
+            'platform': 'Spotify',
+            'url': item['external_urls']['spotify'],
+            'thumbnail': item['album']['images'][1]['url'] if len(item['album']['images']) > 1 else ''
+        }
+
+    def _soundcloud_track(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            'id': str(item['id']),
+            'title': item['title'],
+            'artist': item['user']['username'],
+            'duration': item['duration'] // 1000,
+            'platform': 'SoundCloud',
+            'url': item['permalink_url'],
+            'thumbnail': item.get('artwork_url', '')
+        }
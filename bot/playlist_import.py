@@ -0,0 +1,93 @@
+import asyncio
+import logging
+from contextlib import aclosing
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List
+
+logger = logging.getLogger(__name__)
+
+# add_song results
+ADDED, SKIPPED, QUEUE_FULL, NO_CUBES = 'added', 'skipped', 'queue_full', 'no_cubes'
+STOP_MESSAGES = {
+    QUEUE_FULL: "the queue is full",
+    NO_CUBES: "out of cubes"
+}
+
+
+class PlaylistImporter:
+    """Streams playlists into the queue, one import per user.
+
+    Pages come from an async generator and each song is added as soon as
+    its page arrives, so the first songs can play while later pages are
+    still being fetched. Every song goes through add_song, which applies
+    the queue limit and cube price. An import ends when the playlist runs
+    out, add_song reports the queue is full or the user is out of cubes,
+    or it is stopped; the generator is closed in every case.
+    """
+
+    def __init__(self, report: Callable[[str], Awaitable[Any]]):
+        self.report = report  # posts progress to the room
+        self.imports: Dict[str, asyncio.Task] = {}
+        self.progress: Dict[str, Dict[str, int]] = {}
+
+    def start(self, username: str, pages: AsyncIterator[List[Dict[str, Any]]],
+              add_song: Callable[[Dict[str, Any]], Awaitable[str]]) -> bool:
+        """Begin an import; False if this user already has one running"""
+        if username in self.imports:
+            return False
+        self.progress[username] = {'added': 0, 'skipped': 0}
+        task = asyncio.get_running_loop().create_task(self._run(username, pages, add_song))
+        self.imports[username] = task
+        return True
+
+    def stop(self, username: str) -> bool:
+        task = self.imports.get(username)
+        if task is None:
+            return False
+        task.cancel()
+        return True
+
+    def stop_all(self) -> int:
+        for task in self.imports.values():
+            task.cancel()
+        return len(self.imports)
+
+    def running(self, username: str) -> bool:
+        return username in self.imports
+
+    async def _run(self, username: str, pages: AsyncIterator[List[Dict[str, Any]]],
+                   add_song: Callable[[Dict[str, Any]], Awaitable[str]]) -> None:
+        progress = self.progress[username]
+        reason = None
+        try:
+            async with aclosing(pages):
+                async for page in pages:
+                    for song in page:
+                        result = await add_song(song)
+                        if result == ADDED:
+                            progress['added'] += 1
+                        elif result == SKIPPED:
+                            progress['skipped'] += 1
+                        else:
+                            reason = STOP_MESSAGES.get(result, result)
+                            break
+                    if reason:
+                        break
+                    if page:
+                        await self.report(f"📥 {username}'s playlist: {progress['added']} songs queued so far...")
+        except asyncio.CancelledError:
+            reason = "stopped"
+        except Exception as e:
+            logger.error(f"Playlist import for {username} failed: {e}")
+            reason = "the playlist could not be loaded"
+        finally:
+            self.imports.pop(username, None)
+            self.progress.pop(username, None)
+
+        summary = f"📥 {username}'s playlist import {'ended: ' + reason if reason else 'finished'}. "
+        summary += f"{progress['added']} songs queued"
+        if progress['skipped']:
+            summary += f", {progress['skipped']} skipped"
+        try:
+            await self.report(summary + ".")
+        except Exception as e:
+            logger.error(f"Failed to report playlist import: {e}")
@@ -0,0 +1,93 @@
+import logging
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from highrise import User
+
+logger = logging.getLogger(__name__)
+
+
+class PresenceIndex:
+    """Who is in the room and where, kept current from SDK events.
+
+    Seeded once from get_room_users and then updated by join, leave and move
+    events, so online checks and position lookups never need an API call.
+    Watchers registered for a user id are called with ('move', position) and
+    ('leave', None) as that user's events arrive.
+    """
+
+    def __init__(self):
+        self.users: Dict[str, User] = {}       # user_id -> user
+        self.positions: Dict[str, Any] = {}    # user_id -> Position or AnchorPosition
+        self.user_ids: Dict[str, str] = {}     # username -> user_id
+        self.watchers: Dict[str, List[Callable[[str, Any], None]]] = {}
+
+    def seed(self, room_users: List[Tuple[User, Any]]) -> None:
+        """Replace the index with a full room snapshot"""
+        self.users.clear()
+        self.positions.clear()
+        self.user_ids.clear()
+        for user, position in room_users:
+            self.join(user, position)
+        logger.info(f"Presence index seeded with {len(self.users)} users")
+
+    def join(self, user: User, position: Any) -> None:
+        previous = self.users.get(user.id)
+        if previous is not None and previous.username != user.username:
+            self.user_ids.pop(previous.username, None)
+        self.users[user.id] = user
+        self.positions[user.id] = position
+        self.user_ids[user.username] = user.id
+
+    def leave(self, user: User) -> None:
+        self.users.pop(user.id, None)
+        self.positions.pop(user.id, None)
+        if self.user_ids.get(user.username) == user.id:
+            del self.user_ids[user.username]
+        self._notify(user.id, 'leave', None)
+
+    def move(self, user: User, destination: Any) -> None:
+        if user.id not in self.users:
+            # Moves can arrive before the join was seen (e.g. during seeding)
+            self.join(user, destination)
+        else:
+            self.positions[user.id] = destination
+        self._notify(user.id, 'move', destination)
+
+    def watch(self, user_id: str, callback: Callable[[str, Any], None]) -> None:
+        self.watchers.setdefault(user_id, []).append(callback)
+
+    def unwatch(self, user_id: str, callback: Callable[[str, Any], None]) -> None:
+        callbacks = self.watchers.get(user_id, [])
+        if callback in callbacks:
+            callbacks.remove(callback)
+        if not callbacks:
+            self.watchers.pop(user_id, None)
+
+    def _notify(self, user_id: str, event: str, position: Any) -> None:
+        for callback in list(self.watchers.get(user_id, ())):
+            try:
+                callback(event, position)
+            except Exception as e:
+                logger.error(f"Presence watcher failed for {user_id}: {e}")
+
+    def _resolve(self, user: str) -> Optional[str]:
+        """Accept a user id or a username"""
+        if user in self.users:
+            return user
+        return self.user_ids.get(user)
+
+    def is_online(self, user: str) -> bool:
+        return self._resolve(user) is not None
+
+    def position_of(self, user: str) -> Optional[Any]:
+        user_id = self._resolve(user)
+        return self.positions.get(user_id) if user_id else None
+
+    def user_id_of(self, username: str) -> Optional[str]:
+        return self.user_ids.get(username)
+
+    def online_usernames(self) -> List[str]:
+        return list(self.user_ids)
+
+    def __len__(self) -> int:
+        return len(self.users)
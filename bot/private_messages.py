@@ -0,0 +1,157 @@
+import asyncio
+import json
+import logging
+import os
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from scheduler import Scheduler
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 20  # messages per get_messages page (SDK limit)
+MAX_PAGES = 5   # cap on backfill after a long gap
+SAVE_DELAY = 5  # seconds; bursts of updates share one write
+
+
+class UserDirectory:
+    """Persistent user_id <-> username index, filled from room events"""
+
+    def __init__(self, scheduler: Scheduler, data_file: str = "user_directory.json"):
+        self.scheduler = scheduler
+        self.data_file = data_file
+        self.usernames: Dict[str, str] = {}  # user_id -> username
+        self.user_ids: Dict[str, str] = {}   # username -> user_id
+        self.save_timer = None
+        self.load_data()
+
+    def load_data(self) -> None:
+        """Load the index from file"""
+        if os.path.exists(self.data_file):
+            with open(self.data_file, 'r') as f:
+                self.usernames = json.load(f)
+        self.user_ids = {username: user_id for user_id, username in self.usernames.items()}
+
+    def save_data(self) -> None:
+        """Save the index to file atomically"""
+        self.save_timer = None
+        tmp_file = self.data_file + '.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump(self.usernames, f)
+        os.replace(tmp_file, self.data_file)
+
+    def remember(self, user_id: str, username: str) -> None:
+        """Record a user's identity; usernames can change, ids cannot"""
+        if self.usernames.get(user_id) == username:
+            return
+        previous = self.usernames.get(user_id)
+        if previous is not None and self.user_ids.get(previous) == user_id:
+            del self.user_ids[previous]
+        self.usernames[user_id] = username
+        self.user_ids[username] = user_id
+
+        if self.save_timer is None:
+            self.save_timer = self.scheduler.call_later(SAVE_DELAY, self.save_data, name='user_directory_save')
+
+    def username_for(self, user_id: str) -> Optional[str]:
+        return self.usernames.get(user_id)
+
+    def user_id_for(self, username: str) -> Optional[str]:
+        return self.user_ids.get(username)
+
+
+class PrivateMessageInbox:
+    """Incremental, coalescing reader for bot inbox conversations.
+
+    get_messages pages backwards from the newest message, so each conversation
+    keeps the id of the newest message already handled and a fetch stops as soon
+    as it reaches it. Notifications that arrive while a conversation is being
+    read only mark it dirty; the running reader loops once more instead of
+    starting a second fetch.
+    """
+
+    def __init__(self, scheduler: Scheduler,
+                 fetch: Callable[[str, Optional[str]], Awaitable[Any]],
+                 handler: Callable[[str, Any], Awaitable[None]],
+                 data_file: str = "pm_cursors.json"):
+        self.scheduler = scheduler
+        self.fetch = fetch
+        self.handler = handler
+        self.data_file = data_file
+        self.cursors: Dict[str, str] = {}  # conversation_id -> newest handled message_id
+        self.active: Dict[str, asyncio.Task] = {}
+        self.dirty: set = set()
+        self.ignored_senders: set = set()
+        self.save_timer = None
+        self.load_data()
+
+    def load_data(self) -> None:
+        """Load conversation cursors from file"""
+        if os.path.exists(self.data_file):
+            with open(self.data_file, 'r') as f:
+                self.cursors = json.load(f)
+
+    def save_data(self) -> None:
+        """Save conversation cursors to file atomically"""
+        self.save_timer = None
+        tmp_file = self.data_file + '.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump(self.cursors, f)
+        os.replace(tmp_file, self.data_file)
+
+    def notify(self, conversation_id: str) -> None:
+        """Handle an inbox notification; bursts for one conversation collapse into one read"""
+        if conversation_id in self.active:
+            self.dirty.add(conversation_id)
+            return
+        task = asyncio.get_running_loop().create_task(self._drain(conversation_id))
+        self.active[conversation_id] = task
+
+    async def _drain(self, conversation_id: str) -> None:
+        try:
+            while True:
+                self.dirty.discard(conversation_id)
+                await self._read_new(conversation_id)
+                if conversation_id not in self.dirty:
+                    break
+        except Exception as e:
+            logger.error(f"Error reading conversation {conversation_id}: {e}")
+        finally:
+            self.active.pop(conversation_id, None)
+
+    async def _read_new(self, conversation_id: str) -> None:
+        cursor = self.cursors.get(conversation_id)
+        new_messages: List[Any] = []
+        last_id = None
+
+        for _ in range(MAX_PAGES):
+            response = await self.fetch(conversation_id, last_id)
+            messages = getattr(response, 'messages', None)
+            if messages is None:
+                logger.error(f"Failed to fetch messages for {conversation_id}: {response}")
+                return
+
+            reached_cursor = False
+            for message in messages:  # newest first
+                if message.message_id == cursor:
+                    reached_cursor = True
+                    break
+                new_messages.append(message)
+
+            # First contact only needs the latest message; otherwise page back to the cursor
+            if reached_cursor or cursor is None or len(messages) < PAGE_SIZE:
+                break
+            last_id = messages[-1].message_id
+
+        if not new_messages:
+            return
+
+        self.cursors[conversation_id] = new_messages[0].message_id
+        if self.save_timer is None:
+            self.save_timer = self.scheduler.call_later(SAVE_DELAY, self.save_data, name='pm_cursor_save')
+
+        if cursor is None:
+            new_messages = new_messages[:1]
+        for message in reversed(new_messages):  # oldest first
+            if message.sender_id in self.ignored_senders:
+                continue
+            await self.handler(conversation_id, message)
@@ -0,0 +1,412 @@
+import asyncio
+import json
+import os
+import shutil
+import time
+import logging
+from collections import deque
+from datetime import datetime
+from typing import Dict, List, Any, Deque, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+from sklearn.preprocessing import normalize
+
+from shared_tables import TrackCatalog
+
+logger = logging.getLogger(__name__)
+
+# Interaction weights for the user x track matrix
+PLAY_WEIGHT = 1.0
+LIKE_WEIGHT = 3.0
+CUBE_WEIGHT = 0.2  # per cube spent on a request
+
+TOP_K = 20
+RECENT_SEEDS = 20
+POPULAR_SIZE = 50
+REBUILD_EVERY = 200  # events between full similarity rebuilds
+BLOCK_CELLS = 1 << 24  # dense cells materialized per similarity block
+
+SNAPSHOT_DIR = os.getenv('RECOMMENDATION_MODEL_DIR', 'models/recommendations')
+SNAPSHOT_POINTER = 'CURRENT'
+SNAPSHOTS_KEPT = 3
+SNAPSHOT_CHECK_INTERVAL = 30  # seconds between CURRENT pointer checks
+OVERLAY_MAX_PAIRS = 20000  # overlay bumps kept between snapshots; the oldest are forgotten first
+LEGACY_DATA_FILE = 'recommendation_data.json'  # shared by every room before history was kept per room
+
+
+def track_key(song: Dict[str, Any]) -> str:
+    """Stable identifier for a track across queue items and database rows"""
+    platform = str(song.get('platform', '')).lower()
+    # The URL is the only identifier the musicQueue table stores
+    ref = song.get('url') or song.get('id')
+    if ref:
+        return f"{platform}:{ref}"
+    return f"{platform}:{song.get('title', '').lower()}|{song.get('artist', '').lower()}"
+
+
+def write_snapshot(root: str, keys: List[str], tracks: List[Dict[str, Any]], neighbors: np.ndarray,
+                   scores: np.ndarray, popular: np.ndarray, keep: int = SNAPSHOTS_KEPT) -> int:
+    """Write a new versioned model snapshot and atomically point CURRENT at it"""
+    os.makedirs(root, exist_ok=True)
+    current = read_snapshot_version(root)
+    version = (current or 0) + 1
+    name = f"v{version:06d}"
+    staging = os.path.join(root, f".{name}.tmp")
+    os.makedirs(staging, exist_ok=True)
+
+    np.save(os.path.join(staging, 'neighbors.npy'), neighbors.astype(np.int32, copy=False))
+    np.save(os.path.join(staging, 'scores.npy'), scores.astype(np.float32, copy=False))
+    np.save(os.path.join(staging, 'popular.npy'), popular.astype(np.int32, copy=False))
+    TrackCatalog.from_tracks(keys, tracks).save(staging)
+    with open(os.path.join(staging, 'manifest.json'), 'w') as f:
+        json.dump({
+            'version': version,
+            'created_at': datetime.now().isoformat(),
+            'tracks': len(keys),
+            'top_k': int(neighbors.shape[1]) if neighbors.ndim == 2 else TOP_K
+        }, f)
+
+    os.replace(staging, os.path.join(root, name))
+    pointer = os.path.join(root, SNAPSHOT_POINTER)
+    with open(pointer + '.tmp', 'w') as f:
+        f.write(name)
+    os.replace(pointer + '.tmp', pointer)
+
+    # Old versions may still be mapped by running bots; only prune beyond the retention window
+    versions = sorted(entry for entry in os.listdir(root) if entry.startswith('v'))
+    for old in versions[:-keep]:
+        shutil.rmtree(os.path.join(root, old), ignore_errors=True)
+
+    return version
+
+
+def read_snapshot_version(root: str) -> Optional[int]:
+    """Version number CURRENT points at, or None if there is no snapshot"""
+    try:
+        with open(os.path.join(root, SNAPSHOT_POINTER), 'r') as f:
+            return int(f.read().strip().lstrip('v'))
+    except (OSError, ValueError):
+        return None
+
+
+def load_snapshot(root: str) -> Optional[Dict[str, Any]]:
+    """Open the current snapshot with every table memory-mapped read-only"""
+    version = read_snapshot_version(root)
+    if version is None:
+        return None
+
+    path = os.path.join(root, f"v{version:06d}")
+    with open(os.path.join(path, 'manifest.json'), 'r') as f:
+        manifest = json.load(f)
+    return {
+        'version': version,
+        'created_at': datetime.fromisoformat(manifest['created_at']).timestamp(),
+        'catalog': TrackCatalog.open(path),
+        'neighbors': np.load(os.path.join(path, 'neighbors.npy'), mmap_mode='r'),
+        'scores': np.load(os.path.join(path, 'scores.npy'), mmap_mode='r'),
+        'popular': np.load(os.path.join(path, 'popular.npy'), mmap_mode='r')
+    }
+
+
+def build_neighbor_table(matrix: sparse.csr_matrix, k: int = TOP_K) -> Tuple[np.ndarray, np.ndarray]:
+    """Compute the top-k cosine neighbors of every column of a user x item matrix"""
+    n_items = matrix.shape[1]
+    neighbors = np.full((n_items, k), -1, dtype=np.int32)
+    scores = np.zeros((n_items, k), dtype=np.float32)
+    if n_items == 0:
+        return neighbors, scores
+
+    # Column-normalize once so item-item products are cosine similarities
+    items = normalize(matrix.tocsc().astype(np.float32), norm='l2', axis=0).T.tocsr()
+    items_t = items.T.tocsc()
+    block = max(1, BLOCK_CELLS // n_items)
+    width = min(k, n_items - 1)
+
+    for start in range(0, n_items, block):
+        stop = min(start + block, n_items)
+        sims = (items[start:stop] @ items_t).toarray()
+        sims[np.arange(stop - start), np.arange(start, stop)] = 0.0  # no self-neighbors
+        if width <= 0:
+            continue
+
+        top = np.argpartition(-sims, width - 1, axis=1)[:, :width]
+        top_scores = np.take_along_axis(sims, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+        top[top_scores <= 0.0] = -1
+        neighbors[start:stop, :width] = top
+        scores[start:stop, :width] = np.maximum(top_scores, 0.0)
+
+    return neighbors, scores
+
+
+class RecommendationEngine:
+    def __init__(self, data_file: Optional[str] = None, snapshot_dir: str = SNAPSHOT_DIR):
+        self.data_file = data_file  # set by attach unless given
+        self.snapshot_dir = snapshot_dir
+        self.interactions: Dict[str, Dict[str, float]] = {}
+        self.tracks: Dict[str, Dict[str, Any]] = {}
+        self.recent: Dict[str, Deque[str]] = {}
+
+        # Served from memory; rebuilt in batch, patched incrementally in between
+        self.catalog = TrackCatalog.from_tracks([], [])
+        self.neighbors = np.full((0, TOP_K), -1, dtype=np.int32)
+        self.neighbor_scores = np.zeros((0, TOP_K), dtype=np.float32)
+        self.popular: List[str] = []
+        self.overlay: Dict[str, Dict[str, float]] = {}
+        self.stale_overlay: Dict[str, Dict[str, float]] = {}
+        self.overlay_log: Deque[Tuple[float, str, str]] = deque()  # (time, seed, key) per overlay bump, oldest first
+        self.events_since_rebuild = 0
+        self.rebuilding = False
+
+        # Trained offline by train_recommendations.py; takes precedence over live rebuilds
+        self.snapshot_version: Optional[int] = None
+        self.last_snapshot_check = float('-inf')
+        self.load_data()
+        self.maybe_reload_snapshot()
+
+    def attach(self, room_id: str) -> None:
+        """Keep this room's history in its own file; every room's bot runs from the same directory"""
+        if self.data_file is None:
+            self.data_file = f"recommendation_data_{room_id}.json"
+            self.load_data()
+
+    def load_data(self) -> None:
+        """Load interaction history from file and build the neighbor table"""
+        path = self.data_file
+        if path and not os.path.exists(path) and os.path.exists(LEGACY_DATA_FILE):
+            path = LEGACY_DATA_FILE  # Start the room from the old shared history
+        if path and os.path.exists(path):
+            with open(path, 'r') as f:
+                data = json.load(f)
+            self.interactions = data.get('interactions', {})
+            self.tracks = data.get('tracks', {})
+            for username, keys in data.get('recent', {}).items():
+                self.recent[username] = deque(keys, maxlen=RECENT_SEEDS)
+        self.rebuild()
+
+    def save_data(self) -> None:
+        """Save interaction history to file"""
+        self._write_history(*self._snapshot())
+
+    def record_play(self, username: str, song: Dict[str, Any]) -> None:
+        """Record that a user's requested song was played"""
+        self._record(username, song, PLAY_WEIGHT)
+
+    def record_like(self, username: str, song: Dict[str, Any]) -> None:
+        """Record a like and fold it into the neighbor table immediately"""
+        key = self._record(username, song, LIKE_WEIGHT)
+
+        # Co-occurrence bump against the user's recent tracks until the next rebuild
+        for seed in self.recent.get(username, ()):
+            if seed == key:
+                continue
+            self.overlay.setdefault(seed, {})[key] = self.overlay.get(seed, {}).get(key, 0.0) + LIKE_WEIGHT
+            self.overlay.setdefault(key, {})[seed] = self.overlay.get(key, {}).get(seed, 0.0) + LIKE_WEIGHT
+            self.overlay_log.append((time.time(), seed, key))
+        while len(self.overlay_log) > OVERLAY_MAX_PAIRS:
+            self._forget_overlay_pair()
+
+    def record_spend(self, username: str, song: Dict[str, Any], cubes: int) -> None:
+        """Record cubes spent to request a song"""
+        if cubes > 0:
+            self._record(username, song, cubes * CUBE_WEIGHT)
+
+    def needs_rebuild(self) -> bool:
+        return not self.rebuilding and self.events_since_rebuild >= REBUILD_EVERY
+
+    def rebuild(self) -> None:
+        """Rebuild the neighbor table synchronously"""
+        self._begin_rebuild()
+        self._apply_tables(self._build_tables(*self._snapshot()))
+
+    async def rebuild_async(self) -> None:
+        """Rebuild the neighbor table and persist history off the event loop"""
+        if self.rebuilding:
+            return
+        self.rebuilding = True
+        try:
+            # Once the offline pipeline has published a snapshot it owns the base table
+            build = self.snapshot_version is None
+            if build:
+                self._begin_rebuild()
+            else:
+                self.events_since_rebuild = 0
+            snapshot = self._snapshot()
+            loop = asyncio.get_running_loop()
+            if build:
+                tables = await loop.run_in_executor(None, self._build_tables, *snapshot)
+                self._apply_tables(tables)
+            await loop.run_in_executor(None, self._write_history, *snapshot)
+        except Exception as e:
+            logger.error(f"Recommendation rebuild failed: {e}")
+        finally:
+            self.rebuilding = False
+
+    def _begin_rebuild(self) -> None:
+        # Likes arriving during the build land in a fresh overlay
+        self.stale_overlay = self.overlay
+        self.overlay = {}
+        self.overlay_log.clear()
+        self.events_since_rebuild = 0
+
+    def _forget_overlay_pair(self) -> None:
+        """Undo the oldest overlay bump"""
+        _, seed, key = self.overlay_log.popleft()
+        for a, b in ((seed, key), (key, seed)):
+            weights = self.overlay.get(a)
+            if weights is None or b not in weights:
+                continue
+            weights[b] -= LIKE_WEIGHT
+            if weights[b] <= 0:
+                del weights[b]
+                if not weights:
+                    del self.overlay[a]
+
+    def _snapshot(self) -> Tuple[Dict[str, Dict[str, float]], Dict[str, Dict[str, Any]], Dict[str, List[str]]]:
+        """Copy the mutable history so a worker thread can read it safely"""
+        interactions = {username: dict(weights) for username, weights in self.interactions.items()}
+        recent = {username: list(keys) for username, keys in self.recent.items()}
+        return interactions, dict(self.tracks), recent
+
+    def _build_tables(self, interactions: Dict[str, Dict[str, float]], tracks: Dict[str, Dict[str, Any]],
+                      recent: Dict[str, List[str]]) -> Tuple[TrackCatalog, np.ndarray, np.ndarray, List[str]]:
+        """Build the interaction matrix and its item-item neighbor table"""
+        keys = list(tracks.keys())
+        index = {key: i for i, key in enumerate(keys)}
+
+        rows: List[int] = []
+        cols: List[int] = []
+        values: List[float] = []
+        for row, weights in enumerate(interactions.values()):
+            for key, weight in weights.items():
+                rows.append(row)
+                cols.append(index[key])
+                values.append(weight)
+
+        matrix = sparse.csr_matrix(
+            (np.asarray(values, dtype=np.float32), (rows, cols)),
+            shape=(len(interactions), len(keys))
+        )
+        neighbors, scores = build_neighbor_table(matrix)
+
+        totals = np.asarray(matrix.sum(axis=0)).ravel()
+        popular = [keys[i] for i in np.argsort(-totals)[:POPULAR_SIZE] if totals[i] > 0]
+        catalog = TrackCatalog.from_tracks(keys, [tracks[key] for key in keys])
+        logger.info(f"Recommendation table rebuilt: {len(interactions)} users, {len(keys)} tracks")
+        return catalog, neighbors, scores, popular
+
+    def _apply_tables(self, tables: Tuple[TrackCatalog, np.ndarray, np.ndarray, List[str]]) -> None:
+        """Swap in new tables in one step so readers never see a partial build"""
+        catalog, neighbors, scores, popular = tables
+        self.catalog = catalog
+        self.neighbors = neighbors
+        self.neighbor_scores = scores
+        self.popular = popular
+        self.stale_overlay = {}
+
+    def _write_history(self, interactions: Dict[str, Dict[str, float]], tracks: Dict[str, Dict[str, Any]],
+                        recent: Dict[str, List[str]]) -> None:
+        if self.data_file is None:
+            return
+        with open(self.data_file, 'w') as f:
+            json.dump({'interactions': interactions, 'tracks': tracks, 'recent': recent}, f)
+
+    def maybe_reload_snapshot(self) -> bool:
+        """Hot-swap to a newer trained snapshot if CURRENT has moved"""
+        now = time.monotonic()
+        if now - self.last_snapshot_check < SNAPSHOT_CHECK_INTERVAL:
+            return False
+        self.last_snapshot_check = now
+
+        version = read_snapshot_version(self.snapshot_dir)
+        if version is None or version == self.snapshot_version:
+            return False
+
+        try:
+            snapshot = load_snapshot(self.snapshot_dir)
+        except (OSError, ValueError, KeyError) as e:
+            logger.error(f"Failed to load recommendation snapshot v{version}: {e}")
+            return False
+
+        catalog = snapshot['catalog']
+        popular = [catalog.key_at(row) for row in snapshot['popular']]
+        self._apply_tables((catalog, snapshot['neighbors'], snapshot['scores'], popular))
+        # Likes from before the snapshot was trained are in its table now; counting them again would double them
+        while self.overlay_log and self.overlay_log[0][0] <= snapshot['created_at']:
+            self._forget_overlay_pair()
+        self.snapshot_version = snapshot['version']
+        logger.info(f"Loaded recommendation snapshot v{self.snapshot_version} ({len(catalog)} tracks)")
+        return True
+
+    def recommend(self, username: str, limit: int = 3) -> List[Dict[str, Any]]:
+        """Recommend tracks for a user from the precomputed neighbor table"""
+        self.maybe_reload_snapshot()
+        seeds = self.recent.get(username)
+        heard = self.interactions.get(username, {})
+        candidates: Dict[str, float] = {}
+
+        if seeds:
+            # Cost is bounded by RECENT_SEEDS * TOP_K, independent of history size
+            for position, seed in enumerate(reversed(seeds)):
+                recency = 1.0 / (1 + position)
+                for key, score in self._neighbors_of(seed):
+                    if key not in heard:
+                        candidates[key] = candidates.get(key, 0.0) + score * recency
+
+        results = []
+        for key in sorted(candidates, key=candidates.get, reverse=True)[:limit]:
+            results.append(dict(self._track_info(key), reason='Because you liked similar songs'))
+
+        for key in self.popular:
+            if len(results) >= limit:
+                break
+            if key not in heard and key not in candidates:
+                results.append(dict(self._track_info(key), reason='Popular in this room'))
+
+        return results
+
+    def _track_info(self, key: str) -> Dict[str, Any]:
+        if key in self.tracks:
+            return self.tracks[key]
+        return self.catalog.info_at(self.catalog.index_of(key))
+
+    def _neighbors_of(self, key: str) -> List[Tuple[str, float]]:
+        result = []
+        row = self.catalog.index_of(key)
+        if row is not None:
+            for neighbor, score in zip(self.neighbors[row], self.neighbor_scores[row]):
+                if neighbor < 0:
+                    break
+                result.append((self.catalog.key_at(neighbor), float(score)))
+
+        # Overlay weights are raw co-occurrence counts; squash them into the cosine range
+        for overlay in (self.stale_overlay, self.overlay):
+            for other, weight in overlay.get(key, {}).items():
+                result.append((other, weight / (weight + LIKE_WEIGHT)))
+        return result
+
+    def _record(self, username: str, song: Dict[str, Any], weight: float) -> str:
+        key = track_key(song)
+        if key not in self.tracks:
+            self.tracks[key] = {
+                'id': song.get('id'),
+                'title': song.get('title', ''),
+                'artist': song.get('artist', ''),
+                'platform': song.get('platform', ''),
+                'url': song.get('url', '')
+            }
+
+        weights = self.interactions.setdefault(username, {})
+        weights[key] = weights.get(key, 0.0) + weight
+
+        recent = self.recent.setdefault(username, deque(maxlen=RECENT_SEEDS))
+        if key in recent:
+            recent.remove(key)
+        recent.append(key)
+
+        self.events_since_rebuild += 1
+        return key
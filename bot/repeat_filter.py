@@ -0,0 +1,121 @@
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+REPEAT_WINDOW_MINUTES = 30   # exact window: the same track or query is refused for this long
+REPEAT_HISTORY_HOURS = 2     # Bloom window: longer history, answered approximately
+RECENT_CAPACITY = 1024       # keys kept in the exact window
+HISTORY_CAPACITY = 8192      # plays remembered by the Bloom filter (days of music)
+BLOOM_COUNTERS = 1 << 17     # 128 KiB; with 4 hashes ~0.25% false positives at full capacity
+BLOOM_HASHES = 4
+COUNTER_MAX = np.iinfo(np.uint8).max  # saturated counters are never decremented
+
+
+class RepeatFilter:
+    """Remembers recently requested tracks and queries in fixed memory.
+
+    The last few minutes are kept exactly (key -> time last seen, oldest
+    first), so the bot can say how long to wait. Older history goes into a
+    counting Bloom filter: each key sets BLOOM_HASHES counters, and a ring
+    of the counter positions written lets entries be removed again once
+    they leave the history window. Both structures have a fixed capacity;
+    when either is full the oldest entry makes room. Every lookup and
+    insert is O(1) amortized.
+    """
+
+    def __init__(self, counters: int = BLOOM_COUNTERS, hashes: int = BLOOM_HASHES,
+                 recent_capacity: int = RECENT_CAPACITY, history_capacity: int = HISTORY_CAPACITY):
+        self.recent: OrderedDict = OrderedDict()  # key -> monotonic time last recorded
+        self.recent_capacity = recent_capacity
+        self.counts = np.zeros(counters, dtype=np.uint8)
+        self.hashes = hashes
+        self.positions = np.zeros((history_capacity, hashes), dtype=np.uint32)  # ring of counter positions
+        self.times = np.zeros(history_capacity, dtype=np.float64)
+        self.oldest = 0  # ring index of the oldest history entry
+        self.size = 0
+        self.recent_window = REPEAT_WINDOW_MINUTES * 60.0
+        self.history_window = REPEAT_HISTORY_HOURS * 3600.0
+
+    def configure(self, recent_minutes: int, history_hours: int) -> None:
+        """Change the windows; 0 turns that check off. Entries expire against the new windows."""
+        self.recent_window = recent_minutes * 60.0
+        self.history_window = history_hours * 3600.0
+
+    def recent_age(self, key: str, now: Optional[float] = None) -> Optional[float]:
+        """Seconds since key was recorded, if that is within the exact window"""
+        now = time.monotonic() if now is None else now
+        self._expire(now)
+        seen = self.recent.get(key)
+        return now - seen if seen is not None else None
+
+    def in_history(self, key: str, now: Optional[float] = None) -> bool:
+        """Whether key was probably recorded within the history window (false positives are rare)"""
+        self._expire(time.monotonic() if now is None else now)
+        if self.size == 0:
+            return False
+        return bool(self.counts[self._positions(key)].min() > 0)
+
+    def wait_time(self, key: str, now: Optional[float] = None) -> Optional[float]:
+        """Seconds until key is allowed again: exact inside the recent window, the history window's
+        length when only the Bloom filter knows it, None when it is allowed now"""
+        age = self.recent_age(key, now)
+        if age is not None:
+            return max(self.recent_window, self.history_window) - age
+        return self.history_window if self.in_history(key, now) else None
+
+    def record(self, key: str, now: Optional[float] = None) -> None:
+        now = time.monotonic() if now is None else now
+        self._expire(now)
+        if self.recent_window > 0:
+            self.recent[key] = now
+            self.recent.move_to_end(key)
+            while len(self.recent) > self.recent_capacity:
+                self.recent.popitem(last=False)
+        if self.history_window > 0:
+            if self.size == len(self.times):
+                self._forget_oldest()
+            slot = (self.oldest + self.size) % len(self.times)
+            positions = self._positions(key)
+            self.positions[slot] = positions
+            self.times[slot] = now
+            self.size += 1
+            # Duplicate positions within one key count once, matching the single decrement in _forget_oldest
+            unique = np.unique(positions)
+            self.counts[unique] += (self.counts[unique] < COUNTER_MAX).astype(np.uint8)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'recent': len(self.recent),
+            'history': self.size,
+            'counters_set': int(np.count_nonzero(self.counts)),
+            'bytes': self.counts.nbytes + self.positions.nbytes + self.times.nbytes
+        }
+
+    def _positions(self, key: str) -> np.ndarray:
+        # Double hashing: k positions from two independent 64-bit halves of one digest
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        size = len(self.counts)
+        return np.array([(first + i * second) % size for i in range(self.hashes)], dtype=np.uint32)
+
+    def _expire(self, now: float) -> None:
+        while self.recent:
+            key, seen = next(iter(self.recent.items()))
+            if now - seen < self.recent_window:
+                break
+            self.recent.popitem(last=False)
+        while self.size and now - self.times[self.oldest] >= self.history_window:
+            self._forget_oldest()
+
+    def _forget_oldest(self) -> None:
+        unique = np.unique(self.positions[self.oldest])
+        self.counts[unique] -= (self.counts[unique] < COUNTER_MAX).astype(np.uint8)
+        self.oldest = (self.oldest + 1) % len(self.times)
+        self.size -= 1
@@ -0,0 +1,135 @@
+import asyncio
+import json
+import logging
+import os
+import struct
+import time
+import zlib
+from typing import Any, Callable, Dict, Optional
+
+from scheduler import Scheduler
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_INTERVAL = 5  # seconds between snapshot checks
+MAGIC = b'HRRS'
+FORMAT_VERSION = 1
+# magic, format version, saved-at (unix seconds), section count
+HEADER = struct.Struct('<4sHdH')
+# name length, payload length, crc32 of payload
+SECTION = struct.Struct('<HII')
+
+
+def encode_snapshot(sections: Dict[str, bytes], saved_at: float) -> bytes:
+    """Pack already compressed sections into one snapshot file"""
+    parts = [HEADER.pack(MAGIC, FORMAT_VERSION, saved_at, len(sections))]
+    for name, payload in sections.items():
+        encoded_name = name.encode('utf-8')
+        parts.append(SECTION.pack(len(encoded_name), len(payload), zlib.crc32(payload)))
+        parts.append(encoded_name)
+        parts.append(payload)
+    return b''.join(parts)
+
+
+def decode_snapshot(data: bytes) -> Dict[str, Any]:
+    """Unpack a snapshot into saved_at, decoded sections and their compressed payloads"""
+    magic, version, saved_at, count = HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != FORMAT_VERSION:
+        raise ValueError(f"Unsupported room snapshot (magic={magic!r}, version={version})")
+
+    offset = HEADER.size
+    sections = {}
+    payloads = {}
+    for _ in range(count):
+        name_length, payload_length, crc = SECTION.unpack_from(data, offset)
+        offset += SECTION.size
+        name = data[offset:offset + name_length].decode('utf-8')
+        offset += name_length
+        payload = data[offset:offset + payload_length]
+        offset += payload_length
+        if len(payload) != payload_length or zlib.crc32(payload) != crc:
+            raise ValueError(f"Room snapshot section '{name}' is corrupt")
+        sections[name] = json.loads(zlib.decompress(payload))
+        payloads[name] = payload
+    return {'saved_at': saved_at, 'sections': sections, 'payloads': payloads}
+
+
+class RoomSnapshotter:
+    """Periodic binary snapshots of the bot's room state for warm restarts.
+
+    State is split into named sections, each produced by a capture callback on
+    the event loop. Only sections whose serialized form changed since the last
+    write are recompressed, and compression plus the atomic file write run in
+    an executor thread, so a quiet room costs one JSON encode per interval.
+    """
+
+    def __init__(self, scheduler: Scheduler, capture: Callable[[], Dict[str, Any]], data_file: str):
+        self.scheduler = scheduler
+        self.capture = capture  # returns {section name: JSON-serializable value}
+        self.data_file = data_file
+        self.raw: Dict[str, bytes] = {}         # last serialized form per section
+        self.compressed: Dict[str, bytes] = {}  # last compressed form per section
+        self.writing = False
+        self.timer = None
+
+    def start(self) -> None:
+        if self.timer is None:
+            self.timer = self.scheduler.call_every(SNAPSHOT_INTERVAL, self.save, name='room_snapshot')
+
+    def stop(self) -> None:
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        """Read the last snapshot; None if there is none or it cannot be used"""
+        if not os.path.exists(self.data_file):
+            return None
+        try:
+            with open(self.data_file, 'rb') as f:
+                snapshot = decode_snapshot(f.read())
+        except (OSError, ValueError, struct.error, zlib.error) as e:
+            logger.error(f"Ignoring unreadable room snapshot {self.data_file}: {e}")
+            return None
+
+        # Seed the change detection so an unchanged room is not rewritten right away
+        self.compressed = snapshot.pop('payloads')
+        for name, value in snapshot['sections'].items():
+            self.raw[name] = json.dumps(value, default=str).encode('utf-8')
+        return snapshot
+
+    async def save(self) -> None:
+        """Write a snapshot if any section changed since the last one"""
+        if self.writing:
+            return  # The previous write is still running; the next tick catches up
+
+        changed = {}
+        for name, value in self.capture().items():
+            raw = json.dumps(value, default=str).encode('utf-8')
+            if self.raw.get(name) != raw:
+                changed[name] = raw
+        if not changed:
+            return
+
+        self.writing = True
+        try:
+            saved_at = time.time()
+            await asyncio.get_running_loop().run_in_executor(None, self._write, changed, saved_at)
+            self.raw.update(changed)
+        except Exception as e:
+            logger.error(f"Failed to write room snapshot: {e}")
+        finally:
+            self.writing = False
+
+    def _write(self, changed: Dict[str, bytes], saved_at: float) -> None:
+        sections = dict(self.compressed)
+        for name, raw in changed.items():
+            sections[name] = zlib.compress(raw, 6)
+
+        tmp_file = self.data_file + '.tmp'
+        with open(tmp_file, 'wb') as f:
+            f.write(encode_snapshot(sections, saved_at))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.data_file)
+        self.compressed = sections
@@ -0,0 +1,197 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import random
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TICK = 0.05  # seconds; timers due within one tick fire on the same wakeup
+
+
+class TimerHandle:
+    """Handle for a scheduled job, returned by Scheduler.call_later / call_every"""
+
+    __slots__ = ('when', 'interval', 'jitter', 'callback', 'args', 'name', 'cancelled', 'scheduled', 'scheduler')
+
+    def __init__(self, scheduler: 'Scheduler', when: float, callback: Callable[..., Any], args: Tuple[Any, ...],
+                 interval: Optional[float], jitter: float, name: str):
+        self.scheduler = scheduler
+        self.when = when
+        self.callback = callback
+        self.args = args
+        self.interval = interval
+        self.jitter = jitter
+        self.name = name
+        self.cancelled = False
+        self.scheduled = False  # currently sitting in the heap
+
+    def cancel(self) -> None:
+        """Cancel the job; a recurring job will not fire again"""
+        if not self.cancelled:
+            self.cancelled = True
+            if self.scheduled:
+                self.scheduler._cancelled += 1
+
+    @property
+    def recurring(self) -> bool:
+        return self.interval is not None
+
+    def due_in(self) -> float:
+        return max(0.0, self.when - self.scheduler._time())
+
+
+class Scheduler:
+    """Heap-based timer scheduler driven by a single task on the event loop.
+
+    Every periodic and delayed job in the bot (song advance, dance moves, token
+    refresh, competition end, daily reset) is a heap entry instead of its own
+    sleeping coroutine, so thousands of timers cost one wakeup per tick.
+    """
+
+    def __init__(self, tick: float = DEFAULT_TICK):
+        self.tick = tick
+        self._heap: List[Tuple[float, int, TimerHandle]] = []
+        self._sequence = itertools.count()
+        self._cancelled = 0
+        self._driver: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._running: Set[asyncio.Task] = set()
+
+    def call_later(self, delay: float, callback: Callable[..., Any], *args: Any,
+                   jitter: float = 0.0, name: Optional[str] = None) -> TimerHandle:
+        """Run callback once after delay seconds (plus up to jitter seconds)"""
+        when = self._time() + max(0.0, delay) + self._jitter(jitter)
+        handle = TimerHandle(self, when, callback, args, None, jitter, name or self._name(callback))
+        self._push(handle)
+        return handle
+
+    def call_every(self, interval: float, callback: Callable[..., Any], *args: Any, jitter: float = 0.0,
+                   initial_delay: Optional[float] = None, name: Optional[str] = None) -> TimerHandle:
+        """Run callback every interval seconds until the handle is cancelled"""
+        if interval <= 0:
+            raise ValueError("interval must be positive")
+        first = interval if initial_delay is None else max(0.0, initial_delay)
+        when = self._time() + first + self._jitter(jitter)
+        handle = TimerHandle(self, when, callback, args, interval, jitter, name or self._name(callback))
+        self._push(handle)
+        return handle
+
+    def pending(self) -> List[Dict[str, Any]]:
+        """Snapshot of scheduled jobs, soonest first"""
+        jobs = []
+        for when, _, handle in sorted(self._heap):
+            if not handle.cancelled:
+                jobs.append({
+                    'name': handle.name,
+                    'due_in': max(0.0, when - self._time()),
+                    'interval': handle.interval
+                })
+        return jobs
+
+    async def close(self) -> None:
+        """Cancel every pending job and the driver task"""
+        for _, _, handle in self._heap:
+            handle.cancelled = True
+        self._heap.clear()
+        self._cancelled = 0
+
+        tasks = list(self._running)
+        if self._driver is not None:
+            tasks.append(self._driver)
+            self._driver = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _push(self, handle: TimerHandle) -> None:
+        earliest = self._heap[0][0] if self._heap else math.inf
+        handle.scheduled = True
+        heapq.heappush(self._heap, (handle.when, next(self._sequence), handle))
+
+        if self._driver is None or self._driver.done():
+            self._wakeup = asyncio.Event()
+            self._driver = asyncio.get_running_loop().create_task(self._run())
+        elif handle.when < earliest:
+            self._wakeup.set()
+
+    async def _run(self) -> None:
+        while self._heap:
+            when, _, handle = self._heap[0]
+            if handle.cancelled:
+                heapq.heappop(self._heap)
+                handle.scheduled = False
+                self._cancelled -= 1
+                continue
+
+            delay = when - self._time()
+            if delay > 0:
+                # Round up to the tick so neighbouring deadlines share this wakeup
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=math.ceil(delay / self.tick) * self.tick)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            horizon = self._time() + self.tick
+            due = []
+            while self._heap and self._heap[0][0] <= horizon:
+                _, _, handle = heapq.heappop(self._heap)
+                handle.scheduled = False
+                if handle.cancelled:
+                    self._cancelled -= 1
+                else:
+                    due.append(handle)
+
+            for handle in due:
+                self._fire(handle)
+                if handle.recurring and not handle.cancelled:
+                    # Anchored to the previous deadline so recurring jobs do not drift
+                    handle.when = max(handle.when + handle.interval, self._time()) + self._jitter(handle.jitter)
+                    handle.scheduled = True
+                    heapq.heappush(self._heap, (handle.when, next(self._sequence), handle))
+
+            self._compact()
+
+        self._driver = None
+
+    def _fire(self, handle: TimerHandle) -> None:
+        try:
+            result = handle.callback(*handle.args)
+        except Exception as e:
+            logger.error(f"Scheduled job {handle.name} failed: {e}")
+            return
+
+        if asyncio.iscoroutine(result):
+            task = asyncio.get_running_loop().create_task(result)
+            self._running.add(task)
+            task.add_done_callback(lambda done, name=handle.name: self._job_done(done, name))
+
+    def _job_done(self, task: asyncio.Task, name: str) -> None:
+        self._running.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Scheduled job {name} failed: {task.exception()}")
+
+    def _compact(self) -> None:
+        # Drop lazily cancelled entries once they dominate the heap
+        if self._cancelled > 64 and self._cancelled > len(self._heap) // 2:
+            for entry in self._heap:
+                if entry[2].cancelled:
+                    entry[2].scheduled = False
+            self._heap = [entry for entry in self._heap if not entry[2].cancelled]
+            heapq.heapify(self._heap)
+            self._cancelled = 0
+
+    def _time(self) -> float:
+        return asyncio.get_running_loop().time()
+
+    @staticmethod
+    def _jitter(jitter: float) -> float:
+        return random.uniform(0.0, jitter) if jitter > 0 else 0.0
+
+    @staticmethod
+    def _name(callback: Callable[..., Any]) -> str:
+        return getattr(callback, '__qualname__', repr(callback))
@@ -0,0 +1,99 @@
+import hashlib
+import os
+from typing import Dict, List, Any, Optional
+
+import numpy as np
+
+# Fixed-width UTF-8 fields; longer values are truncated on write
+CATALOG_DTYPE = np.dtype([
+    ('ref', 'S200'),      # URL (or id) that follows "platform:" in the track key
+    ('title', 'S96'),
+    ('artist', 'S64'),
+    ('platform', 'S12')
+])
+
+
+def key_hash(key: str) -> int:
+    """Process-independent 64-bit hash of a track key"""
+    return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def _encode(value: Any, width: int) -> bytes:
+    data = str(value or '').encode('utf-8')[:width]
+    # Never leave a split multi-byte sequence at the end
+    return data.decode('utf-8', 'ignore').encode('utf-8')
+
+
+def _decode(value: bytes) -> str:
+    return value.decode('utf-8', 'ignore')
+
+
+class TrackCatalog:
+    """Track metadata in fixed-width records with a sorted hash index for key lookups.
+
+    Opened from disk the arrays are read-only memory maps, so every bot process
+    on the host shares one physical copy through the page cache.
+    """
+
+    def __init__(self, records: np.ndarray, hashes: np.ndarray, order: np.ndarray):
+        self.records = records
+        self.hashes = hashes  # sorted key hashes
+        self.order = order    # record row for each sorted hash
+
+    @classmethod
+    def from_tracks(cls, keys: List[str], tracks: List[Dict[str, Any]]) -> 'TrackCatalog':
+        """Build an in-memory catalog; keys[i] describes tracks[i]"""
+        records = np.zeros(len(keys), dtype=CATALOG_DTYPE)
+        for row, (key, track) in enumerate(zip(keys, tracks)):
+            records[row] = (
+                _encode(key.split(':', 1)[1] if ':' in key else key, CATALOG_DTYPE['ref'].itemsize),
+                _encode(track.get('title'), CATALOG_DTYPE['title'].itemsize),
+                _encode(track.get('artist'), CATALOG_DTYPE['artist'].itemsize),
+                _encode(track.get('platform'), CATALOG_DTYPE['platform'].itemsize)
+            )
+
+        raw = np.fromiter((key_hash(key) for key in keys), dtype=np.uint64, count=len(keys))
+        order = np.argsort(raw, kind='stable').astype(np.int32)
+        return cls(records, raw[order], order)
+
+    @classmethod
+    def open(cls, path: str) -> 'TrackCatalog':
+        """Map a saved catalog read-only"""
+        return cls(
+            np.load(os.path.join(path, 'catalog.npy'), mmap_mode='r'),
+            np.load(os.path.join(path, 'catalog_hashes.npy'), mmap_mode='r'),
+            np.load(os.path.join(path, 'catalog_order.npy'), mmap_mode='r')
+        )
+
+    def save(self, path: str) -> None:
+        np.save(os.path.join(path, 'catalog.npy'), self.records)
+        np.save(os.path.join(path, 'catalog_hashes.npy'), self.hashes)
+        np.save(os.path.join(path, 'catalog_order.npy'), self.order)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def index_of(self, key: str) -> Optional[int]:
+        """Record row of a track key, by binary search over the hash index"""
+        if not len(self.hashes):
+            return None
+        target = np.uint64(key_hash(key))
+        pos = int(np.searchsorted(self.hashes, target))
+        if pos < len(self.hashes) and self.hashes[pos] == target:
+            return int(self.order[pos])
+        return None
+
+    def key_at(self, row: int) -> str:
+        record = self.records[row]
+        return f"{_decode(record['platform']).lower()}:{_decode(record['ref'])}"
+
+    def info_at(self, row: int) -> Dict[str, Any]:
+        record = self.records[row]
+        ref = _decode(record['ref'])
+        return {
+            'id': None,
+            'title': _decode(record['title']),
+            'artist': _decode(record['artist']),
+            'platform': _decode(record['platform']),
+            'url': ref if ref.startswith('http') else ''
+        }
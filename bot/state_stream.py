@@ -0,0 +1,96 @@
+import logging
+from typing import Any, Callable, Dict, List, Optional
+
+from scheduler import Scheduler
+
+logger = logging.getLogger(__name__)
+
+FLUSH_DELAY = 0.1         # seconds; deltas raised within this window go out as one event
+SNAPSHOT_INTERVAL = 60    # seconds between full snapshots for resync
+
+
+def compact_item(item: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """The dashboard's view of a queue item"""
+    if not item:
+        return None
+    song = item['song']
+    return {
+        'title': song.get('title'),
+        'artist': song.get('artist'),
+        'platform': song.get('platform'),
+        'url': song.get('url'),
+        'duration': song.get('duration'),
+        'replay_gain': song.get('replay_gain'),
+        'requested_by': item.get('requested_by'),
+        'likes': item.get('likes', 0)
+    }
+
+
+class StateStream:
+    """Sequenced room-state deltas with periodic full snapshots.
+
+    Every change is an [op, payload] pair with its own sequence number. Pairs
+    raised in the same FLUSH_DELAY window are sent as one 'state.delta' event
+    carrying the first and last sequence numbers; a consumer that sees a gap
+    waits for (or requests) the next 'state.snapshot', which carries the
+    sequence number it is current as of.
+    """
+
+    def __init__(self, scheduler: Scheduler, emit: Callable[[str, Any], None],
+                 snapshot: Callable[[], Dict[str, Any]]):
+        self.scheduler = scheduler
+        self.emit = emit          # ControlChannel.emit
+        self.snapshot = snapshot  # full dashboard state
+        self.seq = 0
+        self.pending: List[List[Any]] = []
+        self.flush_timer = None
+        self.snapshot_timer = None
+
+    def start(self) -> None:
+        if self.snapshot_timer is None:
+            self.snapshot_timer = self.scheduler.call_every(SNAPSHOT_INTERVAL, self.send_snapshot,
+                                                            name='state_snapshot')
+        self.send_snapshot()
+
+    def publish(self, op: str, payload: Any = None) -> None:
+        """Queue one state change"""
+        self.seq += 1
+        self.pending.append([op, payload])
+        if self.flush_timer is None:
+            self.flush_timer = self.scheduler.call_later(FLUSH_DELAY, self.flush, name='state_flush')
+
+    def flush(self) -> None:
+        self.flush_timer = None
+        if not self.pending:
+            return
+        ops, self.pending = self.pending, []
+        self.emit('state.delta', {'first': self.seq - len(ops) + 1, 'seq': self.seq, 'ops': ops})
+
+    def send_snapshot(self) -> Dict[str, Any]:
+        """Emit a full snapshot; pending deltas go out first so sequence numbers stay ordered"""
+        if self.flush_timer is not None:
+            self.flush_timer.cancel()
+        self.flush()
+        data = {'seq': self.seq, 'state': self.snapshot()}
+        self.emit('state.snapshot', data)
+        return data
+
+    # Helpers for the changes the bot makes
+
+    def queue_add(self, index: int, item: Dict[str, Any]) -> None:
+        self.publish('queue.add', {'index': index, 'item': compact_item(item)})
+
+    def queue_remove(self, index: int) -> None:
+        self.publish('queue.remove', {'index': index})
+
+    def queue_clear(self) -> None:
+        self.publish('queue.clear')
+
+    def now_playing(self, item: Optional[Dict[str, Any]]) -> None:
+        self.publish('now_playing', compact_item(item))
+
+    def likes(self, likes: int) -> None:
+        self.publish('likes', {'likes': likes})
+
+    def balance(self, username: str, cubes: int) -> None:
+        self.publish('balance', {'username': username, 'cubes': cubes})
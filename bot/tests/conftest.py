@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Bot modules import each other as top-level modules (the bot runs from bot/)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,43 @@
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+
+import music_bot
+from analytics import Bucket
+
+
+class SlowHighrise:
+    """get_room_users waits forever, so on_start stays in its startup window"""
+
+    async def get_room_users(self):
+        await asyncio.Event().wait()
+
+
+def test_events_during_startup_add_to_the_saved_day(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(music_bot, 'EVENT_LOG_DIR', str(tmp_path / 'events'))
+    monkeypatch.setattr(music_bot, 'AUDIO_CACHE_DIR', str(tmp_path / 'audio'))
+    saved = Bucket(int(time.time() // 86400 * 86400))
+    saved.tips = 2
+    saved.tip_gold = 100
+    saved.users.add('before')
+    (tmp_path / 'analytics_room.json').write_text(json.dumps(saved.to_dict()))
+    bot = music_bot.HighriseMusicBot({})
+    bot.highrise = SlowHighrise()
+    metadata = SimpleNamespace(user_id='bot', room_info=SimpleNamespace(id='room'))
+
+    async def start():
+        starting = asyncio.create_task(bot.on_start(metadata))
+        await asyncio.sleep(0)  # on_start is now waiting on get_room_users
+        bot.analytics.record_tip(50)
+        bot.analytics.record_user('early')
+        starting.cancel()
+        bot.prefetcher.close()
+        bot.event_log.close()
+        await bot.scheduler.close()
+
+    asyncio.run(start())
+    assert bot.analytics.day.tips == 3
+    assert bot.analytics.day.tip_gold == 150
+    assert bot.analytics.day.users.count() == 2
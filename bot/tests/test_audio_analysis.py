@@ -0,0 +1,58 @@
+import wave
+
+import numpy as np
+
+from audio_analysis import CHUNK_FRAMES, LoudnessMeter, analyze_file
+
+RATE = 44100
+
+
+def write_wav(path, samples):
+    with wave.open(str(path), 'wb') as wav:
+        wav.setnchannels(2)
+        wav.setsampwidth(2)
+        wav.setframerate(RATE)
+        frames = np.repeat((samples * 32767).astype('<i2')[:, None], 2, axis=1)
+        wav.writeframes(frames.tobytes())
+
+
+def test_short_trailing_chunk_is_analyzed(tmp_path):
+    # The last chunk holds 100 frames, less than one 100 ms loudness step
+    frames = CHUNK_FRAMES * 121 + 100
+    t = np.arange(frames) / RATE
+    path = tmp_path / 'tone.wav'
+    write_wav(path, 0.1 * np.sin(2 * np.pi * 997 * t))
+
+    result = analyze_file(str(path))
+
+    assert result['loudness'] is not None
+    assert result['replay_gain'] is not None
+
+
+def test_chunk_shorter_than_a_step_is_kept_pending():
+    meter = LoudnessMeter(RATE, 2)
+    meter.add(np.zeros((100, 2), dtype=np.float32))
+    assert len(meter.pending) == 100
+    meter.add(np.full((RATE, 2), 0.1, dtype=np.float32))
+    assert len(np.concatenate(meter.energies)) == 10
+
+
+def test_steady_tone_has_no_tempo(tmp_path):
+    # Quantized to int16 the tone's flux ripples with the period of its rounding error, but has no onsets
+    t = np.arange(RATE * 30) / RATE
+    for frequency, amplitude in ((997, 10 ** (-23 / 20) * np.sqrt(2)), (440, 0.0708), (100, 0.5)):
+        path = tmp_path / f'tone-{frequency}.wav'
+        write_wav(path, amplitude * np.sin(2 * np.pi * frequency * t))
+        assert analyze_file(str(path))['bpm'] is None
+
+
+def test_click_track_tempo(tmp_path):
+    rng = np.random.default_rng(0)
+    samples = np.zeros(RATE * 30)
+    for beat in np.arange(0, 30, 0.5):
+        start = int(beat * RATE)
+        samples[start:start + 2000] += rng.standard_normal(2000) * np.exp(-np.arange(2000) / 300)
+    t = np.arange(RATE * 30) / RATE
+    path = tmp_path / 'clicks.wav'
+    write_wav(path, np.clip(0.3 * samples + 0.2 * np.sin(2 * np.pi * 220 * t), -1, 1))
+    assert abs(analyze_file(str(path))['bpm'] - 120) < 1
@@ -0,0 +1,120 @@
+import asyncio
+import os
+from types import SimpleNamespace
+
+import music_bot
+from audio_cache import AudioCache, AudioPrefetcher, audio_key
+from audio_sources import LocalFileSource
+from scheduler import Scheduler
+
+
+class SlowHighrise:
+    """get_room_users waits forever, so on_start stays in its startup window"""
+
+    def __init__(self):
+        self.chats = []
+
+    async def get_room_users(self):
+        await asyncio.Event().wait()
+
+    async def chat(self, text):
+        self.chats.append(text)
+
+
+def test_song_requested_during_startup_is_queued(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(music_bot, 'EVENT_LOG_DIR', str(tmp_path / 'events'))
+    monkeypatch.setattr(music_bot, 'AUDIO_CACHE_DIR', str(tmp_path / 'audio'))
+    bot = music_bot.HighriseMusicBot({})
+    bot.highrise = SlowHighrise()
+    committed = []
+
+    async def commit_reservation(reservation, description):
+        committed.append(reservation)
+
+    bot.cube_system.commit_reservation = commit_reservation
+    metadata = SimpleNamespace(user_id='bot', room_info=SimpleNamespace(id='room'))
+    song = {'id': 'abc', 'title': 'Song', 'artist': 'Artist', 'platform': 'YouTube', 'duration': 180}
+
+    async def request():
+        starting = asyncio.create_task(bot.on_start(metadata))
+        await asyncio.sleep(0)  # on_start is now waiting on get_room_users
+        bot.current_song = {'song': dict(song, id='playing')}  # Keep enqueue from starting playback
+        await bot.enqueue_song(SimpleNamespace(username='early'), song, {'amount': 10}, announce=False)
+        starting.cancel()
+        bot.prefetcher.close()
+        bot.event_log.close()
+        await bot.scheduler.close()
+
+    asyncio.run(request())
+    assert committed
+    assert [item['song']['id'] for item in bot.music_queue] == ['abc']
+
+
+def add_track(cache, key, size):
+    """Store a fetched track the way the prefetcher does"""
+    partial = cache.partial_path(key)
+    os.makedirs(os.path.dirname(partial), exist_ok=True)
+    with open(partial, 'wb') as f:
+        f.write(b'x' * size)
+    return cache.add(key, partial, {'format': 'mp3'})
+
+
+def test_least_recently_used_track_is_evicted_first(tmp_path):
+    async def fill():
+        scheduler = Scheduler()
+        cache = AudioCache(scheduler, str(tmp_path / 'cache'), max_bytes=250)
+        first = add_track(cache, 'youtube/a', 100)
+        second = add_track(cache, 'youtube/b', 100)
+        assert cache.path('youtube/a') == first  # a is now the most recently used
+        add_track(cache, 'youtube/c', 100)
+        await scheduler.close()
+        return cache, second
+
+    cache, second = asyncio.run(fill())
+    assert list(cache.entries) == ['youtube/a', 'youtube/c']
+    assert cache.size == 200
+    assert not (tmp_path / 'cache' / 'youtube' / 'b.mp3').exists()
+    assert second.endswith('b.mp3')
+
+
+def test_pinned_tracks_are_not_evicted(tmp_path):
+    async def fill():
+        scheduler = Scheduler()
+        cache = AudioCache(scheduler, str(tmp_path / 'cache'), max_bytes=250)
+        add_track(cache, 'youtube/a', 100)
+        cache.pin({'youtube/a'})
+        add_track(cache, 'youtube/b', 100)
+        add_track(cache, 'youtube/c', 100)
+        await scheduler.close()
+        return cache
+
+    assert list(asyncio.run(fill()).entries) == ['youtube/a', 'youtube/c']
+
+
+def test_prefetcher_fills_the_next_tracks_from_local_files(tmp_path):
+    songs = [{'id': name, 'title': name, 'platform': 'YouTube'} for name in ('now', 'next', 'later', 'last')]
+    (tmp_path / 'local' / 'youtube').mkdir(parents=True)
+    for song in songs:
+        (tmp_path / 'local' / 'youtube' / f"{song['id']}.mp3").write_bytes(song['id'].encode())
+    cached = []
+
+    async def prefetch():
+        scheduler = Scheduler()
+        cache = AudioCache(scheduler, str(tmp_path / 'cache'))
+        prefetcher = AudioPrefetcher(scheduler, cache, LocalFileSource(str(tmp_path / 'local')),
+                                     upcoming=lambda: songs, lookahead=2, on_cached=cached.append)
+        prefetcher.notify()
+        await asyncio.sleep(0.2)
+        assert await prefetcher.wait_for(songs[2], timeout=5)
+        prefetcher.close()
+        await scheduler.close()
+        return cache
+
+    cache = asyncio.run(prefetch())
+    # The current song plus two ahead; the fourth stays a plain link
+    assert sorted(cached) == sorted(audio_key(song) for song in songs[:3])
+    assert audio_key(songs[3]) not in cache
+    with open(cache.location(audio_key(songs[1])), 'rb') as f:
+        assert f.read() == b'next'
+    assert cache.meta(audio_key(songs[1]))['source'] == 'local'
@@ -0,0 +1,66 @@
+import asyncio
+
+import aiohttp
+
+from audio_relay import AudioRelay, RingBuffer
+from scheduler import Scheduler
+
+
+def test_ring_write_wraps_around():
+    ring = RingBuffer(8)
+    ring.write(b'abcdef')
+    ring.write(b'ghij')
+    assert ring.written == 10
+    assert ring.oldest == 2
+    views = ring.slices(2, 10)
+    assert [bytes(view) for view in views] == [b'cdefgh', b'ij']
+    assert [bytes(view) for view in ring.slices(4, 8)] == [b'efgh']
+
+
+def test_ring_write_larger_than_capacity_keeps_the_newest_bytes():
+    ring = RingBuffer(4)
+    ring.write(b'ab')
+    ring.write(b'cdefghij')
+    assert ring.written == 10
+    assert b''.join(ring.slices(ring.oldest, ring.written)) == b'ghij'
+
+
+def test_listen_url_needs_a_public_address():
+    async def serve(public_url):
+        scheduler = Scheduler()
+        relay = AudioRelay(scheduler, host='127.0.0.1', port=0, public_url=public_url)
+        url = await relay.start()
+        running = relay.running
+        await relay.stop()
+        await scheduler.close()
+        return url, running
+
+    assert asyncio.run(serve('')) == (None, True)
+    assert asyncio.run(serve('https://music.example.com/listen')) == ('https://music.example.com/listen', True)
+
+
+def test_listener_more_than_a_ring_behind_skips_to_live():
+    async def listen():
+        scheduler = Scheduler()
+        relay = AudioRelay(scheduler, host='127.0.0.1', port=0)
+        relay.ring = RingBuffer(64)
+        await relay.start()
+        async with aiohttp.ClientSession() as session:
+            async with session.get(f"http://127.0.0.1:{relay.port}/listen") as response:
+                while not relay.listeners:
+                    await asyncio.sleep(0.01)
+                [listener] = relay.listeners
+                # Three rings' worth arrive before the listener gets a turn
+                stream = bytes(range(192))
+                for start in range(0, len(stream), 48):
+                    relay.ring.write(stream[start:start + 48])
+                relay.data_ready.set()
+                received = await response.content.readexactly(64)
+                drops = listener.drops
+        await relay.stop()
+        await scheduler.close()
+        return stream, received, drops
+
+    stream, received, drops = asyncio.run(listen())
+    assert drops == 1
+    assert received == stream[-64:]
@@ -0,0 +1,99 @@
+import asyncio
+
+import pytest
+
+import choreography
+from choreography import Choreographer, song_tempo
+from scheduler import Scheduler
+
+
+def test_tempo_comes_from_plausible_metadata():
+    assert song_tempo({'bpm': '128'}) == 128
+    assert song_tempo({'tempo': 90.5}) == 90.5
+    assert song_tempo({'bpm': 500}) is None
+    assert song_tempo({'bpm': 'fast'}) is None
+    assert song_tempo(None) is None
+
+
+def test_holds_stretch_to_the_next_bar():
+    dancer = Choreographer(Scheduler(), send_emote=None)
+    assert dancer.hold_time('dance-tiktok2') == 10.4
+    assert dancer.hold_time('unknown') == choreography.DEFAULT_DURATION
+    dancer.set_tempo(120)  # Two-second bars
+    assert dancer.hold_time('dance-tiktok2') == pytest.approx(12.0)
+    assert dancer.hold_time('dance-shoppingcart') == pytest.approx(6.0)
+
+
+def run_dancer(test, send_emote):
+    """Run test(dancer) with short emotes and return the reasons the routine gave up"""
+    stopped = []
+
+    async def on_stop(reason):
+        stopped.append(reason)
+
+    async def run():
+        scheduler = Scheduler(tick=0.01)
+        dancer = Choreographer(scheduler, send_emote, on_stop)
+        await test(dancer)
+        await scheduler.close()
+
+    asyncio.run(run())
+    return stopped
+
+
+def test_routine_loops_until_stopped(monkeypatch):
+    monkeypatch.setattr(choreography, 'EMOTE_DURATIONS', {'a': 0.02, 'b': 0.02})
+    sent = []
+
+    async def send_emote(emote):
+        sent.append(emote)
+
+    async def test(dancer):
+        assert dancer.start(['a', 'b'])
+        assert not dancer.start(['b'])  # One routine at a time
+        await asyncio.sleep(0.1)
+        assert dancer.stop()
+        count = len(sent)
+        await asyncio.sleep(0.05)
+        assert len(sent) == count
+
+    assert run_dancer(test, send_emote) == []
+    assert len(sent) >= 4
+    assert sent[:4] == ['a', 'b', 'a', 'b']
+
+
+def test_failing_emotes_back_off_then_give_up(monkeypatch):
+    monkeypatch.setattr(choreography, 'RETRY_DELAY', 0.03)
+    monkeypatch.setattr(choreography, 'MAX_FAILURES', 3)
+    attempts = []
+
+    async def send_emote(emote):
+        attempts.append(asyncio.get_running_loop().time())
+        raise RuntimeError("not allowed")
+
+    async def test(dancer):
+        dancer.start(['a'])
+        await asyncio.sleep(0.2)
+        assert not dancer.dancing
+
+    assert run_dancer(test, send_emote) == ["too many failed emotes"]
+    assert len(attempts) == 3
+    assert attempts[2] - attempts[1] > attempts[1] - attempts[0]
+
+
+def test_stop_during_a_send_does_not_reschedule(monkeypatch):
+    monkeypatch.setattr(choreography, 'EMOTE_DURATIONS', {'a': 0.01})
+    sent = []
+
+    async def test(dancer):
+        async def send_emote(emote):
+            sent.append(emote)
+            dancer.stop()
+
+        dancer.send_emote = send_emote
+        dancer.start(['a'])
+        await asyncio.sleep(0.05)
+        assert not dancer.dancing
+
+    run_dancer(test, None)
+    assert sent == ['a']
@@ -0,0 +1,31 @@
+from content_filter import ContentFilter
+
+
+def test_double_letters_in_terms_are_kept():
+    content_filter = ContentFilter(['ass', 'hell', 'class'])
+    assert content_filter.allows("As It Was - Harry Styles")
+    assert content_filter.allows("Hel Mouth")
+    assert content_filter.allows("Clas Ohlson")
+    assert content_filter.find("kick ass") == 'ass'
+    assert content_filter.find("Highway to Hell") == 'hell'
+
+
+def test_stretched_letters_match_single_and_double_letters():
+    content_filter = ContentFilter(['bad', 'ass'])
+    assert content_filter.find("so baaaad") == 'bad'
+    assert content_filter.find("ASSSSS") == 'ass'
+    assert content_filter.allows("baad")  # a double is a different word
+
+
+def test_leetspeak_accents_and_word_boundaries():
+    content_filter = ContentFilter(['badword', 'very bad', 'nasty*'])
+    assert content_filter.find("this is a B@DW0RD!!") == 'badword'
+    assert content_filter.find("Bädwörd here") == 'badword'
+    assert content_filter.find("a very-bad song") == 'very bad'
+    assert content_filter.find("Nastyboys") == 'nasty'
+    assert content_filter.allows("badwords")
+    assert content_filter.allows("dynasty")
+
+
+def test_empty_filter_allows_everything():
+    assert ContentFilter([]).allows("anything at all")
@@ -0,0 +1,78 @@
+import asyncio
+import io
+import json
+import os
+
+from control_channel import PROTOCOL_VERSION, ControlChannel
+
+
+def run_channel(handlers, lines, expected):
+    """Feed request lines through a pipe and return the first `expected` messages written back"""
+    async def run():
+        read_fd, write_fd = os.pipe()
+        stdin = os.fdopen(read_fd, 'rb')
+        stdout = io.StringIO()
+        channel = ControlChannel(handlers, stdin=stdin, stdout=stdout)
+        assert channel.start()
+        os.write(write_fd, ''.join(lines).encode('utf-8'))
+        while len(stdout.getvalue().splitlines()) < expected:
+            await asyncio.sleep(0.01)
+        os.close(write_fd)
+        await channel.reader_task  # EOF ends the read loop
+        await asyncio.gather(*channel.requests)
+        return [json.loads(line) for line in stdout.getvalue().splitlines()]
+
+    return asyncio.run(asyncio.wait_for(run(), 5))
+
+
+def test_responses_carry_their_request_ids():
+    async def slow(params):
+        await asyncio.sleep(0.05)
+        return {'echo': params['value']}
+
+    async def fast(params):
+        return {'echo': params['value']}
+
+    lines = [json.dumps({'id': 1, 'type': 'slow', 'params': {'value': 'a'}}) + '\n',
+             json.dumps({'id': 2, 'type': 'fast', 'params': {'value': 'b'}}) + '\n']
+    ready, first, second = run_channel({'slow': slow, 'fast': fast}, lines, 3)
+
+    assert ready == {'type': 'event', 'event': 'ready',
+                     'data': {'protocol': PROTOCOL_VERSION, 'requests': ['fast', 'slow']}}
+    # The slow request does not hold up the fast one, and each reply keeps its id
+    assert first == {'type': 'response', 'id': 2, 'ok': True, 'result': {'echo': 'b'}}
+    assert second == {'type': 'response', 'id': 1, 'ok': True, 'result': {'echo': 'a'}}
+
+
+def test_malformed_lines_are_answered_without_stopping_the_channel():
+    async def status(params):
+        return 'ok'
+
+    async def invalid(params):
+        raise ValueError("bad value")
+
+    async def broken(params):
+        raise RuntimeError("boom")
+
+    lines = ['not json\n', '[1, 2]\n', '\n',
+             '{"id": 3, "type": "missing"}\n',
+             '{"id": 4, "type": "invalid"}\n',
+             '{"id": 5, "type": "broken"}\n',
+             '{"id": 6, "type": "status"}\n']
+    messages = run_channel({'status': status, 'invalid': invalid, 'broken': broken}, lines, 7)[1:]
+
+    unmatched = [message for message in messages if message['id'] is None]
+    assert len(unmatched) == 2  # The blank line is skipped
+    assert all(not message['ok'] and message['error'].startswith('invalid request') for message in unmatched)
+    by_id = {message['id']: message for message in messages if message['id'] is not None}
+    assert by_id[3] == {'type': 'response', 'id': 3, 'ok': False, 'error': 'unknown request type: missing'}
+    assert by_id[4] == {'type': 'response', 'id': 4, 'ok': False, 'error': 'bad value'}
+    assert by_id[5] == {'type': 'response', 'id': 5, 'ok': False, 'error': 'internal error'}
+    assert by_id[6] == {'type': 'response', 'id': 6, 'ok': True, 'result': 'ok'}
+
+
+def test_events_need_a_manager():
+    stdout = io.StringIO()
+    channel = ControlChannel({}, stdin=io.StringIO(), stdout=stdout)
+    assert not channel.emit('song_started', {'title': 'Song'})
+    assert stdout.getvalue() == ''
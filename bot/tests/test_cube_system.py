@@ -0,0 +1,85 @@
+import asyncio
+from types import SimpleNamespace
+
+import cube_system
+import music_bot
+from cube_system import CubeSystem
+from scheduler import Scheduler
+
+
+def test_concurrent_spends_never_overdraw(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(cube_system, 'SAVE_DELAY', 0.01)
+    balances = []
+    saves = []
+
+    async def spend():
+        scheduler = Scheduler()
+        cubes = CubeSystem(scheduler=scheduler)
+        cubes.on_balance_change = lambda room_id, username, balance: balances.append(balance)
+        save_data = cubes.save_data
+        cubes.save_data = lambda: (saves.append(True), save_data())
+        results = await asyncio.gather(*(cubes.spend_cubes('alice', 10, description='Song') for _ in range(12)))
+        await asyncio.sleep(0.1)
+        await scheduler.close()
+        return cubes, results
+
+    cubes, results = asyncio.run(spend())
+    assert results.count(True) == 5
+    assert min(balances) == 0
+    assert cubes.data['default']['users']['alice']['cubes'] == 0
+    assert cubes.data['default']['users']['alice']['total_spent'] == 50
+    assert len(saves) == 1  # Every change in the burst went out in one write
+    assert len((tmp_path / 'cube_transactions.jsonl').read_text().splitlines()) == 5
+
+
+class SlowHighrise:
+    """get_room_users waits forever, so on_start stays in its startup window"""
+
+    async def get_room_users(self):
+        await asyncio.Event().wait()
+
+    async def chat(self, text):
+        pass
+
+
+def test_failed_searches_are_refunded(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(music_bot, 'EVENT_LOG_DIR', str(tmp_path / 'events'))
+    monkeypatch.setattr(music_bot, 'AUDIO_CACHE_DIR', str(tmp_path / 'audio'))
+    bot = music_bot.HighriseMusicBot({})
+    bot.highrise = SlowHighrise()
+    bot.registered_users.add('alice')
+    balances = []
+    bot.cube_system.on_balance_change = lambda room_id, username, balance: balances.append(balance)
+    metadata = SimpleNamespace(user_id='bot', room_info=SimpleNamespace(id='room'))
+    alice = SimpleNamespace(id='user-1', username='alice')
+
+    def search(n):
+        async def run():
+            await asyncio.sleep(0.01)  # Every reservation is held while the searches overlap
+            if n % 3 == 0:
+                raise RuntimeError("search failed")
+            if n % 3 == 1:
+                return []
+            return [{'id': f"song-{n}", 'title': f"Song {n}", 'artist': 'Artist', 'platform': 'YouTube',
+                     'url': f"https://youtu.be/{n}", 'duration': 180}]
+        return run
+
+    async def request():
+        starting = asyncio.create_task(bot.on_start(metadata))
+        await asyncio.sleep(0)
+        bot.current_song = {'song': {'id': 'playing', 'title': 'Playing', 'artist': 'Artist'}}
+        await asyncio.gather(*(bot.request_song(alice, search(n), "Not found", f"query {n}") for n in range(9)),
+                             return_exceptions=True)
+        starting.cancel()
+        bot.prefetcher.close()
+        bot.event_log.close()
+        await bot.scheduler.close()
+
+    asyncio.run(request())
+    queued = len(bot.music_queue)
+    assert 0 < queued <= 3
+    assert min(balances) >= 0
+    assert bot.cube_system.data['default']['users']['alice']['cubes'] == 50 - queued * bot.song_cost
+    assert not any(bot.cube_system.data['default']['reservations']['alice'].values())
@@ -0,0 +1,58 @@
+import asyncio
+from types import SimpleNamespace
+
+import music_bot
+from event_log import EventLog, EventLogReader, decode_track
+from scheduler import Scheduler
+
+
+def test_carriage_returns_keep_strings_aligned(tmp_path):
+    async def write():
+        scheduler = Scheduler()
+        log = EventLog(scheduler, str(tmp_path))
+        log.join("carriage\rreturn")
+        log.play("listener", {'platform': 'YouTube', 'id': 'x', 'title': "Title\r\nwith breaks", 'artist': 'A'})
+        await log.flush()
+        log.close()
+        await scheduler.close()
+
+    asyncio.run(write())
+    reader = EventLogReader(str(tmp_path))
+    [chunk] = list(reader.scan())
+    strings = reader.strings
+    assert strings[chunk['user'][0]] == "carriage return"
+    assert strings[chunk['user'][1]] == "listener"
+    assert decode_track(strings[chunk['subject'][1]])['title'] == "Title  with breaks"
+    # A restarted writer resolves the same ids
+    assert EventLog(Scheduler(), str(tmp_path)).strings["listener"] == chunk['user'][1]
+
+
+class SlowHighrise:
+    """get_room_users waits until the test lets it return"""
+
+    def __init__(self):
+        self.release = asyncio.Event()
+
+    async def get_room_users(self):
+        await self.release.wait()
+        return SimpleNamespace(content=[])
+
+
+def test_events_during_startup_are_logged(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(music_bot, 'EVENT_LOG_DIR', str(tmp_path))
+    monkeypatch.setattr(music_bot, 'AUDIO_CACHE_DIR', str(tmp_path / 'audio'))
+    bot = music_bot.HighriseMusicBot({})
+    bot.highrise = SlowHighrise()
+    metadata = SimpleNamespace(user_id='bot', room_info=SimpleNamespace(id='room'))
+
+    async def start():
+        starting = asyncio.create_task(bot.on_start(metadata))
+        await asyncio.sleep(0)  # on_start is now waiting on get_room_users
+        await bot.on_user_leave(SimpleNamespace(id='user-1', username='early'))
+        starting.cancel()
+        bot.event_log.close()
+        await bot.scheduler.close()
+
+    asyncio.run(start())
+    assert EventLogReader(str(tmp_path / 'room')).count_by_kind() == {'leave': 1}
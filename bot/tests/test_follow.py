@@ -0,0 +1,75 @@
+import asyncio
+
+from highrise import AnchorPosition, Position, User
+
+import follow
+from follow import OFFSET, Follower
+from presence import PresenceIndex
+from scheduler import Scheduler
+
+ALICE = User(id='user-1', username='alice')
+
+
+def run_follower(test, monkeypatch):
+    """Run test(follower, presence) and return the positions walked to and the stop notices"""
+    monkeypatch.setattr(follow, 'MIN_WALK_INTERVAL', 0.05)
+    walks = []
+    stopped = []
+
+    async def walk(position):
+        walks.append((position.x, position.z))
+
+    async def on_stop(username):
+        stopped.append(username)
+
+    async def run():
+        scheduler = Scheduler(tick=0.01)
+        presence = PresenceIndex()
+        presence.join(ALICE, Position(0, 0, 0, 'FrontRight'))
+        follower = Follower(scheduler, presence, walk, on_stop)
+        await test(follower, presence)
+        await scheduler.close()
+
+    asyncio.run(run())
+    return walks, stopped
+
+
+def test_rapid_moves_are_coalesced(monkeypatch):
+    async def test(follower, presence):
+        follower.start('user-1', 'alice')
+        await asyncio.sleep(0.02)  # The first walk goes out at once
+        for x in range(2, 6):
+            presence.move(ALICE, Position(x, 0, 0, 'FrontRight'))
+        presence.move(ALICE, Position(5.2, 0, 0, 'FrontRight'))  # Only the newest position is walked to
+        await asyncio.sleep(0.12)
+
+    walks, stopped = run_follower(test, monkeypatch)
+    assert walks == [(OFFSET, OFFSET), (5.2 + OFFSET, OFFSET)]
+    assert stopped == []
+
+
+def test_small_steps_and_sitting_do_not_walk(monkeypatch):
+    async def test(follower, presence):
+        follower.start('user-1', 'alice')
+        await asyncio.sleep(0.02)
+        presence.move(ALICE, Position(0.5, 0, 0, 'FrontRight'))
+        presence.move(ALICE, AnchorPosition('chair', 0))
+        await asyncio.sleep(0.1)
+
+    walks, _ = run_follower(test, monkeypatch)
+    assert walks == [(OFFSET, OFFSET)]
+
+
+def test_following_stops_when_the_target_leaves(monkeypatch):
+    async def test(follower, presence):
+        follower.start('user-1', 'alice')
+        await asyncio.sleep(0.02)
+        presence.move(ALICE, Position(4, 0, 0, 'FrontRight'))  # Waiting on the walk interval
+        presence.leave(ALICE)
+        assert not follower.active
+        assert presence.watchers == {}
+        await asyncio.sleep(0.1)
+
+    walks, stopped = run_follower(test, monkeypatch)
+    assert walks == [(OFFSET, OFFSET)]  # The pending walk was cancelled
+    assert stopped == ['alice']
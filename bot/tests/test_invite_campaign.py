@@ -0,0 +1,86 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+from invite_campaign import InviteCampaign
+from scheduler import Scheduler
+
+CONVERSATIONS = [SimpleNamespace(id=f"c{n}", member_ids=[f"user-{n}"]) for n in range(1, 5)]
+
+
+async def list_conversations(last_id):
+    """Two conversations per page, like get_conversations paging by last_id"""
+    ids = [conversation.id for conversation in CONVERSATIONS]
+    start = ids.index(last_id) + 1 if last_id else 0
+    return SimpleNamespace(conversations=CONVERSATIONS[start:start + 2])
+
+
+def make_campaign(scheduler, send_invite, data_file=None):
+    async def report(text):
+        pass
+
+    return InviteCampaign(scheduler, list_conversations, send_invite,
+                          targets=lambda: {conversation.member_ids[0] for conversation in CONVERSATIONS},
+                          report=report, data_file=data_file)
+
+
+def test_stopped_campaign_resumes_without_inviting_twice(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    sent = []
+
+    async def run():
+        scheduler = Scheduler()
+        hold = asyncio.Event()
+
+        async def send_first(conversation_id, room_id):
+            if conversation_id in ('c3', 'c4'):
+                await hold.wait()  # Still in flight when the campaign is stopped
+            sent.append((conversation_id, room_id))
+
+        first = make_campaign(scheduler, send_first)
+        first.attach('room-a')
+        assert first.start('room-a')
+        while len(first.invited) < 2:
+            await asyncio.sleep(0.01)
+        assert await first.stop()
+
+        async def send_again(conversation_id, room_id):
+            sent.append((conversation_id, room_id))
+
+        # A restarted bot picks up the checkpoint and only invites the rest
+        second = make_campaign(scheduler, send_again)
+        second.attach('room-a')
+        assert second.resumable
+        assert second.start('room-a')
+        await second.task
+        await scheduler.close()
+        return second
+
+    second = asyncio.run(run())
+    assert sorted(sent) == [('c1', 'room-a'), ('c2', 'room-a'), ('c3', 'room-a'), ('c4', 'room-a')]
+    assert second.state['status'] == 'completed'
+    with open(tmp_path / 'invite_campaign_room-a.json') as f:
+        assert json.load(f)['invited'] == ['c1', 'c2', 'c3', 'c4']
+
+
+def test_checkpoint_from_another_room_is_not_resumed(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    checkpoint = tmp_path / 'shared.json'
+    checkpoint.write_text(json.dumps({'id': 'old', 'room_id': 'room-a', 'status': 'paused', 'started_at': None,
+                                      'finished_at': None, 'scanned': 2, 'failed': 0, 'invited': ['c1']}))
+    sent = []
+
+    async def send_invite(conversation_id, room_id):
+        sent.append((conversation_id, room_id))
+
+    async def run():
+        scheduler = Scheduler()
+        campaign = make_campaign(scheduler, send_invite, data_file=str(checkpoint))
+        campaign.attach('room-b')
+        assert not campaign.resumable
+        assert campaign.start('room-b')
+        await campaign.task
+        await scheduler.close()
+
+    asyncio.run(run())
+    assert sorted(sent) == [('c1', 'room-b'), ('c2', 'room-b'), ('c3', 'room-b'), ('c4', 'room-b')]
@@ -0,0 +1,111 @@
+import asyncio
+from types import SimpleNamespace
+
+import music_bot
+from music_platforms import MusicPlatforms
+from playlist_import import ADDED, QUEUE_FULL, PlaylistImporter
+
+
+def song(n):
+    return {'id': f"v{n}", 'title': f"Song {n}", 'artist': 'Artist', 'platform': 'YouTube',
+            'url': f"https://youtu.be/v{n}", 'duration': 180}
+
+
+def test_pages_stop_at_the_track_limit():
+    platforms = MusicPlatforms()
+    fetched = []
+    closed = []
+
+    async def youtube_pages(playlist_id):
+        try:
+            for start in range(0, 500, 50):
+                fetched.append(start)
+                yield [song(n) for n in range(start, start + 50)]
+        finally:
+            closed.append(playlist_id)
+
+    platforms._youtube_playlist_pages = youtube_pages
+
+    async def collect():
+        return [page async for page in platforms.playlist_pages('YouTube', 'list', limit=120)]
+
+    pages = asyncio.run(collect())
+    assert [len(page) for page in pages] == [50, 50, 20]
+    assert pages[-1][-1]['id'] == 'v119'
+    assert fetched == [0, 50, 100]  # No page is requested past the limit
+    assert closed == ['list']
+
+
+def test_import_stops_when_add_song_refuses_and_closes_the_pages():
+    reports = []
+    closed = []
+    added = []
+
+    async def report(text):
+        reports.append(text)
+
+    async def pages():
+        try:
+            yield [song(1), song(2)]
+            yield [song(3), song(4)]
+            yield [song(5)]
+        finally:
+            closed.append(True)
+
+    async def add_song(item):
+        if len(added) == 3:
+            return QUEUE_FULL
+        added.append(item['id'])
+        return ADDED
+
+    async def run():
+        importer = PlaylistImporter(report)
+        assert importer.start('alice', pages(), add_song)
+        assert not importer.start('alice', pages(), add_song)  # One import per user
+        await importer.imports['alice']
+        return importer
+
+    importer = asyncio.run(run())
+    assert added == ['v1', 'v2', 'v3']
+    assert closed == [True]
+    assert not importer.running('alice')
+    assert reports[-1] == "📥 alice's playlist import ended: the queue is full. 3 songs queued."
+
+
+class SlowHighrise:
+    """get_room_users waits forever, so on_start stays in its startup window"""
+
+    async def get_room_users(self):
+        await asyncio.Event().wait()
+
+    async def chat(self, text):
+        pass
+
+
+def test_songs_already_queued_are_skipped(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(music_bot, 'EVENT_LOG_DIR', str(tmp_path / 'events'))
+    monkeypatch.setattr(music_bot, 'AUDIO_CACHE_DIR', str(tmp_path / 'audio'))
+    bot = music_bot.HighriseMusicBot({})
+    bot.highrise = SlowHighrise()
+    bot.user_data['alice'] = {'role': 'vip'}  # Free requests, so cubes never end the import
+    metadata = SimpleNamespace(user_id='bot', room_info=SimpleNamespace(id='room'))
+    alice = SimpleNamespace(id='user-1', username='alice')
+
+    async def pages():
+        yield [song(1), song(2), song(1)]
+        yield [song(2), song(3)]
+
+    async def run():
+        starting = asyncio.create_task(bot.on_start(metadata))
+        await asyncio.sleep(0)
+        bot.current_song = {'song': song(0), 'likes': 0}
+        assert bot.playlists.start('alice', pages(), lambda item: bot.add_playlist_song(alice, item))
+        await bot.playlists.imports['alice']
+        starting.cancel()
+        bot.prefetcher.close()
+        bot.event_log.close()
+        await bot.scheduler.close()
+
+    asyncio.run(run())
+    assert [item['song']['id'] for item in bot.music_queue] == ['v1', 'v2', 'v3']
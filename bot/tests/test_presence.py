@@ -0,0 +1,55 @@
+from highrise import AnchorPosition, Position, User
+
+from presence import PresenceIndex
+
+ALICE = User(id='user-1', username='alice')
+BOB = User(id='user-2', username='bob')
+
+
+def test_users_are_found_by_id_or_username():
+    presence = PresenceIndex()
+    presence.seed([(ALICE, Position(1, 0, 1, 'FrontRight')), (BOB, AnchorPosition('chair', 0))])
+
+    assert len(presence) == 2
+    assert presence.is_online('alice') and presence.is_online('user-2')
+    assert presence.position_of('bob') == AnchorPosition('chair', 0)
+    presence.leave(BOB)
+    assert not presence.is_online('bob')
+    assert presence.online_usernames() == ['alice']
+
+    # A reseed replaces everything
+    presence.seed([(BOB, Position(0, 0, 0, 'FrontLeft'))])
+    assert presence.online_usernames() == ['bob']
+
+
+def test_renamed_user_is_indexed_under_the_new_name():
+    presence = PresenceIndex()
+    presence.join(ALICE, Position(0, 0, 0, 'FrontRight'))
+    presence.join(User(id='user-1', username='alicia'), Position(0, 0, 0, 'FrontRight'))
+    assert presence.user_id_of('alicia') == 'user-1'
+    assert presence.user_id_of('alice') is None
+    assert len(presence) == 1
+
+
+def test_watchers_see_moves_and_leaves():
+    presence = PresenceIndex()
+    seen = []
+
+    def broken(event, position):
+        raise RuntimeError("watcher failed")
+
+    def record(event, position):
+        seen.append((event, position))
+
+    presence.watch('user-1', broken)
+    presence.watch('user-1', record)
+    # A move before the join adds the user
+    presence.move(ALICE, Position(2, 0, 3, 'BackLeft'))
+    assert presence.is_online('alice')
+    presence.move(BOB, Position(5, 0, 5, 'BackLeft'))  # Not watched
+    presence.leave(ALICE)
+    assert seen == [('move', Position(2, 0, 3, 'BackLeft')), ('leave', None)]
+
+    presence.unwatch('user-1', broken)
+    presence.unwatch('user-1', record)
+    assert presence.watchers == {}
@@ -0,0 +1,62 @@
+import asyncio
+import inspect
+
+from highrise import Highrise
+
+from music_bot import HighriseMusicBot
+
+
+class FakeHighrise:
+    """Records send_message calls after checking them against the SDK's signature"""
+
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, *args, **kwargs):
+        bound = inspect.signature(Highrise.send_message).bind(self, *args, **kwargs)
+        bound.apply_defaults()
+        self.sent.append(dict(bound.arguments))
+
+
+def make_bot():
+    bot = HighriseMusicBot({})
+    bot.highrise = FakeHighrise()
+    return bot
+
+
+def test_room_invite_uses_sdk_signature():
+    bot = make_bot()
+    asyncio.run(bot.send_room_invite('conversation-1', 'room-1'))
+
+    [sent] = bot.highrise.sent
+    assert sent['conversation_id'] == 'conversation-1'
+    assert sent['message_type'] == 'invite'
+    assert sent['room_id'] == 'room-1'
+    assert sent['content']
+
+
+def test_buyvisa_confirmation_uses_sdk_signature():
+    bot = make_bot()
+    message = type('Message', (), {'content': '-buyvisa', 'sender_id': 'user-1'})()
+
+    async def receive():
+        bot.user_directory.remember('user-1', 'alice')
+        await bot.handle_private_message('conversation-1', message)
+        await bot.scheduler.close()
+
+    asyncio.run(receive())
+
+    assert 'alice' in bot.registered_users
+    [sent] = bot.highrise.sent
+    assert sent['conversation_id'] == 'conversation-1'
+    assert sent['message_type'] == 'text'
+    assert 'Registration successful' in sent['content']
+
+
+def test_unknown_private_message_gets_help_reply():
+    bot = make_bot()
+    message = type('Message', (), {'content': 'hello', 'sender_id': 'user-2'})()
+    asyncio.run(bot.handle_private_message('conversation-2', message))
+
+    [sent] = bot.highrise.sent
+    assert "-buyvisa" in sent['content']
@@ -0,0 +1,77 @@
+import json
+import os
+from datetime import datetime
+
+import numpy as np
+
+import recommendations
+from recommendations import RecommendationEngine, track_key, write_snapshot
+
+
+def song(n):
+    return {'id': str(n), 'title': f"Song {n}", 'artist': 'Artist', 'platform': 'YouTube', 'url': f"u{n}"}
+
+
+def make_engine(tmp_path):
+    return RecommendationEngine(data_file=str(tmp_path / 'history.json'), snapshot_dir=str(tmp_path / 'models'))
+
+
+def publish(tmp_path, engine, created_at):
+    """Publish a snapshot of the engine's tracks as if it had been trained at created_at"""
+    root = str(tmp_path / 'models')
+    keys = list(engine.tracks)
+    version = write_snapshot(root, keys, [engine.tracks[key] for key in keys],
+                             np.full((len(keys), 2), -1, dtype=np.int32), np.zeros((len(keys), 2), dtype=np.float32),
+                             np.arange(len(keys), dtype=np.int32))
+    manifest_file = os.path.join(root, f"v{version:06d}", 'manifest.json')
+    with open(manifest_file) as f:
+        manifest = json.load(f)
+    manifest['created_at'] = datetime.fromtimestamp(created_at).isoformat()
+    with open(manifest_file, 'w') as f:
+        json.dump(manifest, f)
+    engine.last_snapshot_check = float('-inf')
+    assert engine.maybe_reload_snapshot()
+
+
+def test_snapshot_swap_drops_overlay_it_covers(tmp_path, monkeypatch):
+    engine = make_engine(tmp_path)
+    clock = [1000.0]
+    monkeypatch.setattr(recommendations.time, 'time', lambda: clock[0])
+    for n in range(3):
+        engine.record_like('alice', song(n))
+    clock[0] = 2000.0
+    engine.record_like('alice', song(3))  # Three bumps after the snapshot was trained
+
+    publish(tmp_path, engine, created_at=1500.0)
+
+    newest = track_key(song(3))
+    assert len(engine.overlay_log) == 3
+    assert set(engine.overlay[newest]) == {track_key(song(n)) for n in range(3)}
+    assert all(set(weights) == {newest} for seed, weights in engine.overlay.items() if seed != newest)
+
+    publish(tmp_path, engine, created_at=2500.0)
+    assert engine.overlay == {}
+
+
+def test_overlay_is_bounded(tmp_path, monkeypatch):
+    monkeypatch.setattr(recommendations, 'OVERLAY_MAX_PAIRS', 10)
+    engine = make_engine(tmp_path)
+    for n in range(50):
+        engine.record_like('alice', song(n))
+    assert len(engine.overlay_log) == 10
+    assert sum(len(weights) for weights in engine.overlay.values()) == 20
+
+
+def test_history_is_kept_per_room(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    for room, username, n in (('room-a', 'alice', 1), ('room-b', 'bob', 2)):
+        engine = RecommendationEngine(snapshot_dir=str(tmp_path / 'models'))
+        engine.attach(room)
+        engine.record_play(username, song(n))
+        engine.save_data()
+
+    reloaded = RecommendationEngine(snapshot_dir=str(tmp_path / 'models'))
+    reloaded.attach('room-a')
+    assert list(reloaded.interactions) == ['alice']
+    assert sorted(name for name in os.listdir(tmp_path) if name.endswith('.json')) == \
+        ['recommendation_data_room-a.json', 'recommendation_data_room-b.json']
@@ -0,0 +1,55 @@
+from repeat_filter import RepeatFilter
+
+
+def test_keys_move_from_the_exact_window_to_history_and_expire():
+    repeats = RepeatFilter()
+    repeats.configure(recent_minutes=30, history_hours=2)
+    repeats.record('song', now=0)
+
+    assert repeats.recent_age('song', now=600) == 600
+    assert repeats.wait_time('song', now=600) == 2 * 3600 - 600
+    # Past the exact window only the Bloom filter remembers it
+    assert repeats.recent_age('song', now=30 * 60) is None
+    assert repeats.in_history('song', now=30 * 60)
+    assert repeats.wait_time('song', now=30 * 60) == 2 * 3600
+    # Past the history window it is allowed again and its counters are released
+    assert repeats.wait_time('song', now=2 * 3600) is None
+    stats = repeats.stats()
+    assert (stats['recent'], stats['history'], stats['counters_set']) == (0, 0, 0)
+
+
+def test_expired_keys_are_decremented_out_of_the_bloom_filter():
+    repeats = RepeatFilter()
+    repeats.configure(recent_minutes=0, history_hours=1)
+    repeats.record('first', now=0)
+    repeats.record('second', now=1800)
+    set_by_both = repeats.stats()['counters_set']
+
+    assert repeats.in_history('first', now=3599)
+    assert not repeats.in_history('first', now=3600)
+    assert repeats.in_history('second', now=3600)
+    assert repeats.stats()['counters_set'] == set_by_both // 2
+    assert not repeats.recent  # A zero exact window records nothing there
+
+
+def test_colliding_hashes_count_once_per_key():
+    # With one counter every hash lands on it; a key must still add and remove exactly one
+    repeats = RepeatFilter(counters=1, hashes=4)
+    repeats.record('a', now=0)
+    repeats.record('b', now=1)
+    assert repeats.counts[0] == 2
+    repeats.in_history('a', now=2 * 3600)
+    assert repeats.counts[0] == 1
+    assert not repeats.in_history('b', now=2 * 3600 + 1)
+    assert repeats.counts[0] == 0
+
+
+def test_full_history_forgets_the_oldest_play():
+    repeats = RepeatFilter(history_capacity=2)
+    repeats.configure(recent_minutes=0, history_hours=2)
+    for n, key in enumerate(['a', 'b', 'c']):
+        repeats.record(key, now=n)
+
+    assert repeats.stats()['history'] == 2
+    assert not repeats.in_history('a', now=3)
+    assert repeats.in_history('b', now=3) and repeats.in_history('c', now=3)
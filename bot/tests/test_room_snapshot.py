@@ -0,0 +1,59 @@
+import asyncio
+import json
+import time
+import zlib
+from types import SimpleNamespace
+
+import music_bot
+from room_snapshot import encode_snapshot
+
+
+class SlowHighrise:
+    """get_room_users waits forever, so on_start stays in its startup window"""
+
+    async def get_room_users(self):
+        await asyncio.Event().wait()
+
+    async def chat(self, text):
+        pass
+
+
+def song(song_id):
+    return {'id': song_id, 'title': f"Song {song_id}", 'artist': 'Artist', 'platform': 'YouTube', 'duration': 180}
+
+
+def write_snapshot(path, sections):
+    compressed = {name: zlib.compress(json.dumps(value).encode('utf-8')) for name, value in sections.items()}
+    with open(path, 'wb') as f:
+        f.write(encode_snapshot(compressed, time.time()))
+
+
+def test_song_requested_during_startup_survives_restore(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(music_bot, 'EVENT_LOG_DIR', str(tmp_path / 'events'))
+    monkeypatch.setattr(music_bot, 'AUDIO_CACHE_DIR', str(tmp_path / 'audio'))
+    write_snapshot(tmp_path / 'room_state_room.bin', {
+        'queue': [{'song': song('restored'), 'requested_by': 'before', 'likes': 0, 'cubes_spent': 10}],
+        'current': {'song': song('playing'), 'started_at': time.time() - 30},
+    })
+    bot = music_bot.HighriseMusicBot({})
+    bot.highrise = SlowHighrise()
+
+    async def commit_reservation(reservation, description):
+        pass
+
+    bot.cube_system.commit_reservation = commit_reservation
+    metadata = SimpleNamespace(user_id='bot', room_info=SimpleNamespace(id='room'))
+
+    async def request():
+        starting = asyncio.create_task(bot.on_start(metadata))
+        await asyncio.sleep(0)  # on_start is now waiting on get_room_users
+        await bot.enqueue_song(SimpleNamespace(username='early'), song('early'), {'amount': 10}, announce=False)
+        starting.cancel()
+        bot.prefetcher.close()
+        bot.event_log.close()
+        await bot.scheduler.close()
+
+    asyncio.run(request())
+    assert [item['song']['id'] for item in bot.music_queue] == ['restored', 'early']
+    assert bot.current_song['song']['id'] == 'playing'
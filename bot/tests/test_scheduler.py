@@ -0,0 +1,120 @@
+import asyncio
+
+import pytest
+
+from scheduler import Scheduler
+
+TICK = 0.01
+
+
+def run(test):
+    """Run test(scheduler) on a fresh loop and close the scheduler afterwards"""
+    async def main():
+        scheduler = Scheduler(tick=TICK)
+        try:
+            return await test(scheduler)
+        finally:
+            await scheduler.close()
+
+    return asyncio.run(main())
+
+
+def test_jobs_fire_in_deadline_order():
+    async def test(scheduler):
+        fired = []
+        scheduler.call_later(0.06, fired.append, 'c')
+        scheduler.call_later(0.02, fired.append, 'a')
+        scheduler.call_later(0.04, fired.append, 'b')
+        await asyncio.sleep(0.12)
+        return fired
+
+    assert run(test) == ['a', 'b', 'c']
+
+
+def test_earlier_job_wakes_a_sleeping_driver():
+    async def test(scheduler):
+        fired = []
+        scheduler.call_later(60, fired.append, 'late')
+        await asyncio.sleep(TICK)  # The driver is now waiting a minute
+        scheduler.call_later(0.02, fired.append, 'soon')
+        await asyncio.sleep(0.1)
+        return fired
+
+    assert run(test) == ['soon']
+
+
+def test_cancelled_job_does_not_fire():
+    async def test(scheduler):
+        fired = []
+        handle = scheduler.call_later(0.02, fired.append, 'cancelled', name='cancelled')
+        scheduler.call_later(0.04, fired.append, 'kept', name='kept')
+        handle.cancel()
+        handle.cancel()  # Idempotent
+        names = [job['name'] for job in scheduler.pending()]
+        await asyncio.sleep(0.1)
+        return fired, names
+
+    fired, names = run(test)
+    assert fired == ['kept']
+    assert names == ['kept']
+
+
+def test_recurring_job_rearms_until_cancelled():
+    async def test(scheduler):
+        fired = []
+        handle = scheduler.call_every(0.02, fired.append, 'tick')
+        await asyncio.sleep(0.15)
+        handle.cancel()
+        count = len(fired)
+        await asyncio.sleep(0.06)
+        return count, len(fired), scheduler.pending()
+
+    count, later, pending = run(test)
+    assert 5 <= count <= 8
+    assert later == count
+    assert pending == []
+
+
+def test_recurring_job_needs_a_positive_interval():
+    async def test(scheduler):
+        with pytest.raises(ValueError):
+            scheduler.call_every(0, print)
+
+    run(test)
+
+
+def test_failing_jobs_do_not_stop_the_tick_loop():
+    async def test(scheduler):
+        fired = []
+
+        def broken():
+            fired.append('broken')
+            raise RuntimeError("sync failure")
+
+        async def broken_async():
+            raise RuntimeError("async failure")
+
+        scheduler.call_every(0.02, broken)
+        scheduler.call_later(0.01, broken_async)
+        scheduler.call_later(0.05, fired.append, 'after')
+        await asyncio.sleep(0.1)
+        return fired
+
+    fired = run(test)
+    assert 'after' in fired
+    assert fired.count('broken') >= 3  # The failing recurring job keeps its schedule
+
+
+def test_cancelled_entries_are_compacted():
+    async def test(scheduler):
+        handles = [scheduler.call_later(60, print) for _ in range(100)]
+        for handle in handles:
+            handle.cancel()
+        fired = []
+        scheduler.call_later(0.01, fired.append, 'due')
+        await asyncio.sleep(0.05)
+        return fired, len(scheduler._heap)
+
+    fired, heap_size = run(test)
+    assert fired == ['due']
+    assert heap_size == 0
@@ -0,0 +1,101 @@
+import asyncio
+import io
+import json
+import os
+import re
+
+import state_stream
+from control_channel import ControlChannel
+from scheduler import Scheduler
+from state_stream import StateStream
+
+# server/services/bot-manager.ts relays lines starting with this without parsing them
+STATE_EVENT_PREFIX = '{"type": "event", "event": "state.'
+BOT_MANAGER = os.path.join(os.path.dirname(__file__), '..', '..', 'server', 'services', 'bot-manager.ts')
+
+
+def item(title, likes=0):
+    return {'song': {'title': title, 'artist': 'Artist', 'platform': 'YouTube', 'url': f"u-{title}",
+                     'duration': 180, 'id': title}, 'requested_by': 'alice', 'likes': likes, 'cubes_spent': 10}
+
+
+def record(test):
+    """Run test(stream) against a StateStream whose events are collected"""
+    events = []
+
+    async def run():
+        scheduler = Scheduler(tick=0.01)
+        stream = StateStream(scheduler, emit=lambda event, data: events.append((event, data)),
+                             snapshot=lambda: {'queue': []})
+        await test(stream)
+        await scheduler.close()
+
+    asyncio.run(run())
+    return events
+
+
+def test_changes_in_one_window_go_out_as_one_delta(monkeypatch):
+    monkeypatch.setattr(state_stream, 'FLUSH_DELAY', 0.02)
+
+    async def test(stream):
+        stream.queue_add(0, item('one'))
+        stream.likes(2)
+        stream.balance('alice', 40)
+        await asyncio.sleep(0.06)
+        stream.queue_remove(0)
+        stream.now_playing(None)
+        await asyncio.sleep(0.06)
+
+    events = record(test)
+    assert events == [
+        ('state.delta', {'first': 1, 'seq': 3, 'ops': [
+            ['queue.add', {'index': 0, 'item': {'title': 'one', 'artist': 'Artist', 'platform': 'YouTube',
+                                                'url': 'u-one', 'duration': 180, 'replay_gain': None,
+                                                'requested_by': 'alice', 'likes': 0}}],
+            ['likes', {'likes': 2}],
+            ['balance', {'username': 'alice', 'cubes': 40}],
+        ]}),
+        ('state.delta', {'first': 4, 'seq': 5, 'ops': [['queue.remove', {'index': 0}], ['now_playing', None]]}),
+    ]
+
+
+def test_snapshot_flushes_pending_deltas_first(monkeypatch):
+    monkeypatch.setattr(state_stream, 'FLUSH_DELAY', 0.02)
+
+    async def test(stream):
+        stream.queue_clear()
+        stream.likes(1)
+        stream.send_snapshot()
+        await asyncio.sleep(0.06)  # The cancelled flush timer sends nothing more
+
+    events = record(test)
+    assert events == [
+        ('state.delta', {'first': 1, 'seq': 2, 'ops': [['queue.clear', None], ['likes', {'likes': 1}]]}),
+        ('state.snapshot', {'seq': 2, 'state': {'queue': []}}),
+    ]
+
+
+def test_state_events_match_the_manager_fast_path():
+    with open(BOT_MANAGER) as f:
+        assert re.search(r"const STATE_EVENT_PREFIX = '(.*)';", f.read()).group(1) == STATE_EVENT_PREFIX
+
+    async def run():
+        read_fd, write_fd = os.pipe()
+        stdout = io.StringIO()
+        channel = ControlChannel({}, stdin=os.fdopen(read_fd, 'rb'), stdout=stdout)
+        assert channel.start()
+        scheduler = Scheduler()
+        stream = StateStream(scheduler, emit=channel.emit, snapshot=lambda: {'queue': []})
+        stream.likes(3)
+        stream.send_snapshot()
+        os.close(write_fd)
+        await channel.reader_task
+        await scheduler.close()
+        return stdout.getvalue().splitlines()[1:]  # After the ready event
+
+    lines = asyncio.run(run())
+    assert [line[:len(STATE_EVENT_PREFIX)] for line in lines] == [STATE_EVENT_PREFIX] * 2
+    # The manager reads the event name up to the next quote, exactly as bot-manager.ts does
+    names = ['state.' + line[len(STATE_EVENT_PREFIX):line.index('"', len(STATE_EVENT_PREFIX))] for line in lines]
+    assert names == ['state.delta', 'state.snapshot']
+    assert [json.loads(line)['event'] for line in lines] == names
@@ -0,0 +1,18 @@
+from track_ranking import TrackRanker
+
+
+def test_same_title_by_different_artists_is_kept():
+    ranked = TrackRanker().rank("hello", [
+        {'title': 'Hello', 'artist': 'Adele', 'platform': 'YouTube'},
+        {'title': 'Hello', 'artist': 'Lionel Richie', 'platform': 'Spotify'},
+    ])
+    assert [song['artist'] for song in ranked] == ['Adele', 'Lionel Richie']
+
+
+def test_cross_platform_duplicates_are_dropped():
+    ranked = TrackRanker().rank("blinding lights", [
+        {'title': 'Blinding Lights', 'artist': 'The Weeknd', 'platform': 'Spotify'},
+        {'title': 'The Weeknd - Blinding Lights (Official Video)', 'artist': 'TheWeekndVEVO', 'platform': 'YouTube'},
+        {'title': 'Blinding Lights', 'artist': 'The Weeknd', 'platform': 'SoundCloud'},
+    ])
+    assert [song['platform'] for song in ranked] == ['Spotify']
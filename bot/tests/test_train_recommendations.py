@@ -0,0 +1,95 @@
+import asyncio
+import heapq
+import sqlite3
+
+from event_log import EventLog
+from recommendations import PLAY_WEIGHT, load_snapshot, track_key
+from scheduler import Scheduler
+from train_recommendations import event_log_rows, fit, train
+
+
+def song(n):
+    return {'platform': 'YouTube', 'url': f"u{n}", 'title': f"Song {n}", 'artist': 'Artist'}
+
+
+def write_room(path, events):
+    async def write():
+        scheduler = Scheduler()
+        log = EventLog(scheduler, str(path))
+        for event in events:
+            event(log)
+        await log.flush()
+        log.close()
+        await scheduler.close()
+
+    asyncio.run(write())
+
+
+def test_rows_are_ordered_by_user_and_capped(tmp_path):
+    write_room(tmp_path, [
+        lambda log: log.play('zoe', song(1)),
+        lambda log: log.play('adam', song(1)),
+        lambda log: log.play('adam', song(2)),
+        lambda log: log.like('adam', song(2), 1),
+        lambda log: log.spend('adam', song(3), 10),
+        lambda log: log.join('adam'),
+        lambda log: log.play('zoe', song(1)),
+    ])
+
+    rows = list(event_log_rows(str(tmp_path), max_items_per_user=2))
+    assert [user for user, _, _ in rows] == ['adam', 'adam', 'zoe']
+    # adam's weakest track (one play) is dropped; zoe's two plays are summed
+    assert [track_key(track) for _, track, _ in rows] == [track_key(song(2)), track_key(song(3)), track_key(song(1))]
+    assert rows[2][2] == 2 * PLAY_WEIGHT
+
+
+def test_user_in_two_rooms_is_fitted_once(tmp_path):
+    write_room(tmp_path / 'a', [lambda log: log.play('adam', song(1)), lambda log: log.play('bea', song(2))])
+    write_room(tmp_path / 'b', [lambda log: log.play('adam', song(2))])
+
+    streams = [event_log_rows(str(tmp_path / room)) for room in ('a', 'b')]
+    model = fit(heapq.merge(*streams, key=lambda row: row[0]))
+    assert model.users == 2
+    first, second = model.index[track_key(song(1))], model.index[track_key(song(2))]
+    assert second in model.counters[first]
+
+
+def build_database(path):
+    conn = sqlite3.connect(str(path))
+    conn.executescript("""
+        CREATE TABLE music_queue (id INTEGER PRIMARY KEY, user_id INTEGER, platform TEXT, platform_url TEXT,
+                                  song_title TEXT, song_artist TEXT);
+        CREATE TABLE song_likes (id INTEGER PRIMARY KEY, user_id INTEGER, queue_item_id INTEGER);
+        CREATE TABLE cube_transactions (id INTEGER PRIMARY KEY, user_id INTEGER, type TEXT, amount INTEGER,
+                                        description TEXT);
+    """)
+    plays = [(1, 1), (1, 2), (2, 1), (2, 2), (3, 3), (4, 3), (4, 4), (5, 1)]
+    for queue_id, (user_id, n) in enumerate(plays, start=1):
+        conn.execute("INSERT INTO music_queue VALUES (?, ?, 'YouTube', ?, ?, 'Artist')",
+                     (queue_id, user_id, f"u{n}", f"Song {n}"))
+    conn.execute("INSERT INTO song_likes (user_id, queue_item_id) VALUES (1, 2)")
+    conn.execute("INSERT INTO cube_transactions (user_id, type, amount, description) "
+                 "VALUES (3, 'spend', -10, 'Song request: Song 3')")
+    conn.commit()
+    return conn
+
+
+def test_sqlite_training_publishes_cooccurrence_neighbors(tmp_path):
+    conn = build_database(tmp_path / 'history.sqlite')
+    version = train(conn, str(tmp_path / 'models'), chunk_size=2)  # Several fetches per stream
+    conn.close()
+
+    snapshot = load_snapshot(str(tmp_path / 'models'))
+    assert snapshot['version'] == version == 1
+    catalog = snapshot['catalog']
+
+    def neighbors_of(n):
+        row = catalog.index_of(track_key(song(n)))
+        return [catalog.key_at(int(other)) for other in snapshot['neighbors'][row] if other >= 0]
+
+    assert neighbors_of(1) == [track_key(song(2))]
+    assert neighbors_of(3) == [track_key(song(4))]
+    assert track_key(song(3)) not in neighbors_of(2)
+    # Plays weigh 1, the like on song 2 adds 3 and the 10-cube request for song 3 adds 2
+    popular = [catalog.key_at(int(row)) for row in snapshot['popular']]
+    assert popular == [track_key(song(n)) for n in (2, 3, 1, 4)]
@@ -0,0 +1,104 @@
+import asyncio
+from types import SimpleNamespace
+
+import music_bot
+from scheduler import Scheduler
+from vote_skip import VoteSkip
+
+
+def run_votes(test, present):
+    """Run test(votes, room) against a VoteSkip over a room of `present` people; returns the skips made"""
+    room = SimpleNamespace(present=present, current={'song': {'id': 'playing'}})
+    skipped = []
+
+    async def skip():
+        skipped.append(room.current)
+        room.current = None
+
+    async def run():
+        scheduler = Scheduler(tick=0.01)
+        votes = VoteSkip(scheduler, present=lambda: room.present, current=lambda: room.current, skip=skip)
+        await test(votes, room)
+        await asyncio.sleep(0.03)
+        await scheduler.close()
+
+    asyncio.run(run())
+    return skipped
+
+
+def test_listeners_leaving_lower_the_bar():
+    async def test(votes, room):
+        assert votes.needed() == 3
+        assert votes.vote('a') is False
+        assert votes.vote('a') is None
+        assert votes.vote('b') is False
+        # Two people who did not vote leave: 2 votes out of the 3 left is a majority
+        room.present = 4
+        votes.leave('x')
+        assert votes.skipping is None
+        room.present = 3
+        votes.leave('y')
+        assert votes.skipping is room.current
+
+    assert len(run_votes(test, present=5)) == 1
+
+
+def test_voter_leaving_takes_their_vote():
+    async def test(votes, room):
+        votes.vote('a')
+        votes.vote('b')
+        room.present = 3
+        votes.leave('a')
+        assert votes.voters == {'b'}
+        assert votes.skipping is None
+
+    assert run_votes(test, present=4) == []
+
+
+def test_song_is_skipped_once():
+    async def test(votes, room):
+        assert votes.skip_now()
+        assert not votes.skip_now()
+        assert votes.vote('a') is True  # Counts toward a skip already on its way
+
+    assert len(run_votes(test, present=1)) == 1
+
+
+def test_votes_reset_with_the_song():
+    async def test(votes, room):
+        votes.vote('a')
+        room.current = {'song': {'id': 'next'}}
+        assert votes.vote('b') is False
+        assert votes.voters == {'b'}
+
+    assert run_votes(test, present=4) == []
+
+
+def test_vip_is_told_when_a_skip_is_pending(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(music_bot, 'EVENT_LOG_DIR', str(tmp_path / 'events'))
+    monkeypatch.setattr(music_bot, 'AUDIO_CACHE_DIR', str(tmp_path / 'audio'))
+    bot = music_bot.HighriseMusicBot({})
+    messages = []
+
+    async def chat(text):
+        messages.append(text)
+
+    async def skip():
+        pass
+
+    bot.highrise = SimpleNamespace(chat=chat)
+    bot.vote_skip.skip = skip
+    bot.user_data['boss'] = {'role': 'vip'}
+    bot.current_song = {'song': {'id': 'playing', 'title': 'Playing', 'artist': 'Artist'}}
+    boss = SimpleNamespace(id='user-1', username='boss')
+
+    async def run():
+        await bot.handle_skip_command(boss, '')
+        await bot.handle_skip_command(boss, '')
+        await bot.scheduler.close()
+
+    asyncio.run(run())
+    assert len(messages) == 2
+    assert 'skipped' in messages[0]
+    assert 'already pending' in messages[1]
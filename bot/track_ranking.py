@@ -0,0 +1,150 @@
+import re
+import unicodedata
+from typing import Dict, List, Any, Optional, Tuple
+
+# Bracketed or dashed suffixes that describe the upload rather than the song
+NOISE_TERMS = (
+    'official music video', 'official video', 'official audio', 'official lyric video',
+    'official visualizer', 'lyric video', 'lyrics video', 'lyrics', 'lyric', 'audio',
+    'music video', 'video', 'visualizer', 'hd', 'hq', '4k', 'remastered', 'remaster',
+    'explicit', 'clean', 'radio edit', 'extended', 'full song', 'mv', 'm/v'
+)
+
+_BRACKETED = re.compile(r'[\(\[\{]([^\)\]\}]*)[\)\]\}]')
+_FEAT = re.compile(r'\b(?:featuring|feat\.?|ft\.?)\s+', re.IGNORECASE)
+_SEPARATOR = re.compile(r'\s+[-|/]\s+')
+_FEAT_TAIL = re.compile(r'\bfeat\b.*$')
+_NON_WORD = re.compile(r'[^\w\s]+')
+_SPACES = re.compile(r'\s+')
+_NOISE = re.compile(
+    r'\b(?:' + '|'.join(re.escape(term) for term in sorted(NOISE_TERMS, key=len, reverse=True)) + r')\b'
+)
+
+PLATFORM_BONUS = 0.15
+DUPLICATE_THRESHOLD = 0.9
+
+
+def strip_diacritics(text: str) -> str:
+    """Fold accented characters to their ASCII base (Beyoncé -> Beyonce)"""
+    decomposed = unicodedata.normalize('NFKD', text)
+    return ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def _is_noise(segment: str) -> bool:
+    """True if a title segment consists only of upload descriptors"""
+    return not _NOISE.sub('', _NON_WORD.sub(' ', segment)).strip()
+
+
+def normalize_title(text: str) -> str:
+    """Normalize a title or query for comparison"""
+    if not text:
+        return ''
+
+    text = strip_diacritics(text).lower()
+
+    # Drop bracketed segments that only describe the upload, keep the rest
+    def _clean_bracket(match: re.Match) -> str:
+        inner = match.group(1)
+        return ' ' if _is_noise(inner) else f' {inner} '
+
+    text = _BRACKETED.sub(_clean_bracket, text)
+
+    # Same for trailing "- Official Audio" / "| HD" style segments
+    segments = _SEPARATOR.split(text)
+    while len(segments) > 1 and _is_noise(segments[-1]):
+        segments.pop()
+    text = ' '.join(segments)
+
+    text = _FEAT.sub('feat ', text)
+    text = _NON_WORD.sub(' ', text)
+    return _SPACES.sub(' ', text).strip()
+
+
+def core_title(text: str) -> str:
+    """Normalized title with featured artists removed, used as a dedupe key"""
+    return _FEAT_TAIL.sub('', normalize_title(text)).strip()
+
+
+def _bigrams(text: str) -> Dict[str, int]:
+    """Character bigram counts of a normalized string"""
+    counts: Dict[str, int] = {}
+    padded = f' {text} '
+    for i in range(len(padded) - 1):
+        gram = padded[i:i + 2]
+        counts[gram] = counts.get(gram, 0) + 1
+    return counts
+
+
+def similarity(a: str, b: str) -> float:
+    """Sorensen-Dice coefficient over character bigrams of two normalized strings"""
+    if not a or not b:
+        return 0.0
+    if a == b:
+        return 1.0
+
+    grams_a = _bigrams(a)
+    grams_b = _bigrams(b)
+    overlap = sum(min(count, grams_b.get(gram, 0)) for gram, count in grams_a.items())
+    total = sum(grams_a.values()) + sum(grams_b.values())
+    return 2.0 * overlap / total
+
+
+class TrackRanker:
+    def __init__(self, platform_preference: str = 'all'):
+        self.platform_preference = (platform_preference or 'all').lower()
+
+    def score(self, query: str, song: Dict[str, Any], normalized_query: Optional[str] = None) -> float:
+        """Score how well a search result matches the query"""
+        query_norm = normalized_query if normalized_query is not None else normalize_title(query)
+        title = normalize_title(song.get('title', ''))
+        artist = normalize_title(song.get('artist', ''))
+
+        # Users type "song", "artist song" or "song artist"; YouTube titles often embed the artist
+        best = max(
+            similarity(query_norm, title),
+            similarity(query_norm, f"{artist} {title}".strip()),
+            similarity(query_norm, f"{title} {artist}".strip())
+        )
+
+        if self._is_preferred(song):
+            best += PLATFORM_BONUS
+        return best
+
+    def rank(self, query: str, candidates: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Order candidates by relevance and drop cross-platform duplicates"""
+        query_norm = normalize_title(query)
+        scored: List[Tuple[float, int, Dict[str, Any]]] = [
+            (self.score(query, song, query_norm), index, song)
+            for index, song in enumerate(candidates)
+        ]
+        # Stable on ties: earlier provider results win
+        scored.sort(key=lambda entry: (-entry[0], entry[1]))
+
+        ranked: List[Dict[str, Any]] = []
+        seen: List[str] = []
+        for _, _, song in scored:
+            keys = self._dedupe_keys(song)
+            if any(similarity(key, other) >= DUPLICATE_THRESHOLD for key in keys for other in seen):
+                continue
+            seen.extend(keys)
+            ranked.append(song)
+
+        return ranked
+
+    def _dedupe_keys(self, song: Dict[str, Any]) -> List[str]:
+        """Comparable artist + title forms of a result; a bare title would merge different artists' songs"""
+        raw_title = song.get('title', '')
+        title = core_title(raw_title)
+        if not title:
+            return []
+        artist = normalize_title(song.get('artist', ''))
+        keys = [f"{artist} {title}"] if artist else [title]
+        # "Artist - Song" uploads already carry the artist, usually under a channel name that differs from it
+        if _SEPARATOR.search(raw_title) and title not in keys:
+            keys.append(title)
+        return keys
+
+    def _is_preferred(self, song: Dict[str, Any]) -> bool:
+        if self.platform_preference == 'all':
+            return False
+        return song.get('platform', '').lower() == self.platform_preference
@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+
+"""
+Offline training pipeline for the -recommend neighbor table.
+
+Streams musicQueue, songLikes and cubeTransactions history in chunks, fits an
+item-item co-occurrence model with bounded memory and publishes a versioned,
+memory-mappable snapshot that running bots hot-swap on their next check.
+
+    python bot/train_recommendations.py --db data/highrise.sqlite
+    python bot/train_recommendations.py --database-url $DATABASE_URL
+    python bot/train_recommendations.py --event-log event_log
+"""
+
+import argparse
+import heapq
+import logging
+import math
+import os
+import sqlite3
+import sys
+import time
+from itertools import groupby
+from typing import Dict, List, Any, Iterator, Tuple
+
+import numpy as np
+
+from event_log import EventLogReader, PLAY, LIKE, SPEND, decode_track
+from recommendations import (
+    PLAY_WEIGHT, LIKE_WEIGHT, CUBE_WEIGHT, TOP_K, POPULAR_SIZE, SNAPSHOT_DIR,
+    track_key, write_snapshot
+)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 5000
+MAX_ITEMS_PER_USER = 50  # strongest items per user that contribute pairs
+COUNTERS_PER_ITEM = TOP_K * 4  # co-occurrence candidates tracked per item
+
+# Each stream yields (user_id, platform, platform_url, song_title, song_artist, weight), ordered by user
+PLAYS_QUERY = """
+    SELECT user_id, platform, platform_url, song_title, song_artist, 1
+    FROM music_queue
+    ORDER BY user_id
+"""
+
+LIKES_QUERY = """
+    SELECT l.user_id, q.platform, q.platform_url, q.song_title, q.song_artist, 1
+    FROM song_likes l
+    JOIN music_queue q ON q.id = l.queue_item_id
+    ORDER BY l.user_id
+"""
+
+# Spend rows carry no queue reference; the request description names the song
+SPENDS_QUERY = """
+    SELECT t.user_id, q.platform, q.platform_url, q.song_title, q.song_artist, ABS(t.amount)
+    FROM cube_transactions t
+    JOIN (
+        SELECT DISTINCT user_id, platform, platform_url, song_title, song_artist
+        FROM music_queue
+    ) q ON q.user_id = t.user_id AND t.description = 'Song request: ' || q.song_title
+    WHERE t.type = 'spend'
+    ORDER BY t.user_id
+"""
+
+
+def stream_rows(conn, query: str, weight: float, chunk_size: int = CHUNK_SIZE,
+                cursor_name: str = None) -> Iterator[Tuple[Any, Dict[str, Any], float]]:
+    """Yield (user_id, song, weight) from a query without loading the whole result"""
+    # Named cursors are server-side on psycopg2; sqlite3 cursors already stream
+    cursor = conn.cursor(cursor_name) if cursor_name else conn.cursor()
+    try:
+        cursor.execute(query)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            for user_id, platform, url, title, artist, amount in rows:
+                song = {'platform': platform, 'url': url, 'title': title, 'artist': artist}
+                yield user_id, song, weight * float(amount or 0)
+    finally:
+        cursor.close()
+
+
+class CooccurrenceModel:
+    """Item-item cosine co-occurrence with a fixed number of counters per item"""
+
+    def __init__(self, top_k: int = TOP_K, max_items_per_user: int = MAX_ITEMS_PER_USER,
+                 counters_per_item: int = COUNTERS_PER_ITEM):
+        self.top_k = top_k
+        self.max_items_per_user = max_items_per_user
+        self.counters_per_item = counters_per_item
+
+        self.index: Dict[str, int] = {}
+        self.keys: List[str] = []
+        self.tracks: List[Dict[str, Any]] = []
+        self.norms: List[float] = []
+        self.totals: List[float] = []
+        self.counters: List[Dict[int, float]] = []
+        self.users = 0
+
+    def add_user(self, weights: Dict[str, float], songs: Dict[str, Dict[str, Any]]) -> None:
+        """Fold one user's aggregated interactions into the model"""
+        self.users += 1
+        strongest = heapq.nlargest(self.max_items_per_user, weights.items(), key=lambda item: item[1])
+        items = [(self._item(key, songs[key]), weight) for key, weight in strongest]
+
+        for item, weight in items:
+            self.norms[item] += weight * weight
+            self.totals[item] += weight
+
+        for i, (item, weight) in enumerate(items):
+            counter = self.counters[item]
+            for j, (other, other_weight) in enumerate(items):
+                if i != j:
+                    counter[other] = counter.get(other, 0.0) + weight * other_weight
+
+            # Amortized pruning keeps memory at O(items * counters_per_item)
+            if len(counter) > 2 * self.counters_per_item:
+                kept = heapq.nlargest(self.counters_per_item, counter.items(), key=lambda entry: entry[1])
+                self.counters[item] = dict(kept)
+
+    def finalize(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Top-k cosine neighbors per item plus the popularity ranking"""
+        n_items = len(self.keys)
+        neighbors = np.full((n_items, self.top_k), -1, dtype=np.int32)
+        scores = np.zeros((n_items, self.top_k), dtype=np.float32)
+
+        for item, counter in enumerate(self.counters):
+            norm = self.norms[item]
+            if not counter or norm <= 0.0:
+                continue
+            cosine = (
+                (other, value / math.sqrt(norm * self.norms[other]))
+                for other, value in counter.items() if self.norms[other] > 0.0
+            )
+            for rank, (other, score) in enumerate(heapq.nlargest(self.top_k, cosine, key=lambda entry: entry[1])):
+                neighbors[item, rank] = other
+                scores[item, rank] = score
+
+        totals = np.asarray(self.totals, dtype=np.float64)
+        popular = np.argsort(-totals)[:POPULAR_SIZE]
+        popular = popular[totals[popular] > 0].astype(np.int32)
+        return neighbors, scores, popular
+
+    def _item(self, key: str, song: Dict[str, Any]) -> int:
+        item = self.index.get(key)
+        if item is None:
+            item = len(self.keys)
+            self.index[key] = item
+            self.keys.append(key)
+            self.tracks.append({
+                'id': None,
+                'title': song.get('title', ''),
+                'artist': song.get('artist', ''),
+                'platform': song.get('platform', ''),
+                'url': song.get('url', '')
+            })
+            self.norms.append(0.0)
+            self.totals.append(0.0)
+            self.counters.append({})
+        return item
+
+
+def fit(rows: Iterator[Tuple[Any, Dict[str, Any], float]]) -> CooccurrenceModel:
+    """Fold (user_id, song, weight) rows, grouped by user, into a new model one user at a time"""
+    model = CooccurrenceModel()
+    for _, user_rows in groupby(rows, key=lambda row: row[0]):
+        weights: Dict[str, float] = {}
+        songs: Dict[str, Dict[str, Any]] = {}
+        for _, song, weight in user_rows:
+            key = track_key(song)
+            weights[key] = weights.get(key, 0.0) + weight
+            songs.setdefault(key, song)
+        model.add_user(weights, songs)
+    return model
+
+
+def train(conn, output_dir: str = SNAPSHOT_DIR, chunk_size: int = CHUNK_SIZE, server_side: bool = False) -> int:
+    """Stream the history from a DB-API connection and publish a new snapshot"""
+    started = time.monotonic()
+    streams = [
+        stream_rows(conn, PLAYS_QUERY, PLAY_WEIGHT, chunk_size, 'rec_plays' if server_side else None),
+        stream_rows(conn, LIKES_QUERY, LIKE_WEIGHT, chunk_size, 'rec_likes' if server_side else None),
+        stream_rows(conn, SPENDS_QUERY, CUBE_WEIGHT, chunk_size, 'rec_spends' if server_side else None)
+    ]
+
+    # All three streams are ordered by user, so a k-way merge visits one user at a time
+    model = fit(heapq.merge(*streams, key=lambda row: row[0]))
+
+    neighbors, scores, popular = model.finalize()
+    version = write_snapshot(output_dir, model.keys, model.tracks, neighbors, scores, popular)
+    logger.info(
+        f"Published recommendation snapshot v{version}: {model.users} users, "
+        f"{len(model.keys)} tracks in {time.monotonic() - started:.1f}s"
+    )
+    return version
+
+
+def _collapse(pairs: np.ndarray, weights: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """One summed weight per distinct (user, track) pair key"""
+    pairs, inverse = np.unique(pairs, return_inverse=True)
+    return pairs, np.bincount(inverse, weights=weights)
+
+
+def event_log_rows(room_path: str, max_items_per_user: int = MAX_ITEMS_PER_USER
+                   ) -> Iterator[Tuple[str, Dict[str, Any], float]]:
+    """Yield (username, song, weight) from one room's event log, ordered by username"""
+    reader = EventLogReader(room_path)
+    pairs, totals = np.zeros(0, dtype=np.uint64), np.zeros(0, dtype=np.float64)
+    pending_pairs, pending_weights, pending = [], [], 0
+    for chunk in reader.scan(['kind', 'user', 'subject', 'value']):
+        kind = chunk['kind']
+        mask = (kind == PLAY) | (kind == LIKE) | (kind == SPEND)
+        if not mask.any():
+            continue
+        kind = kind[mask]
+        weight = np.where(kind == PLAY, PLAY_WEIGHT,
+                          np.where(kind == LIKE, LIKE_WEIGHT, CUBE_WEIGHT * chunk['value'][mask]))
+        pending_pairs.append((chunk['user'][mask].astype(np.uint64) << np.uint64(32)) | chunk['subject'][mask])
+        pending_weights.append(weight)
+        pending += len(weight)
+        # Amortized collapsing keeps memory at O(distinct pairs) rather than O(events)
+        if pending > max(len(pairs), CHUNK_SIZE):
+            pairs, totals = _collapse(np.concatenate([pairs, *pending_pairs]),
+                                      np.concatenate([totals, *pending_weights]))
+            pending_pairs, pending_weights, pending = [], [], 0
+    if pending:
+        pairs, totals = _collapse(np.concatenate([pairs, *pending_pairs]), np.concatenate([totals, *pending_weights]))
+    if not len(pairs):
+        return
+
+    # Order by username (rooms are merged on it), strongest tracks first within each user
+    strings = reader.strings
+    users, user_index = np.unique(pairs >> np.uint64(32), return_inverse=True)
+    names = [strings[user] for user in users.tolist()]
+    name_rank = np.empty(len(names), dtype=np.int64)
+    name_rank[sorted(range(len(names)), key=names.__getitem__)] = np.arange(len(names))
+    user_rank = name_rank[user_index]
+    order = np.lexsort((-totals, user_rank))
+    pairs, totals, user_rank = pairs[order], totals[order], user_rank[order]
+
+    # Only a user's strongest items reach add_user, so drop the rest before making Python objects
+    starts = np.flatnonzero(np.r_[True, user_rank[1:] != user_rank[:-1]])
+    position = np.arange(len(pairs)) - np.repeat(starts, np.diff(np.r_[starts, len(pairs)]))
+    keep = position < max_items_per_user
+    for pair, total in zip(pairs[keep].tolist(), totals[keep].tolist()):
+        yield strings[pair >> 32], decode_track(strings[pair & 0xFFFFFFFF]), total
+
+
+def train_from_event_log(path: str, output_dir: str = SNAPSHOT_DIR) -> int:
+    """Fit the model from the bots' event logs (one subdirectory per room) instead of the database"""
+    started = time.monotonic()
+    rooms = [os.path.join(path, name) for name in sorted(os.listdir(path))
+             if os.path.isdir(os.path.join(path, name)) and not name.startswith('segment-')]
+
+    # Every room yields its users in name order, so the same merge as train() visits one user at a time
+    streams = [event_log_rows(room_path) for room_path in rooms or [path]]
+    model = fit(heapq.merge(*streams, key=lambda row: row[0]))
+
+    neighbors, scores, popular = model.finalize()
+    version = write_snapshot(output_dir, model.keys, model.tracks, neighbors, scores, popular)
+    logger.info(
+        f"Published recommendation snapshot v{version} from event logs: {model.users} users, "
+        f"{len(model.keys)} tracks in {time.monotonic() - started:.1f}s"
+    )
+    return version
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Train the -recommend neighbor table")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--db', help="Path to a local SQLite copy of the database")
+    source.add_argument('--database-url', help="PostgreSQL connection URL")
+    source.add_argument('--event-log', help="Event log directory written by the bots")
+    parser.add_argument('--output', default=SNAPSHOT_DIR, help="Snapshot directory shared with the bots")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+
+    if args.event_log:
+        try:
+            train_from_event_log(args.event_log, args.output)
+        except Exception as e:
+            logger.error(f"Training failed: {e}")
+            return 1
+        return 0
+
+    if args.db:
+        conn = sqlite3.connect(args.db)
+        server_side = False
+    else:
+        import psycopg2
+        conn = psycopg2.connect(args.database_url)
+        server_side = True
+
+    try:
+        train(conn, args.output, args.chunk_size, server_side)
+    except Exception as e:
+        logger.error(f"Training failed: {e}")
+        return 1
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,76 @@
+import logging
+from typing import Any, Awaitable, Callable, Optional, Set
+
+from scheduler import Scheduler
+
+logger = logging.getLogger(__name__)
+
+VOTE_SKIP_RATIO = 0.5  # a skip needs more than this share of the people in the room
+
+
+class VoteSkip:
+    """Skip votes for the current song, counted against who is in the room right now.
+
+    Voters are a set of user ids for the playing song, so a vote and the
+    tally are O(1). The bar is recomputed from live presence on every vote
+    and whenever someone leaves; a voter who leaves takes their vote with
+    them. Once the bar is met the skip is handed to the scheduler exactly
+    once per song and only goes ahead if that song is still playing, so
+    votes arriving together (or racing a VIP skip or the song ending)
+    cannot skip twice.
+    """
+
+    def __init__(self, scheduler: Scheduler, present: Callable[[], int], current: Callable[[], Any],
+                 skip: Callable[[], Awaitable[Any]], ratio: float = VOTE_SKIP_RATIO):
+        self.scheduler = scheduler
+        self.present = present  # people in the room, not counting the bot
+        self.current = current  # the playing queue item
+        self.skip = skip
+        self.ratio = ratio
+        self.voters: Set[str] = set()
+        self.song: Any = None  # queue item the votes are for
+        self.skipping: Any = None  # queue item a skip has been scheduled for
+
+    def reset(self) -> None:
+        """A new song started; earlier votes no longer count"""
+        self.voters.clear()
+        self.song = self.current()
+
+    def needed(self) -> int:
+        return max(1, int(self.present() * self.ratio) + 1)
+
+    def vote(self, user_id: str) -> Optional[bool]:
+        """Add a vote; True once the skip is scheduled, False if counted, None if already voted"""
+        if self.song is not self.current():
+            self.reset()
+        if user_id in self.voters:
+            return None
+        self.voters.add(user_id)
+        return self._check()
+
+    def leave(self, user_id: str) -> None:
+        """Someone left the room: drop their vote, and the smaller room may now pass the bar"""
+        self.voters.discard(user_id)
+        if self.voters and self.song is self.current():
+            self._check()
+
+    def skip_now(self) -> bool:
+        """Skip without a vote (VIP/Owner); False if a skip for this song is already on its way"""
+        item = self.current()
+        if item is None or self.skipping is item:
+            return False
+        self.skipping = item
+        self.scheduler.call_later(0, self._skip, item, name='vote_skip')
+        return True
+
+    def _check(self) -> bool:
+        if len(self.voters) < self.needed():
+            return False
+        if self.skip_now():
+            logger.info(f"Skip vote passed with {len(self.voters)}/{self.needed()} votes")
+        return True
+
+    async def _skip(self, item: Any) -> None:
+        # The song may have ended or been skipped another way since this was scheduled
+        if self.current() is item:
+            await self.skip()
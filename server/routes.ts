@@ -6,6 +6,8 @@ import { botManager } from "./services/bot-manager";
 import { musicService } from "./services/music-service";
 import { urlGenerator } from "./services/url-generator";
 import { mlRecommendations } from "./services/ml-recommendations";
+import { stateRelay } from "./services/state-relay";
+import { analyticsIngest } from "./services/analytics-ingest";
 import { insertUserSchema, insertRoomSchema, insertMusicQueueSchema, insertCompetitionSchema, insertBotConfigurationSchema } from "@shared/schema";
 import { z } from "zod";
 
@@ -19,9 +21,28 @@ export async function registerRoutes(app: Express): Promise<Server> {
   
   wss.on('connection', (ws) => {
     clients.add(ws);
+    stateRelay.addClient(ws);
     
     ws.on('close', () => {
       clients.delete(ws);
+      stateRelay.removeClient(ws);
+    });
+
+    // Clients that detect a sequence gap in a room's state stream ask for a resync
+    ws.on('message', (raw) => {
+      let message: any;
+      try {
+        message = JSON.parse(raw.toString());
+      } catch {
+        return;
+      }
+      if (message?.type === 'resync' && typeof message.roomId === 'string') {
+        if (stateRelay.hasSnapshot(message.roomId)) {
+          stateRelay.resync(ws, message.roomId);
+        } else {
+          botManager.requestSnapshot(message.roomId).catch(() => {});
+        }
+      }
     });
 
     // Send initial bot status
@@ -340,16 +361,44 @@ export async function registerRoutes(app: Express): Promise<Server> {
     }
   });
 
+  app.get("/api/bot/status/:roomId", async (req, res) => {
+    try {
+      const status = await botManager.queryStatus(req.params.roomId);
+      res.json(status);
+    } catch (error: any) {
+      res.status(503).json({ error: error.message || "Failed to query bot" });
+    }
+  });
+
+  app.post("/api/bot/command", async (req, res) => {
+    try {
+      const { roomId, name, ...args } = req.body;
+      const result = await botManager.sendCommand(roomId, name, args);
+      res.json({ success: true, result });
+    } catch (error: any) {
+      res.status(400).json({ error: error.message || "Failed to run bot command" });
+    }
+  });
+
   // Statistics routes
   app.get("/api/statistics", async (req, res) => {
     try {
       const stats = await storage.getBotStatistics();
-      res.json(stats);
+      // Per-room rows carry user sketches and are only kept for merging
+      res.json(stats && { ...stats, roomRows: undefined });
     } catch (error) {
       res.status(500).json({ error: "Failed to fetch statistics" });
     }
   });
 
+  app.get("/api/statistics/recent/:roomId", async (req, res) => {
+    try {
+      res.json(analyticsIngest.recentMinutes(req.params.roomId));
+    } catch (error) {
+      res.status(500).json({ error: "Failed to fetch recent statistics" });
+    }
+  });
+
   // Queue routes
   app.get("/api/queue", async (req, res) => {
     try {
@@ -401,8 +450,21 @@ export async function registerRoutes(app: Express): Promise<Server> {
       if (existingConfig) {
         // Update existing configuration
         await storage.updateBotConfiguration(configData.roomId, configData);
-        broadcast({ type: 'bot_config_updated', data: { roomId: configData.roomId } });
-        res.json({ success: true, message: "Configuration updated successfully" });
+
+        // A running bot picks the change up live instead of being restarted
+        let applied = false;
+        const room = await storage.getRoom(configData.roomId);
+        if (room && botManager.getBotByRoom(room.highriseRoomId)?.isOnline) {
+          try {
+            await botManager.updateConfig(room.highriseRoomId, configData);
+            applied = true;
+          } catch (error) {
+            console.error("Live config update failed:", error);
+          }
+        }
+
+        broadcast({ type: 'bot_config_updated', data: { roomId: configData.roomId, applied } });
+        res.json({ success: true, message: "Configuration updated successfully", applied });
       } else {
         // Create new configuration
         const config = await storage.createBotConfiguration(configData);
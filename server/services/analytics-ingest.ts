@@ -0,0 +1,174 @@
+import { storage } from "../storage";
+import { botManager } from "./bot-manager";
+
+// Minute rows kept per room for the recent-activity view (one day)
+const MINUTE_ROWS_PER_ROOM = 1440;
+const TOP_SONGS = 10;
+
+interface AnalyticsRow {
+  period: "minute" | "day";
+  room_id: string;
+  start: string;
+  songs_played: number;
+  cubes_spent: number;
+  cubes_earned: number;
+  tips: number;
+  tip_gold: number;
+  active_users: number;
+  commands: Record<string, number>;
+  platforms: Record<string, number>;
+  top_songs: { title: string; artist: string; platform: string; requests: number }[];
+  users_sketch?: string;
+}
+
+interface DayEntry {
+  row: AnalyticsRow;
+  cubesCirculating: number;
+}
+
+// Distinct count from merged HyperLogLog registers (same estimator as the bot's)
+function estimateDistinct(sketches: string[]): number {
+  if (sketches.length === 0) {
+    return 0;
+  }
+  const registers = Buffer.from(sketches[0], "base64");
+  for (const sketch of sketches.slice(1)) {
+    const other = Buffer.from(sketch, "base64");
+    for (let i = 0; i < registers.length; i++) {
+      if (other[i] > registers[i]) {
+        registers[i] = other[i];
+      }
+    }
+  }
+
+  const m = registers.length;
+  const alpha = 0.7213 / (1 + 1.079 / m);
+  let sum = 0;
+  let zeros = 0;
+  for (const r of registers) {
+    sum += Math.pow(2, -r);
+    if (r === 0) {
+      zeros++;
+    }
+  }
+  let estimate = (alpha * m * m) / sum;
+  if (estimate <= 2.5 * m && zeros > 0) {
+    estimate = m * Math.log(m / zeros);
+  }
+  return Math.round(estimate);
+}
+
+// Folds the bots' pre-aggregated rows into botStatistics, one upsert per day per batch
+class AnalyticsIngest {
+  private days = new Map<string, Map<string, DayEntry>>();  // UTC day -> room -> latest day row
+  private loading = new Map<string, Promise<Map<string, DayEntry>>>();
+  private minutes = new Map<string, AnalyticsRow[]>();
+
+  constructor() {
+    botManager.on("bot_event", ({ roomId, event, data }) => {
+      if (event === "analytics.rows") {
+        this.ingest(roomId, data).catch((error) => {
+          console.error("Failed to store bot statistics:", error);
+        });
+      }
+    });
+  }
+
+  async ingest(roomId: string, data: { rows: AnalyticsRow[]; cubes_circulating: number }): Promise<void> {
+    const touchedDays = new Set<string>();
+
+    for (const row of data.rows) {
+      if (row.period === "minute") {
+        const rows = this.minutes.get(roomId) ?? [];
+        rows.push(row);
+        if (rows.length > MINUTE_ROWS_PER_ROOM) {
+          rows.splice(0, rows.length - MINUTE_ROWS_PER_ROOM);
+        }
+        this.minutes.set(roomId, rows);
+      } else {
+        const day = row.start.slice(0, 10);
+        const rooms = await this.roomsFor(day);
+        rooms.set(roomId, { row, cubesCirculating: data.cubes_circulating });
+        touchedDays.add(day);
+      }
+    }
+
+    for (const day of touchedDays) {
+      await storage.updateBotStatistics(this.combine(this.days.get(day)!), new Date(`${day}T00:00:00Z`));
+    }
+
+    // Only today's and yesterday's rows can still change
+    const cutoff = new Date(Date.now() - 2 * 86400000).toISOString().slice(0, 10);
+    for (const day of this.days.keys()) {
+      if (day < cutoff) {
+        this.days.delete(day);
+      }
+    }
+  }
+
+  // A day first seen since startup starts from the rooms already stored for it, so the
+  // first write after a restart does not drop the rooms that have not reported again yet
+  private async roomsFor(day: string): Promise<Map<string, DayEntry>> {
+    const rooms = this.days.get(day);
+    if (rooms) {
+      return rooms;
+    }
+    let pending = this.loading.get(day);
+    if (!pending) {
+      pending = storage.getBotStatistics(new Date(`${day}T00:00:00Z`)).then((stored) => {
+        const loaded = new Map(Object.entries((stored?.roomRows ?? {}) as Record<string, DayEntry>));
+        this.days.set(day, loaded);
+        return loaded;
+      });
+      pending.finally(() => this.loading.delete(day)).catch(() => {});
+      this.loading.set(day, pending);
+    }
+    return pending;
+  }
+
+  recentMinutes(roomId: string): AnalyticsRow[] {
+    return this.minutes.get(roomId) ?? [];
+  }
+
+  private combine(rooms: Map<string, DayEntry>) {
+    const platformUsage: Record<string, number> = {};
+    const songs = new Map<string, { title: string; artist: string; platform: string; requests: number }>();
+    let totalSongsPlayed = 0;
+    let totalCubesCirculating = 0;
+
+    for (const { row, cubesCirculating } of rooms.values()) {
+      totalSongsPlayed += row.songs_played;
+      totalCubesCirculating += cubesCirculating;
+      for (const [platform, count] of Object.entries(row.platforms)) {
+        platformUsage[platform] = (platformUsage[platform] ?? 0) + count;
+      }
+      for (const song of row.top_songs) {
+        const key = `${song.title}\t${song.artist}\t${song.platform}`;
+        const existing = songs.get(key);
+        if (existing) {
+          existing.requests += song.requests;
+        } else {
+          songs.set(key, { ...song });
+        }
+      }
+    }
+
+    const sketches = Array.from(rooms.values())
+      .map(({ row }) => row.users_sketch)
+      .filter((sketch): sketch is string => !!sketch);
+
+    return {
+      totalUsers: estimateDistinct(sketches),
+      totalSongsPlayed,
+      totalCubesCirculating,
+      activeRooms: rooms.size,
+      platformUsage,
+      topSongs: Array.from(songs.values())
+        .sort((a, b) => b.requests - a.requests)
+        .slice(0, TOP_SONGS),
+      roomRows: Object.fromEntries(rooms),
+    };
+  }
+}
+
+export const analyticsIngest = new AnalyticsIngest();
@@ -1,14 +1,31 @@
 import { spawn, type ChildProcess } from "child_process";
+import { EventEmitter } from "events";
 import { storage } from "../storage";
+import { stateRelay } from "./state-relay";
+
+const CONTROL_TIMEOUT_MS = 10000;
+// How the bot's json.dumps renders state stream events; matched without parsing the line
+const STATE_EVENT_PREFIX = '{"type": "event", "event": "state.';
+
+interface PendingRequest {
+  resolve: (result: any) => void;
+  reject: (error: Error) => void;
+  timer: NodeJS.Timeout;
+}
 
 interface BotInstance {
   process: ChildProcess;
   isOnline: boolean;
   startTime: Date;
   roomId: string;
+  controlReady: boolean;
+  nextRequestId: number;
+  pending: Map<number, PendingRequest>;
+  stdoutBuffer: string;
 }
 
-class BotManager {
+// Emits "bot_event" ({ roomId, event, data }) for every control event a bot sends
+class BotManager extends EventEmitter {
   private bots = new Map<string, BotInstance>();
 
   async startBot(highriseRoomId: string): Promise<void> {
@@ -54,12 +71,24 @@ class BotManager {
       isOnline: true,
       startTime: new Date(),
       roomId: highriseRoomId,
+      controlReady: false,
+      nextRequestId: 1,
+      pending: new Map(),
+      stdoutBuffer: "",
     };
 
     this.bots.set(highriseRoomId, botInstance);
 
     botProcess.stdout?.on('data', (data) => {
-      console.log(`Bot ${highriseRoomId} stdout:`, data.toString());
+      // NDJSON control messages share stdout with ordinary log output
+      botInstance.stdoutBuffer += data.toString();
+      const lines = botInstance.stdoutBuffer.split("\n");
+      botInstance.stdoutBuffer = lines.pop() ?? "";
+      for (const line of lines) {
+        if (!this.handleControlLine(botInstance, line)) {
+          console.log(`Bot ${highriseRoomId} stdout:`, line);
+        }
+      }
     });
 
     botProcess.stderr?.on('data', (data) => {
@@ -68,13 +97,99 @@ class BotManager {
 
     botProcess.on('close', (code) => {
       console.log(`Bot ${highriseRoomId} exited with code ${code}`);
-      const bot = this.bots.get(highriseRoomId);
-      if (bot) {
-        bot.isOnline = false;
+      botInstance.isOnline = false;
+      botInstance.controlReady = false;
+      for (const request of botInstance.pending.values()) {
+        clearTimeout(request.timer);
+        request.reject(new Error("Bot process exited"));
+      }
+      botInstance.pending.clear();
+    });
+  }
+
+  private handleControlLine(bot: BotInstance, line: string): boolean {
+    if (line.startsWith(STATE_EVENT_PREFIX)) {
+      // Hot path: queue/now-playing/balance deltas go to dashboards as-is
+      const nameEnd = line.indexOf('"', STATE_EVENT_PREFIX.length);
+      const event = "state." + line.slice(STATE_EVENT_PREFIX.length, nameEnd);
+      stateRelay.relay(bot.roomId, event, line);
+      return true;
+    }
+    if (!line.startsWith("{")) {
+      return false;
+    }
+
+    let message: any;
+    try {
+      message = JSON.parse(line);
+    } catch {
+      return false;
+    }
+
+    if (message.type === "response") {
+      const request = bot.pending.get(message.id);
+      if (request) {
+        bot.pending.delete(message.id);
+        clearTimeout(request.timer);
+        if (message.ok) {
+          request.resolve(message.result);
+        } else {
+          request.reject(new Error(message.error || "Bot request failed"));
+        }
+      }
+      return true;
+    }
+
+    if (message.type === "event") {
+      if (message.event === "ready") {
+        bot.controlReady = true;
       }
+      this.emit("bot_event", { roomId: bot.roomId, event: message.event, data: message.data });
+      return true;
+    }
+
+    return false;
+  }
+
+  // Sends one NDJSON request to the running bot and resolves with its result
+  private request(highriseRoomId: string, type: string, params: Record<string, any> = {}): Promise<any> {
+    const bot = this.bots.get(highriseRoomId);
+    if (!bot || !bot.isOnline) {
+      return Promise.reject(new Error("Bot not found in this room"));
+    }
+    if (!bot.controlReady || !bot.process.stdin?.writable) {
+      return Promise.reject(new Error("Bot control channel is not ready"));
+    }
+
+    const id = bot.nextRequestId++;
+    return new Promise((resolve, reject) => {
+      const timer = setTimeout(() => {
+        bot.pending.delete(id);
+        reject(new Error(`Bot request ${type} timed out`));
+      }, CONTROL_TIMEOUT_MS);
+      bot.pending.set(id, { resolve, reject, timer });
+      bot.process.stdin!.write(JSON.stringify({ id, type, params }) + "\n");
     });
   }
 
+  // Applies configuration to a running bot without restarting it
+  async updateConfig(highriseRoomId: string, config: Record<string, any>): Promise<any> {
+    return this.request(highriseRoomId, "config.update", { config });
+  }
+
+  async queryStatus(highriseRoomId: string): Promise<any> {
+    return this.request(highriseRoomId, "status");
+  }
+
+  // The snapshot also arrives through the state stream, refreshing every dashboard
+  async requestSnapshot(highriseRoomId: string): Promise<any> {
+    return this.request(highriseRoomId, "state.snapshot");
+  }
+
+  async sendCommand(highriseRoomId: string, name: string, args: Record<string, any> = {}): Promise<any> {
+    return this.request(highriseRoomId, "command", { ...args, name });
+  }
+
   async stopBot(highriseRoomId: string): Promise<void> {
     const bot = this.bots.get(highriseRoomId);
     if (!bot) {
@@ -83,6 +198,7 @@ class BotManager {
 
     bot.process.kill();
     this.bots.delete(highriseRoomId);
+    stateRelay.forgetRoom(highriseRoomId);
   }
 
   getStatus(): any {
@@ -1,3 +1,4 @@
+import { spawn } from "child_process";
 import { storage } from '../storage';
 import type { SearchResult } from './music-service';
 
@@ -32,10 +33,47 @@ class MLRecommendations {
     return recommendations;
   }
 
+  private training: Promise<void> | null = null;
+
   async trainModel(userId: number): Promise<void> {
-    // This would train a personalized model for the user
-    // Using their listening history, likes, and preferences
-    console.log(`Training ML model for user ${userId}`);
+    // The model is trained for all users at once by the offline Python pipeline;
+    // running bots pick up the new snapshot without a restart
+    if (this.training) {
+      return this.training;
+    }
+
+    // Prefer a local SQLite copy so training never loads the live database
+    const source = process.env.RECOMMENDATION_TRAINING_DB
+      ? ["--db", process.env.RECOMMENDATION_TRAINING_DB]
+      : ["--database-url", process.env.DATABASE_URL || ""];
+
+    console.log(`Training recommendation model (requested for user ${userId})`);
+    this.training = new Promise<void>((resolve, reject) => {
+      const trainer = spawn("python", ["bot/train_recommendations.py", ...source], {
+        stdio: ['ignore', 'pipe', 'pipe'],
+        cwd: process.cwd(),
+      });
+
+      trainer.stderr?.on('data', (data) => {
+        console.log(`Recommendation training:`, data.toString());
+      });
+
+      trainer.on('error', (error) => {
+        this.training = null;
+        reject(error);
+      });
+
+      trainer.on('close', (code) => {
+        this.training = null;
+        if (code === 0) {
+          resolve();
+        } else {
+          reject(new Error(`Recommendation training exited with code ${code}`));
+        }
+      });
+    });
+
+    return this.training;
   }
 
   async updatePreferences(userId: number, songData: any): Promise<void> {
@@ -0,0 +1,105 @@
+import { WebSocket } from "ws";
+
+// Deltas kept per room after the latest snapshot, so new clients can catch up
+const MAX_DELTAS_PER_ROOM = 500;
+// Clients further behind than this stop getting deltas until the next snapshot
+const MAX_BUFFERED_BYTES = 1024 * 1024;
+
+interface RoomStream {
+  snapshot: string | null;  // framed state.snapshot message
+  deltas: string[];         // framed state.delta messages since the snapshot
+}
+
+interface Subscriber {
+  ws: WebSocket;
+  staleRooms: Set<string>;
+}
+
+class StateRelay {
+  private rooms = new Map<string, RoomStream>();
+  private subscribers = new Map<WebSocket, Subscriber>();
+
+  // The bot's NDJSON event line is embedded verbatim; it is framed once and the
+  // same string is sent to every client
+  relay(roomId: string, event: string, line: string): void {
+    const frame = `{"type":"room_state","roomId":${JSON.stringify(roomId)},"message":${line}}`;
+    const stream = this.streamFor(roomId);
+    const isSnapshot = event === "state.snapshot";
+
+    if (isSnapshot) {
+      stream.snapshot = frame;
+      stream.deltas = [];
+    } else {
+      stream.deltas.push(frame);
+      if (stream.deltas.length > MAX_DELTAS_PER_ROOM) {
+        // Late joiners wait for the next snapshot instead of replaying a long tail
+        stream.snapshot = null;
+        stream.deltas = [];
+      }
+    }
+
+    for (const subscriber of this.subscribers.values()) {
+      const { ws, staleRooms } = subscriber;
+      if (ws.readyState !== WebSocket.OPEN) {
+        continue;
+      }
+      if (isSnapshot) {
+        staleRooms.delete(roomId);
+      } else if (staleRooms.has(roomId)) {
+        continue;
+      } else if (ws.bufferedAmount > MAX_BUFFERED_BYTES) {
+        staleRooms.add(roomId);
+        continue;
+      }
+      ws.send(frame);
+    }
+  }
+
+  addClient(ws: WebSocket): void {
+    this.subscribers.set(ws, { ws, staleRooms: new Set() });
+    for (const roomId of this.rooms.keys()) {
+      this.resync(ws, roomId);
+    }
+  }
+
+  removeClient(ws: WebSocket): void {
+    this.subscribers.delete(ws);
+  }
+
+  // Sends the cached snapshot and the deltas after it
+  resync(ws: WebSocket, roomId: string): void {
+    const stream = this.rooms.get(roomId);
+    const subscriber = this.subscribers.get(ws);
+    if (!stream || !subscriber || ws.readyState !== WebSocket.OPEN) {
+      return;
+    }
+    if (!stream.snapshot) {
+      subscriber.staleRooms.add(roomId);
+      return;
+    }
+    subscriber.staleRooms.delete(roomId);
+    ws.send(stream.snapshot);
+    for (const delta of stream.deltas) {
+      ws.send(delta);
+    }
+  }
+
+  hasSnapshot(roomId: string): boolean {
+    return !!this.rooms.get(roomId)?.snapshot;
+  }
+
+  forgetRoom(roomId: string): void {
+    this.rooms.delete(roomId);
+  }
+
+  private streamFor(roomId: string): RoomStream {
+    let stream = this.rooms.get(roomId);
+    if (!stream) {
+      stream = { snapshot: null, deltas: [] };
+      this.rooms.set(roomId, stream);
+    }
+    return stream;
+  }
+}
+
+export const stateRelay = new StateRelay();
@@ -44,7 +44,7 @@ export interface IStorage {
 
   // Statistics
   getBotStatistics(date?: Date): Promise<BotStatistics | undefined>;
-  updateBotStatistics(stats: Partial<BotStatistics>): Promise<void>;
+  updateBotStatistics(stats: Partial<BotStatistics>, date?: Date): Promise<void>;
 
   // URL management
   createUrlMapping(mapping: InsertUrlMapping): Promise<UrlMapping>;
@@ -59,6 +59,10 @@ export interface IStorage {
   deleteBotConfiguration(roomId: number): Promise<void>;
 }
 
+function startOfUtcDay(date: Date): Date {
+  return new Date(Date.UTC(date.getUTCFullYear(), date.getUTCMonth(), date.getUTCDate()));
+}
+
 export class DatabaseStorage implements IStorage {
   async getUser(id: number): Promise<User | undefined> {
     const [user] = await db.select().from(users).where(eq(users.id, id));
@@ -216,7 +220,7 @@ export class DatabaseStorage implements IStorage {
   }
 
   async getBotStatistics(date?: Date): Promise<BotStatistics | undefined> {
-    const targetDate = date || new Date();
+    const targetDate = startOfUtcDay(date || new Date());
     const [stats] = await db
       .select()
       .from(botStatistics)
@@ -224,8 +228,9 @@ export class DatabaseStorage implements IStorage {
     return stats || undefined;
   }
 
-  async updateBotStatistics(stats: Partial<BotStatistics>): Promise<void> {
-    const today = new Date();
+  async updateBotStatistics(stats: Partial<BotStatistics>, date?: Date): Promise<void> {
+    // One row per UTC day; the date column holds that day's midnight
+    const today = startOfUtcDay(date || new Date());
     const [existing] = await db
       .select()
       .from(botStatistics)
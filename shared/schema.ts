@@ -80,6 +80,7 @@ export const botStatistics = pgTable("bot_statistics", {
   activeRooms: integer("active_rooms").notNull().default(0),
   platformUsage: json("platform_usage").default({}),
   topSongs: json("top_songs").default([]),
+  roomRows: json("room_rows").default({}), // room -> latest day row from its bot, so a restart can merge
 });
 
 export const botConfigurations = pgTable("bot_configurations", {
@@ -92,6 +93,8 @@ export const botConfigurations = pgTable("bot_configurations", {
   songCost: integer("song_cost").notNull().default(10),
   enableCompetitions: boolean("enable_competitions").notNull().default(true),
   platformPreference: text("platform_preference").notNull().default("all"),
+  repeatWindowMinutes: integer("repeat_window_minutes").notNull().default(30),
+  repeatHistoryHours: integer("repeat_history_hours").notNull().default(2),
   isActive: boolean("is_active").notNull().default(true),
   lastStarted: timestamp("last_started"),
   createdAt: timestamp("created_at").defaultNow(),